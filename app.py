@@ -1,13 +1,15 @@
 import streamlit as st
-from parsers.python_parser import extract_functions
+
+st.set_page_config(page_title="BARE - Business Analyst reverse engineering", layout="wide")
+
+from parsers.parallel_parser import parse_files
+from parsers.source_decoding import DecodeStats
 from llm_engine.run_local_llm import generate_brd
 import ast
-import zipfile
+import textwrap
 import io
-from fpdf import FPDF
 import datetime
 
-st.set_page_config(page_title="BARE - Business Analyst reverse engineering", layout="wide")
 st.title("BARE - Business Analyst reverse engineering")
 st.subheader("Reverse Requirements Bot (Code → BRD)")
 
@@ -18,34 +20,42 @@ model = st.selectbox("Choose LLM Model", options=["mistral", "starcoder", "wizar
 all_functions = []
 file_function_map = {}
 all_code_strings = []
+uploaded_sources = []
 
 if uploaded_files:
+    decode_stats = DecodeStats()
     for uploaded_file in uploaded_files:
         if uploaded_file.name.endswith('.zip'):
             # Handle ZIP file
+            import zipfile
+
             with zipfile.ZipFile(uploaded_file, 'r') as zip_ref:
                 for file_info in zip_ref.filelist:
                     if file_info.filename.endswith('.py'):
-                        try:
-                            with zip_ref.open(file_info.filename) as file:
-                                code_string = file.read().decode("utf-8")
-                                all_code_strings.append(code_string)
-                                functions = extract_functions(code_string)
-                                file_function_map[file_info.filename] = functions
-                                for func in functions:
-                                    func['file'] = file_info.filename
-                                    all_functions.append(func)
-                        except Exception as e:
-                            st.warning(f"Could not process {file_info.filename} from ZIP: {str(e)}")
+                        with zip_ref.open(file_info) as file:
+                            code_string = decode_stats.decode(file_info.filename, file)
+                        if code_string is not None:
+                            all_code_strings.append(code_string)
+                            uploaded_sources.append((file_info.filename, code_string))
         else:
             # Handle individual Python file
-            code_string = uploaded_file.read().decode("utf-8")
-            all_code_strings.append(code_string)
-            functions = extract_functions(code_string)
-            file_function_map[uploaded_file.name] = functions
-            for func in functions:
-                func['file'] = uploaded_file.name
-                all_functions.append(func)
+            code_string = decode_stats.decode(uploaded_file.name, uploaded_file.getvalue())
+            if code_string is not None:
+                all_code_strings.append(code_string)
+                uploaded_sources.append((uploaded_file.name, code_string))
+
+    for record in decode_stats.problems():
+        if record['method'] == 'failed':
+            st.warning(f"Could not process {record['file']}: {record['error']}")
+        else:
+            st.warning(f"{record['file']} was decoded as {record['encoding']} ({record['method']})")
+
+    # Parse all files at once so large uploads are spread across CPU cores
+    for filename, parsed in parse_files(uploaded_sources, include_classes=False).items():
+        file_function_map[filename] = parsed['functions']
+        all_functions.extend(parsed['functions'])
+        for error in parsed['syntax_errors']:
+            st.warning(f"{filename}: lines {error['start_line']}-{error['end_line']} skipped ({error['error']} at line {error['line']})")
 
     # Show function count instead of all function code
     st.subheader("Extracted Functions Summary")
@@ -63,7 +73,7 @@ if uploaded_files:
     for func in all_functions:
         # Parse the function source to find function calls
         try:
-            tree = ast.parse(func['source'])
+            tree = ast.parse(textwrap.dedent(func['source']))
             for node in ast.walk(tree):
                 if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
                     called_func = node.func.id
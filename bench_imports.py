@@ -0,0 +1,75 @@
+"""Measure cold import time of the app's modules.
+
+Every module is imported in a fresh interpreter with `-X importtime`, so the
+numbers match what a new container pays on its first request. Also reports
+heavy dependencies a module pulls in, which should stay lazily imported.
+
+    python bench_imports.py [--repeat 5] [module ...]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+DEFAULT_MODULES = [
+    "parsers.python_parser",
+    "parsers.parallel_parser",
+    "parsers.project_index",
+    "parsers.flow_graph",
+    "parsers.metrics",
+    "llm_engine.run_local_llm",
+    "llm_engine.job_queue",
+    "llm_engine.hierarchical_summary",
+    "llm_engine.estimator",
+    "llm_engine.semantic_index",
+    "streamlit",
+]
+
+# Only needed when a request is sent, a PDF is exported or code is analyzed
+# (numpy backs the metrics table and the semantic index)
+HEAVY_DEPENDENCIES = ["requests", "fpdf", "reportlab", "urllib3", "numpy"]
+
+
+def import_time(module):
+    """Return (cumulative import time in ms, heavy modules loaded) for one fresh import."""
+    probe = (
+        f"import sys; import {module}; "
+        f"print(','.join(name for name in {HEAVY_DEPENDENCIES!r} if name in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    total_us = 0
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            total_us = int(parts[1].strip())
+    heavy = [name for name in result.stdout.strip().split(",") if name]
+    return total_us / 1000, heavy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold import time of BARE modules")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per module")
+    args = parser.parse_args()
+
+    print(f"{'module':<36} {'median ms':>10} {'min ms':>8}  heavy dependencies")
+    for module in args.modules:
+        try:
+            runs = [import_time(module) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"{module:<36} {'failed':>10}           {e}")
+            continue
+        timings = [timing for timing, _ in runs]
+        heavy = ", ".join(runs[-1][1]) or "-"
+        print(f"{module:<36} {statistics.median(timings):>10.1f} {min(timings):>8.1f}  {heavy}")
+
+
+if __name__ == "__main__":
+    main()
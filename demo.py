@@ -1,291 +1,875 @@
 import streamlit as st
-from parsers.python_parser import extract_functions
-from llm_engine.run_local_llm import generate_brd, generate_process_flow
-import ast
-import zipfile
-import io
-from fpdf import FPDF
-import datetime
 
+# Configure the page before anything else so the browser gets the layout
+# while the rest of the app is still importing
 st.set_page_config(page_title="BARE - Business Analyst Reverse Engineering", layout="wide")
+
+from parsers.parallel_parser import ParseCache, parse_files
+from parsers.python_parser import MODE_ALL, MODE_OUTERMOST, MODE_PARTITIONED, partition_functions
+from parsers.flow_graph import build_flow_graph, list_decision_points, to_mermaid
+from parsers.project_index import ProjectIndex, default_index_path
+from parsers.source_decoding import DecodeStats
+from parsers.triage import CRITICAL, ROUTINE, TRIVIAL
+from llm_engine.run_local_llm import generate_flow_labels, set_call_observer, set_llm_scheduler, set_model_router
+from llm_engine.estimator import ThroughputStats, estimate_options, format_duration
+from llm_engine.job_queue import JobQueue
+from llm_engine.llm_scheduler import LLMScheduler, current_owner
+from llm_engine.model_router import ModelRouter
+from llm_engine.response_cache import ResponseCache
+from llm_engine.tracing import current_trace, profile, span, tracer
+from llm_engine.triage import build_triaged_jobs
+import json
+import os
+import time
+import uuid
+import datetime
+from collections import Counter
+
 st.title("BARE - Business Analyst Reverse Engineering")
 st.markdown("AI-powered Reverse Requirements Bot to extract Business Requirements from Legacy Code")
 st.markdown("---")
 
+# generate_brd truncates anything longer than 32000 characters to its first 20000,
+# so the full-project job does not need to carry more than this
+FULL_PROJECT_PAYLOAD_CHARS = 40000
+# Longest option lists sent to the browser; the search boxes narrow them down
+MAX_SELECT_OPTIONS = 500
+# Runs with more BRDs than this are only exported to PDF on request
+PDF_AUTO_BUILD_OUTPUTS = 20
+JOB_WORKERS = int(os.environ.get("BARE_JOB_WORKERS", 2))
+
+
+# Shared by every session of this server process
+
+@st.cache_resource
+def get_parse_cache():
+    return ParseCache()
+
+
+@st.cache_resource
+def get_response_cache():
+    return ResponseCache()
+
+
+@st.cache_resource
+def get_llm_scheduler():
+    """Limit concurrent Ollama requests and share them fairly between analysts."""
+    scheduler = LLMScheduler(int(os.environ.get("BARE_LLM_CONCURRENCY", 2)))
+    set_llm_scheduler(scheduler)
+    return scheduler
+
+
+@st.cache_resource
+def get_throughput_stats():
+    """Token counts and speed of every Ollama call, used to estimate new runs."""
+    stats = ThroughputStats()
+    set_call_observer(stats.record)
+    return stats
+
+
+@st.cache_resource
+def get_model_router():
+    """Pick model and context size per call (BARE_MODEL_ROUTES: rules file or 'off')."""
+    router = ModelRouter.from_config(stats=get_throughput_stats())
+    set_model_router(router)
+    return router
+
+
+@st.cache_resource
+def get_job_queue():
+    """One job queue and worker pool per server process."""
+    get_llm_scheduler()
+    get_model_router()
+    job_queue = JobQueue(cache=get_response_cache())
+    job_queue.start_workers(JOB_WORKERS)
+    return job_queue
+
+
+def build_brd_pdf(outputs):
+    """Render (title, content) pairs into a PDF and return its bytes."""
+    # The PDF stack is only loaded when a PDF is actually exported
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", "B", 16)
+    pdf.cell(0, 10, "Business Requirements Document", 0, 1, "C")
+    pdf.ln(10)
+    pdf.set_font("Arial", "", 10)
+    pdf.cell(0, 10, f"Generated on {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", 0, 1, "R")
+    pdf.ln(10)
+
+    for i, (title, content) in enumerate(outputs):
+        if i > 0:
+            pdf.add_page()
+
+        pdf.set_font("Arial", "B", 14)
+        # Handle title encoding
+        safe_title = title.encode('latin-1', 'replace').decode('latin-1')
+        pdf.cell(0, 10, safe_title, 0, 1, "L")
+        pdf.ln(5)
+
+        pdf.set_font("Arial", "", 10)
+        # Handle content encoding and split into chunks
+        safe_content = content.encode('latin-1', 'replace').decode('latin-1')
+
+        # Split content into smaller chunks to avoid PDF issues
+        lines = safe_content.split('\n')
+        for line in lines:
+            if len(line) > 180:  # Split very long lines
+                words = line.split(' ')
+                current_line = ""
+                for word in words:
+                    if len(current_line + word) < 180:
+                        current_line += word + " "
+                    else:
+                        if current_line:
+                            pdf.cell(0, 6, current_line.strip(), 0, 1, "L")
+                        current_line = word + " "
+                if current_line:
+                    pdf.cell(0, 6, current_line.strip(), 0, 1, "L")
+            else:
+                pdf.cell(0, 6, line, 0, 1, "L")
+
+        pdf.ln(5)
+
+    return pdf.output(dest='S').encode('latin1')
+
+
+def join_code(code_strings, limit, separator="\n\n# === FILE SEPARATOR ===\n\n"):
+    """Join files until `limit` characters, reading (e.g. from the project index) only the files that fit."""
+    parts = []
+    size = 0
+    for code_string in code_strings:
+        if parts:
+            parts.append(separator)
+            size += len(separator)
+        parts.append(code_string[:limit - size])
+        size += len(parts[-1])
+        if size >= limit:
+            break
+    return "".join(parts)
+
+
+def show_syntax_errors(syntax_errors):
+    """Regions skipped because they do not parse; everything else in those files was extracted."""
+    files = len({error['file'] for error in syntax_errors})
+    with st.expander(f"⚠️ {len(syntax_errors)} regions in {files} files have syntax errors and were skipped"):
+        st.caption("The other functions and classes in these files were extracted. Fix or convert (e.g. Python 2 code) the listed lines to include them.")
+        st.dataframe(
+            [
+                {'File': error['file'], 'Lines': f"{error['start_line']}-{error['end_line']}",
+                 'Error at line': error['line'], 'Error': error['error']}
+                for error in syntax_errors
+            ],
+            use_container_width=True, hide_index=True
+        )
+
+
+def show_performance_panel(traces):
+    """Where time went in this session and in the selected BRD run."""
+    st.header("⏱️ Performance")
+    stage_stats = tracer.stage_stats(traces)
+    if not stage_stats:
+        st.info("No timings recorded yet.")
+        return
+
+    st.bar_chart([{'Stage': stage['stage'], 'Total (ms)': stage['total_ms']} for stage in stage_stats], x='Stage', y='Total (ms)')
+    st.dataframe(
+        [
+            {
+                'Stage': stage['stage'], 'Count': stage['count'], 'Total (ms)': round(stage['total_ms'], 1),
+                'Mean (ms)': round(stage['mean_ms'], 1), 'p50 (ms)': round(stage['p50_ms'], 1),
+                'p95 (ms)': round(stage['p95_ms'], 1), 'Max (ms)': round(stage['max_ms'], 1),
+                'Histogram': ", ".join(f"{bucket}: {count}" for bucket, count in stage['histogram'].items())
+            }
+            for stage in stage_stats
+        ],
+        use_container_width=True, hide_index=True
+    )
+    st.caption("Open the trace in chrome://tracing or ui.perfetto.dev. Jobs run by separate worker processes are traced there (--trace).")
+    st.download_button(
+        label="📥 Download Chrome trace",
+        data=json.dumps(tracer.chrome_trace(traces), default=str),
+        file_name=f"bare_trace_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+        mime="application/json"
+    )
+
+    router = get_model_router()
+    if router is not None and router.report():
+        st.subheader("Model routing")
+        st.dataframe(
+            [
+                {'Rule': decision['rule'], 'Model': decision['model'], 'num_ctx': decision['num_ctx'], 'Calls': decision['calls']}
+                for decision in router.report()
+            ],
+            use_container_width=True, hide_index=True
+        )
+        with st.expander("Latest routing decisions"):
+            st.dataframe(
+                [
+                    {
+                        'Task': decision['task'], 'Rule': decision['rule'], 'Model': decision['model'],
+                        'num_ctx': decision['num_ctx'], 'Prompt tokens': decision['prompt_tokens'],
+                        **{metric.replace('_', ' ').capitalize(): value for metric, value in (decision['metrics'] or {}).items()}
+                    }
+                    for decision in reversed(router.decisions()[-200:])
+                ],
+                use_container_width=True, hide_index=True
+            )
+
+
+def show_admin_view(job_queue):
+    """Queue depth and throughput across all analysts."""
+    st.header("🛠️ Server Queue Status")
+    queue_stats = job_queue.queue_stats()
+    scheduler_stats = get_llm_scheduler().stats()
+
+    queued_col, running_col, throughput_col, wait_col = st.columns(4)
+    queued_col.metric("Queued jobs", queue_stats['queued'])
+    running_col.metric("Running jobs", queue_stats['running'])
+    throughput_col.metric("Jobs / minute (last hour)", f"{queue_stats['jobs_per_minute']:.2f}")
+    wait_col.metric("Avg queue wait", f"{queue_stats['avg_wait_seconds']:.0f}s")
+    st.caption(
+        f"Last hour: {queue_stats['finished']} jobs finished ({queue_stats['failed']} failed), "
+        f"avg duration {queue_stats['avg_duration_seconds']:.1f}s, {queue_stats['busy_workers']} busy workers. "
+        f"LLM requests: {scheduler_stats['in_flight']}/{scheduler_stats['max_concurrent']} in flight, "
+        f"{scheduler_stats['waiting']} waiting, avg slot wait {scheduler_stats['avg_wait_seconds']:.1f}s."
+    )
+    if queue_stats['owners']:
+        st.dataframe(queue_stats['owners'], use_container_width=True)
+
+    parse_stats = get_parse_cache().stats()
+    response_stats = get_response_cache().stats()
+    st.caption(
+        f"Parse cache: {parse_stats['files']} files, {parse_stats['hits']} hits / {parse_stats['misses']} misses. "
+        f"LLM response cache: {response_stats['entries']} responses, "
+        f"{response_stats['hits']} hits / {response_stats['misses']} misses."
+    )
+
+
 st.sidebar.header("Configuration")
 model = st.sidebar.selectbox("Choose LLM Model", options=["mistral", "starcoder", "wizardcoder", "codellama:13b"])
-processing_mode = st.sidebar.radio("Processing Mode", ["Individual Functions (Recommended)", "Batch Processing"])
+processing_mode = st.sidebar.radio("Processing Mode", ["Individual Functions (Recommended)", "Batch Processing", "Hierarchical Rollup"])
+nested_mode_options = {
+    "Partitioned (nested code sent once)": MODE_PARTITIONED,
+    "Outermost functions only": MODE_OUTERMOST,
+    "All functions (overlapping)": MODE_ALL
+}
+nested_mode = nested_mode_options[st.sidebar.radio(
+    "Nested Functions", list(nested_mode_options.keys()),
+    help="Partitioned analyzes every function but replaces nested definitions with a stub in their enclosing function. "
+         "Outermost analyzes nested helpers only as part of their enclosing function."
+)]
+# Runs are queued fairly per analyst; without a name each browser session counts as one analyst
+session_owner = st.session_state.setdefault("session_owner", f"session-{uuid.uuid4().hex[:8]}")
+analyst_name = st.sidebar.text_input("Analyst name", help="Used to share the LLM fairly between analysts and to list your BRD runs.")
+owner = analyst_name.strip() or session_owner
+current_owner.set(owner)
+# Spans from this session's page runs are grouped under the session
+current_trace.set(session_owner)
+# Install the shared LLM scheduler and call statistics before any request is made
+get_llm_scheduler()
+get_throughput_stats()
+get_model_router()
+summary_workers = st.sidebar.slider("Parallel LLM requests", min_value=1, max_value=16, value=4, help="Used by Hierarchical Rollup; Ollama must allow parallel requests (OLLAMA_NUM_PARALLEL).")
+triage_functions = st.sidebar.checkbox(
+    "Triage functions", value=False,
+    help="Individual mode: only business-critical functions get their own BRD; routine ones are batched "
+         "and trivial ones (accessors, thin wrappers) get a short templated entry."
+)
+triage_model = st.sidebar.text_input(
+    "Triage model (optional)", placeholder="e.g. qwen2.5:0.5b",
+    help="A small, fast model that re-checks routine functions before they are batched. Leave empty for static rules only."
+).strip() if triage_functions else ""
+semantic_selection = st.sidebar.checkbox(
+    "Select code semantically", value=False,
+    help="The project BRD (and module summaries in Hierarchical Rollup) gets the code most relevant to each BRD "
+         "section instead of the first 20,000 characters. Function embeddings are kept in .bare_index/semantic/."
+)
+embedding_model = st.sidebar.text_input(
+    "Embedding model (optional)", placeholder="e.g. nomic-embed-text",
+    help="An Ollama embedding model. Leave empty to use local TF-IDF vectors."
+).strip() if semantic_selection else ""
 export_pdf = st.sidebar.checkbox("Export PDF after BRD generation", value=True)
+show_performance = st.sidebar.checkbox("Show performance panel", value=False, help="Per-stage timings of this session and the selected BRD run.")
 
 st.header("1️⃣ Upload Python Code Files or ZIP Archives")
 uploaded_files = st.file_uploader("Select files to analyze", type=[".py", ".zip"], accept_multiple_files=True)
 
+with st.expander("📂 Or analyze a local directory (indexed on disk for very large codebases)"):
+    directory_path = st.text_input("Project directory", value=st.session_state.get("index_root", ""))
+    if st.button("Index Directory", key="btn_index_dir"):
+        if not directory_path or not os.path.isdir(directory_path):
+            st.error(f"Directory not found: {directory_path}")
+        else:
+            index_progress = st.progress(0)
+            index = ProjectIndex(default_index_path(directory_path))
+            index_result = index.index_directory(
+                directory_path,
+                progress_callback=lambda done, total: index_progress.progress(done / total)
+            )
+            index_progress.empty()
+            st.session_state["index_root"] = directory_path
+            st.success(
+                f"✅ Indexed {index_result['indexed']} files "
+                f"({index_result['unchanged']} unchanged, {index_result['removed']} removed)"
+            )
+            for error in index_result['errors']:
+                st.warning(f"Could not index {error}")
+            if index_result['syntax_errors']:
+                show_syntax_errors(index_result['syntax_errors'])
+            if index_result['decode_problems']:
+                with st.expander(f"🔤 {len(index_result['decode_problems'])} files needed a fallback encoding"):
+                    st.text("\n".join(index_result['decode_problems']))
+    if st.session_state.get("index_root") and st.button("Clear Directory", key="btn_clear_dir"):
+        del st.session_state["index_root"]
+
+# Uploaded files take precedence; otherwise use the on-disk index of a directory
+project_index = None
+if not uploaded_files and st.session_state.get("index_root"):
+    project_index = ProjectIndex(default_index_path(st.session_state["index_root"]))
+
 all_functions = []
 file_function_map = {}
-all_code_strings = []
+file_code_map = {}
+metrics_table = None
+auto_refresh_run = False
+
+if project_index is not None or uploaded_files:
+    # NumPy (behind the metrics table) is only loaded once there is code to analyze
+    from parsers.metrics import MetricsTable
+
+if project_index is not None:
+    # Sources stay on disk and are only read when a step needs them
+    file_code_map = project_index.file_contents()
+    file_function_map = project_index.file_function_map()
+    for functions in file_function_map.values():
+        all_functions.extend(functions)
+    # Metrics were stored while indexing; build the table once per index state
+    metrics_key = (st.session_state["index_root"], project_index.state())
+    if st.session_state.get("metrics_table_key") != metrics_key:
+        with span("metrics", functions=len(all_functions)):
+            st.session_state["metrics_table"] = MetricsTable.from_functions(all_functions, project_index.function_metrics())
+        st.session_state["metrics_table_key"] = metrics_key
+    metrics_table = st.session_state["metrics_table"]
 
 if uploaded_files:
     with st.expander("📄 Uploaded Files Summary", expanded=True):
         for uploaded_file in uploaded_files:
             st.write(f"- {uploaded_file.name}")
 
-    for uploaded_file in uploaded_files:
-        if uploaded_file.name.endswith('.zip'):
-            with zipfile.ZipFile(uploaded_file, 'r') as zip_ref:
-                for file_info in zip_ref.filelist:
-                    if file_info.filename.endswith('.py'):
-                        try:
-                            with zip_ref.open(file_info.filename) as file:
-                                code_string = file.read().decode("utf-8")
-                                all_code_strings.append(code_string)
-                                functions = extract_functions(code_string)
-                                file_function_map[file_info.filename] = functions
-                                for func in functions:
-                                    func['file'] = file_info.filename
-                                    all_functions.append(func)
-                        except Exception as e:
-                            st.warning(f"Could not process {file_info.filename} from ZIP: {str(e)}")
-        else:
-            try:
-                code_string = uploaded_file.read().decode("utf-8")
-                all_code_strings.append(code_string)
-                functions = extract_functions(code_string)
-                file_function_map[uploaded_file.name] = functions
-                for func in functions:
-                    func['file'] = uploaded_file.name
-                    all_functions.append(func)
-            except Exception as e:
-                st.error(f"Could not process {uploaded_file.name}: {str(e)}")
+    decode_stats = DecodeStats()
+    with span("decode", files=len(uploaded_files)) as decode_span:
+        for uploaded_file in uploaded_files:
+            if uploaded_file.name.endswith('.zip'):
+                import zipfile
+
+                try:
+                    with zipfile.ZipFile(uploaded_file, 'r') as zip_ref:
+                        for file_info in zip_ref.infolist():
+                            if file_info.filename.endswith('.py') and not file_info.is_dir():
+                                # Decoded straight from the archive stream, honouring BOMs and coding cookies
+                                with zip_ref.open(file_info) as file:
+                                    code_string = decode_stats.decode(file_info.filename, file)
+                                if code_string is not None:
+                                    file_code_map[file_info.filename] = code_string
+                except zipfile.BadZipFile as e:
+                    st.error(f"Could not open {uploaded_file.name}: {str(e)}")
+            else:
+                code_string = decode_stats.decode(uploaded_file.name, uploaded_file.getvalue())
+                if code_string is not None:
+                    file_code_map[uploaded_file.name] = code_string
+        decode_span['bytes'] = decode_stats.summary()['bytes']
+
+    decode_summary = decode_stats.summary()
+    decode_problems = decode_stats.problems()
+    with st.expander(
+        f"🔤 Decoded {decode_summary['files']} files ({decode_summary['bytes'] / 1e6:.1f} MB in {decode_summary['seconds']:.2f}s)"
+        + (f" - {len(decode_problems)} need attention" if decode_problems else ""),
+        expanded=bool(decode_problems)
+    ):
+        st.caption(
+            "By method: " + ", ".join(f"{method} {count}" for method, count in decode_summary['methods'].items())
+            + ". By encoding: " + ", ".join(f"{encoding} {count}" for encoding, count in decode_summary['encodings'].items())
+        )
+        if decode_problems:
+            st.warning(
+                "Files without an encoding declaration were read as cp1252/latin-1 (fallback), "
+                "undecodable bytes were replaced (replaced), and unreadable files are skipped (failed)."
+            )
+            st.dataframe(
+                [
+                    {'File': record['file'], 'Method': record['method'], 'Encoding': record['encoding'],
+                     'Bytes': record['bytes'], 'Error': record['error']}
+                    for record in decode_problems
+                ],
+                use_container_width=True, hide_index=True
+            )
+
+    # Parse all files at once so large uploads are spread across CPU cores
+    with st.spinner(f"Parsing {len(file_code_map)} files..."):
+        with span("parse", files=len(file_code_map)), profile("parse"):
+            parsed_files = parse_files(file_code_map.items(), include_classes=False, cache=get_parse_cache())
+    for filename, parsed in parsed_files.items():
+        file_function_map[filename] = parsed['functions']
+        all_functions.extend(parsed['functions'])
+    # Metrics were computed in the same pass over each file's AST
+    with span("metrics", functions=len(all_functions)):
+        metrics_table = MetricsTable.from_parsed(parsed_files)
+    syntax_errors = [
+        dict(error, file=filename) for filename, parsed in parsed_files.items() for error in parsed['syntax_errors']
+    ]
+    if syntax_errors:
+        show_syntax_errors(syntax_errors)
+
+if nested_mode != MODE_ALL:
+    # Avoid sending nested code to the LLM twice
+    file_function_map = {
+        filename: partition_functions(functions, nested_mode)
+        for filename, functions in file_function_map.items()
+    }
+    all_functions = [func for functions in file_function_map.values() for func in functions]
+
+if uploaded_files or project_index is not None:
+    import numpy as np
+    from parsers.metrics import COLUMNS as METRIC_COLUMNS
+
+    if project_index is not None:
+        st.info(f"📂 Analyzing indexed directory: {st.session_state['index_root']}")
 
     st.header("2️⃣ Extraction Summary")
     st.success(f"✅ Total Functions Detected: {len(all_functions)}")
     
     if file_function_map:
-        for filename, functions in file_function_map.items():
-            st.write(f"📁 {filename}: {len(functions)} functions")
-            if functions:
-                with st.expander(f"Functions in {filename}"):
-                    for func in functions:
-                        st.code(f"Function: {func['name']}", language="text")
+        filter_col, search_col = st.columns(2)
+        selected_files = filter_col.multiselect("Files", list(file_function_map), placeholder="All files")
+        function_search = search_col.text_input("Search functions", key="txt_function_search")
+        sort_col, complexity_col, tokens_col = st.columns(3)
+        sort_metric = sort_col.selectbox("Sort by", ["source order"] + list(METRIC_COLUMNS), key="sel_function_sort")
+        min_complexity = complexity_col.number_input("Minimum complexity", min_value=1, value=1, key="num_min_complexity")
+        max_tokens = tokens_col.number_input("Maximum tokens (0 = no limit)", min_value=0, value=0, key="num_max_tokens")
+
+        # Filtering and sorting run on the metrics columns; only the analyzed units are listed
+        units = {metrics_table.position(func): func for func in all_functions}
+        mask = np.zeros(len(metrics_table), dtype=bool)
+        mask[[position for position in units if position is not None]] = True
+        mask &= metrics_table.match(selected_files, function_search)
+        mask &= metrics_table.query(complexity=(min_complexity, None), tokens=(None, max_tokens or None))
+        positions = np.flatnonzero(mask) if sort_metric == "source order" else metrics_table.order(sort_metric, mask=mask)
+        matching_functions = [units[position] for position in positions]
+        st.caption(f"{len(matching_functions)} of {len(all_functions)} functions in {len(file_function_map)} files")
+        st.dataframe(
+            [
+                dict(
+                    {'File': func['file'], 'Function': func['qualname'], 'Kind': func['kind'],
+                     'Start': func['start_line'], 'End': func['end_line']},
+                    **{name: record[name] for name in METRIC_COLUMNS}
+                )
+                for func, record in zip(matching_functions, metrics_table.records(positions))
+            ],
+            use_container_width=True, hide_index=True
+        )
+
+        # Source is only sent to the browser for the function being looked at
+        source_function = st.selectbox(
+            "Show source of", [None] + matching_functions[:MAX_SELECT_OPTIONS],
+            format_func=lambda func: "—" if func is None else f"{func['qualname']} ({func['file']})",
+            key="sel_function_source"
+        )
+        if source_function is not None:
+            st.code(source_function['source'], language="python")
     else:
         st.warning("No functions were extracted from the uploaded files.")
 
     st.header("3️⃣ Interlinked Functions Analysis")
     interlinks = []
-    func_name_to_file = {func['name']: func['file'] for func in all_functions}
     
-    for func in all_functions:
-        try:
-            tree = ast.parse(func['source'])
-            for node in ast.walk(tree):
-                if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
-                    called_func = node.func.id
-                    if called_func in func_name_to_file and func_name_to_file[called_func] != func['file']:
-                        interlinks.append((func['name'], func['file'], called_func, func_name_to_file[called_func]))
-        except Exception as e:
-            st.warning(f"Could not analyze function {func['name']}: {str(e)}")
-            continue
+    with span("interlink", functions=len(all_functions)):
+        if project_index is not None:
+            # Call edges were stored at indexing time, no need to re-parse sources
+            interlinks = project_index.find_interlinks()
+        else:
+            # Calls were recorded while parsing, no need to walk the ASTs again
+            interlinks = metrics_table.interlinks()
     
     if interlinks:
         st.info(f"Found {len(interlinks)} interlinked function calls:")
-        for src_func, src_file, tgt_func, tgt_file in interlinks:
-            st.write(f"🔗 `{src_func}` in `{src_file}` calls `{tgt_func}` in `{tgt_file}`")
+        interlink_search = st.text_input("Search interlinks", key="txt_interlink_search").lower()
+        st.dataframe(
+            [
+                {'Caller': src_func, 'Caller File': src_file, 'Calls': tgt_func, 'Callee File': tgt_file}
+                for src_func, src_file, tgt_func, tgt_file in interlinks
+                if not interlink_search or any(interlink_search in value.lower() for value in (src_func, src_file, tgt_func, tgt_file))
+            ],
+            use_container_width=True, hide_index=True
+        )
     else:
         st.info("No interlinked functions detected across files.")
 
     st.header("4️⃣ Generate Business Requirements Document (BRD)")
+    job_queue = get_job_queue()
+
+    with st.expander("⏳ Estimated calls, tokens and duration"):
+        total_code_chars = (
+            project_index.stats()['characters'] if project_index is not None
+            else sum(len(code_string) for code_string in file_code_map.values())
+        )
+        max_parallel = get_llm_scheduler().max_concurrent
+        # Hierarchical runs send up to `summary_workers` requests at once, other modes one per job worker
+        selected_concurrency = min(max_parallel, summary_workers if processing_mode == "Hierarchical Rollup" else JOB_WORKERS)
+        concurrency_levels = sorted({1, 2, 4, 8, selected_concurrency})
+        estimates = estimate_options(
+            file_function_map, total_code_chars, model, concurrency_levels, stats=get_throughput_stats(),
+            router=get_model_router(), metrics_table=metrics_table
+        )
+
+        selected = next(
+            (estimate for estimate in estimates
+             if estimate['mode'] == processing_mode
+             and estimate['concurrency'] == (1 if processing_mode == "Batch Processing" else selected_concurrency)),
+            None
+        )
+        if selected:
+            calls_col, prompt_col, output_col, time_col = st.columns(4)
+            calls_col.metric("LLM calls", f"{selected['calls']:,}")
+            prompt_col.metric("Prompt tokens", f"{selected['prompt_tokens']:,}")
+            output_col.metric("Output tokens", f"{selected['output_tokens']:,}")
+            time_col.metric("Expected duration", format_duration(selected['wall_seconds']))
+            if selected['context_overflows']:
+                st.warning(f"{selected['context_overflows']} prompts are longer than the model's context window and will be cut off.")
+
+        st.dataframe(
+            [
+                {
+                    'Mode': estimate['mode'], 'Parallel requests': estimate['concurrency'],
+                    'Calls': estimate['calls'], 'Prompt tokens': estimate['prompt_tokens'],
+                    'Output tokens': estimate['output_tokens'], 'GPU time': format_duration(estimate['gpu_seconds']),
+                    'Duration': format_duration(estimate['wall_seconds'])
+                }
+                for estimate in estimates
+            ],
+            use_container_width=True, hide_index=True
+        )
+        observed_calls = estimates[0]['observed_calls'] if estimates else 0
+        st.caption(
+            f"Based on {observed_calls} observed calls to {model}." if observed_calls
+            else f"No calls to {model} observed yet; using typical token rates. Estimates improve after the first run."
+        )
+        if triage_functions:
+            st.caption("With triage, Individual mode makes fewer calls than shown: trivial functions need none and routine ones share a prompt.")
+        if max_parallel < max(concurrency_levels):
+            st.caption(f"This server sends at most {max_parallel} requests to Ollama at once (BARE_LLM_CONCURRENCY).")
 
     if st.button("🚀 Start BRD Generation", key="btn_brd_start"):
-        if not all_code_strings:
+        if not file_code_map:
             st.error("No code was extracted from uploaded files. Please check your files and try again.")
             st.stop()
-        
-        all_outputs = []
-        
-        # Generate FULL PROJECT BRD FIRST
-        st.subheader("🔄 Generating Full Project Business Requirements...")
-        full_code = "\n\n# === FILE SEPARATOR ===\n\n".join(all_code_strings)
-        
-        if len(full_code.strip()) == 0:
-            st.error("No code content found to analyze.")
-            st.stop()
-        
-        try:
-            with st.spinner("Generating full project BRD..."):
-                st.write(f"Debug: Code length = {len(full_code)} characters")
-                full_output = generate_brd(full_code, model)
-                
-                if full_output and not full_output.startswith("Error:"):
-                    all_outputs.append(("Full Project Analysis", full_output))
-                    st.success("✅ Full project BRD generated successfully!")
-                else:
-                    st.error(f"Failed to generate full project BRD: {full_output}")
-                    
-        except Exception as e:
-            st.error(f"Error generating full project BRD: {str(e)}")
+
+        jobs = []
+        # Imported here: the semantic index loads NumPy
+        from llm_engine.semantic_index import default_semantic_index_path
+
+        # One embedding index per directory or set of uploaded files, reused by later runs
+        semantic = {
+            'index_path': default_semantic_index_path(
+                st.session_state["index_root"] if project_index is not None else "uploads:" + "\n".join(sorted(file_code_map))
+            ),
+            'embedding_model': embedding_model
+        } if semantic_selection else None
+
+        if processing_mode == "Hierarchical Rollup":
+            # Build the project BRD bottom-up from function, class and module summaries
+            jobs.append({
+                'kind': 'hierarchical_brd',
+                'title': "Full Project Analysis",
+                'payload': {
+                    'functions': [
+                        dict(func.to_dict(), metrics=metrics_table.metrics(func))
+                        for functions in file_function_map.values() for func in functions
+                    ],
+                    'max_workers': summary_workers,
+                    # Left out when unused so earlier journaled rollups still match
+                    **({'semantic': semantic} if semantic else {})
+                }
+            })
+        elif semantic is not None and all_functions:
+            # Only the code most relevant to each BRD section goes into the project prompt
+            jobs.append({
+                'kind': 'semantic_brd',
+                'title': "Full Project Analysis",
+                'payload': dict(semantic, functions=[
+                    {key: func[key] for key in ('name', 'qualname', 'file', 'start_line', 'source')}
+                    for func in all_functions
+                ])
+            })
+        else:
+            # Generate FULL PROJECT BRD FIRST
+            full_code = join_code(file_code_map.values(), FULL_PROJECT_PAYLOAD_CHARS)
+
+            if len(full_code.strip()) == 0:
+                st.error("No code content found to analyze.")
+                st.stop()
+
+            jobs.append({
+                'kind': 'brd',
+                'title': "Full Project Analysis",
+                'payload': {'code': full_code}
+            })
 
         # Generate per-function BRDs if requested and functions exist
         if all_functions and processing_mode == "Individual Functions (Recommended)":
-            st.subheader("🔄 Generating Individual Function BRDs...")
-            
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            
-            for i, func in enumerate(all_functions):
-                progress = (i + 1) / len(all_functions)
-                progress_bar.progress(progress)
-                status_text.text(f"Processing function {i + 1}/{len(all_functions)}: {func['name']}")
-                
-                try:
-                    with st.spinner(f"Generating BRD for function: {func['name']}"):
-                        func_code = f"# Function from file: {func['file']}\n\n{func['source']}"
-                        output = generate_brd(func_code, model)
-                        
-                        if output and not output.startswith("Error:"):
-                            all_outputs.append((f"Function: {func['name']} ({func['file']})", output))
-                        else:
-                            st.warning(f"Could not generate BRD for function {func['name']}: {output}")
-                            
-                except Exception as e:
-                    st.warning(f"Error processing function {func['name']}: {str(e)}")
-            
-            progress_bar.empty()
-            status_text.empty()
+            if triage_functions:
+                with span("triage", functions=len(all_functions)):
+                    triaged_jobs, triage = build_triaged_jobs(all_functions, triage_model=triage_model, metrics_table=metrics_table)
+                jobs.extend(triaged_jobs)
+                categories = Counter(result['category'] for _, result in triage)
+                st.info(
+                    f"Triage: {categories[CRITICAL]} business-critical functions analyzed individually, "
+                    f"{categories[ROUTINE]} routine functions batched, {categories[TRIVIAL]} trivial functions templated."
+                )
+            else:
+                for func in all_functions:
+                    jobs.append({
+                        'kind': 'brd',
+                        'title': f"Function: {func['qualname']} ({func['file']})",
+                        'payload': {
+                            'code': f"# Function from file: {func['file']}\n\n{func['source']}",
+                            'metrics': metrics_table.metrics(func)
+                        }
+                    })
+
+        st.session_state["brd_run_id"] = job_queue.submit_run(
+            jobs, model, description=f"{processing_mode}, {len(file_code_map)} files", owner=owner
+        )
+        st.success(f"✅ Queued {len(jobs)} BRD jobs. They keep running if you close this page.")
+
+    # Earlier runs (including ones from before a restart) can be reopened
+    recent_runs = job_queue.recent_runs(owner=owner)
+    if recent_runs:
+        run_labels = {
+            run['id']: f"{datetime.datetime.fromtimestamp(run['created']).strftime('%Y-%m-%d %H:%M')} - "
+                       f"{run['description']} ({run['model']}, {run['finished'] or 0}/{run['total']} jobs)"
+            for run in recent_runs
+        }
+        run_ids = list(run_labels)
+        current_run = st.session_state.get("brd_run_id")
+        st.session_state["brd_run_id"] = st.selectbox(
+            "BRD runs", run_ids, format_func=run_labels.get,
+            index=run_ids.index(current_run) if current_run in run_ids else 0
+        )
+
+    run_id = st.session_state.get("brd_run_id")
+    run_status = job_queue.run_status(run_id) if run_id else None
+
+    if run_status and not run_status['complete']:
+        st.subheader("🔄 Generating Business Requirements in the background...")
+        finished = run_status['done'] + run_status['failed'] + run_status['cancelled']
+        st.progress(finished / run_status['total'])
+        st.text(
+            f"{run_status['done']} done, {run_status['failed']} failed, "
+            f"{run_status['running']} running, {run_status['queued']} queued"
+        )
+        for job in run_status['running_jobs']:
+            st.text(f"▶ {job['title']}" + (f" ({job['progress']})" if job['progress'] else ""))
+
+        refresh_col, cancel_col, auto_col = st.columns(3)
+        if refresh_col.button("🔄 Refresh", key="btn_brd_refresh"):
+            st.rerun()
+        if cancel_col.button("⏹ Cancel Run", key="btn_brd_cancel"):
+            job_queue.cancel_run(run_id)
+            st.rerun()
+        auto_refresh_run = auto_col.checkbox("Auto-refresh", value=True, key="chk_brd_auto_refresh")
+
+        # Every finished job is already journaled, so its output can be exported before the run ends
+        if export_pdf and run_status['done'] and st.button(
+            f"📄 Export the {run_status['done']} finished BRDs so far", key="btn_brd_partial_pdf"
+        ):
+            try:
+                with st.spinner("Building PDF..."):
+                    with span("pdf_export", documents=run_status['done'], partial=True):
+                        partial_pdf = build_brd_pdf([
+                            (job['title'], job['result'])
+                            for job in job_queue.run_results(run_id) if job['kind'] != 'hierarchical_brd'
+                        ])
+                st.download_button(
+                    label="📥 Download partial PDF",
+                    data=partial_pdf,
+                    file_name=f"business_requirements_partial_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
+                    mime="application/pdf"
+                )
+            except Exception as e:
+                st.error(f"Error generating PDF: {str(e)}")
+
+    elif run_status:
+        # Only titles are loaded here; BRD text is read from the queue when shown or exported
+        output_entries = []
+        failed_jobs = []
+        rollup_errors = []
+
+        for job in job_queue.run_results(run_id, include_failed=True, with_results=False):
+            if job['status'] != 'done':
+                if job['title'] == "Full Project Analysis":
+                    st.error(f"Failed to generate full project BRD: {job['error']}")
+                else:
+                    failed_jobs.append({'Job': job['title'], 'Error': job['error']})
+            elif job['kind'] == 'hierarchical_brd':
+                rollup = json.loads(job_queue.job_result(job['id']))
+                output_entries.append({'title': job['title'], 'content': rollup['project_brd']})
+                for filename, summary in rollup['modules'].items():
+                    output_entries.append({'title': f"Module: {filename}", 'content': summary})
+                rollup_errors.extend(rollup['errors'])
+            else:
+                output_entries.append({'title': job['title'], 'job_id': job['id']})
+
+        def load_output(entry):
+            if 'content' not in entry:
+                entry['content'] = job_queue.job_result(entry['job_id'])
+            return entry['content']
+
+        if failed_jobs:
+            with st.expander(f"⚠️ Could not generate {len(failed_jobs)} BRDs"):
+                st.dataframe(failed_jobs, use_container_width=True, hide_index=True)
+
+        unfinished = run_status['failed'] + run_status['cancelled']
+        if unfinished and st.button(f"🔁 Resume run ({unfinished} failed or cancelled jobs)", key="btn_brd_resume"):
+            # Finished jobs keep their results; only the rest runs again
+            job_queue.resume_run(run_id)
+            st.session_state.pop(f"brd_pdf_{run_id}", None)
+            st.rerun()
+
+        if rollup_errors:
+            with st.expander(f"⚠️ {len(rollup_errors)} summaries failed"):
+                st.dataframe([{'Error': error} for error in rollup_errors], use_container_width=True, hide_index=True)
+
+        if project_index is not None and run_id not in st.session_state.setdefault("stored_runs", set()):
+            # Keep per-function BRDs with the index so they survive re-indexing
+            output_keys = {
+                f"Function: {func['qualname']} ({func['file']})": f"{func['file']}::{func['qualname']}::{func['start_line']}"
+                for func in all_functions
+            }
+            for entry in output_entries:
+                if entry['title'] in output_keys:
+                    project_index.store_output(output_keys[entry['title']], "brd", model, load_output(entry))
+            st.session_state["stored_runs"].add(run_id)
 
         # Display results
-        if all_outputs:
-            st.success(f"✅ Generated {len(all_outputs)} Business Requirements!")
+        if output_entries:
+            st.success(f"✅ Generated {len(output_entries)} Business Requirements!")
             
-            # Create tabs for each output
-            if len(all_outputs) > 1:
-                tabs = st.tabs([output[0] for output in all_outputs])
-                for i, (title, content) in enumerate(all_outputs):
-                    with tabs[i]:
-                        st.markdown(content)
+            # Show one BRD at a time instead of a tab per BRD
+            if len(output_entries) > 1:
+                brd_search = st.text_input("Filter BRDs by title", key="txt_brd_search")
+                matching_entries = [entry for entry in output_entries if brd_search.lower() in entry['title'].lower()]
+                st.caption(f"{len(matching_entries)} of {len(output_entries)} BRDs match")
+                selected_entry = st.selectbox(
+                    "Business Requirements", matching_entries[:MAX_SELECT_OPTIONS],
+                    format_func=lambda entry: entry['title'], key="sel_brd_entry"
+                )
+                if len(matching_entries) > MAX_SELECT_OPTIONS:
+                    st.caption(f"Showing the first {MAX_SELECT_OPTIONS}; refine the filter to find others.")
+                if selected_entry is not None:
+                    st.markdown("### " + selected_entry['title'])
+                    st.markdown(load_output(selected_entry))
             else:
-                st.markdown("### " + all_outputs[0][0])
-                st.markdown(all_outputs[0][1])
+                st.markdown("### " + output_entries[0]['title'])
+                st.markdown(load_output(output_entries[0]))
                 
         else:
             st.error("No business requirements could be generated. Please check your LLM connection and try again.")
 
         # PDF Export
-        if export_pdf and all_outputs:
+        if export_pdf and output_entries:
             st.header("5️⃣ Download BRD as PDF")
-            
-            try:
-                pdf = FPDF()
-                pdf.add_page()
-                pdf.set_font("Arial", "B", 16)
-                pdf.cell(0, 10, "Business Requirements Document", 0, 1, "C")
-                pdf.ln(10)
-                pdf.set_font("Arial", "", 10)
-                pdf.cell(0, 10, f"Generated on {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", 0, 1, "R")
-                pdf.ln(10)
-                
-                for i, (title, content) in enumerate(all_outputs):
-                    if i > 0:
-                        pdf.add_page()
-                    
-                    pdf.set_font("Arial", "B", 14)
-                    # Handle title encoding
-                    safe_title = title.encode('latin-1', 'replace').decode('latin-1')
-                    pdf.cell(0, 10, safe_title, 0, 1, "L")
-                    pdf.ln(5)
-                    
-                    pdf.set_font("Arial", "", 10)
-                    # Handle content encoding and split into chunks
-                    safe_content = content.encode('latin-1', 'replace').decode('latin-1')
-                    
-                    # Split content into smaller chunks to avoid PDF issues
-                    lines = safe_content.split('\n')
-                    for line in lines:
-                        if len(line) > 180:  # Split very long lines
-                            words = line.split(' ')
-                            current_line = ""
-                            for word in words:
-                                if len(current_line + word) < 180:
-                                    current_line += word + " "
-                                else:
-                                    if current_line:
-                                        pdf.cell(0, 6, current_line.strip(), 0, 1, "L")
-                                    current_line = word + " "
-                            if current_line:
-                                pdf.cell(0, 6, current_line.strip(), 0, 1, "L")
-                        else:
-                            pdf.cell(0, 6, line, 0, 1, "L")
-                    
-                    pdf.ln(5)
-                
-                pdf_bytes = pdf.output(dest='S').encode('latin1')
+            pdf_key = f"brd_pdf_{run_id}"
+
+            # Large runs are only rendered to PDF when asked for
+            if pdf_key not in st.session_state and (
+                len(output_entries) <= PDF_AUTO_BUILD_OUTPUTS
+                or st.button(f"📄 Prepare PDF ({len(output_entries)} documents)", key="btn_brd_pdf")
+            ):
+                try:
+                    with st.spinner("Building PDF..."):
+                        with span("pdf_export", documents=len(output_entries)):
+                            st.session_state[pdf_key] = build_brd_pdf(
+                                [(entry['title'], load_output(entry)) for entry in output_entries]
+                            )
+                except Exception as e:
+                    st.error(f"Error generating PDF: {str(e)}")
+
+            if pdf_key in st.session_state:
                 st.download_button(
                     label="📥 Download PDF", 
-                    data=pdf_bytes, 
+                    data=st.session_state[pdf_key], 
                     file_name=f"business_requirements_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf", 
                     mime="application/pdf"
                 )
-                
-            except Exception as e:
-                st.error(f"Error generating PDF: {str(e)}")
 
     st.header("6️⃣ Generate Business Process Flow Diagram")
+    st.caption("The flowchart is derived directly from the code's control flow; the LLM only adds business labels.")
+
+    # Flow targets: every function plus the top-level code of each file; only
+    # the first MAX_SELECT_OPTIONS matches are sent to the browser
+    flow_search = st.text_input("Filter code to chart", key="txt_flow_search").lower()
+    flow_targets = {}
+    flow_matches = 0
+    for filename, functions in file_function_map.items():
+        for qualname in [None] + [func['qualname'] for func in functions if func['kind'] != 'lambda']:
+            target = f"{filename} :: {qualname or '<module>'}"
+            if flow_search in target.lower():
+                flow_matches += 1
+                if len(flow_targets) < MAX_SELECT_OPTIONS:
+                    flow_targets[target] = (filename, qualname)
+    st.caption(f"{flow_matches} matching files and functions")
+
+    selected_target = st.selectbox(
+        "Select code to chart", options=list(flow_targets.keys()), key="sel_flow_target"
+    ) if flow_targets else None
+    if flow_matches > MAX_SELECT_OPTIONS:
+        st.caption(f"Showing the first {MAX_SELECT_OPTIONS}; refine the filter to find others.")
+    label_with_llm = st.checkbox("Add business labels with the LLM (single call)", value=True)
+
     if st.button("📊 Generate Process Flow Diagram", key="btn_process_flow"):
-        if not all_code_strings:
+        if not selected_target:
             st.error("No code available for process flow analysis.")
             st.stop()
-        
-        full_code = "\n\n# === FILE SEPARATOR ===\n\n".join(all_code_strings)
-        
+
+        flow_file, flow_function = flow_targets[selected_target]
+
         try:
-            with st.spinner("Extracting business process flow from code..."):
-                process_flow = generate_process_flow(full_code, model)
-                
-                if process_flow and not process_flow.startswith("Error:"):
-                    st.success("✅ Process Flow Extracted!")
-                    st.markdown("### Process Steps:")
-                    st.markdown(process_flow)
-                    
-                    # Generate Mermaid diagram
-                    st.markdown("### Visual Flowchart:")
-                    try:
-                        mermaid_code = "graph TD\n"
-                        step_counter = 0
-                        
-                        lines = process_flow.splitlines()
-                        valid_steps = []
-                        
-                        for line in lines:
-                            if line.strip() and ("step" in line.lower() or line.startswith(str(step_counter + 1))):
-                                # Extract step description
-                                if ":" in line:
-                                    step_desc = line.split(":", 1)[1].strip()
-                                else:
-                                    step_desc = line.strip()
-                                
-                                # Clean step description
-                                step_desc = step_desc.replace("[", "").replace("]", "").replace("(", "").replace(")", "")
-                                if len(step_desc) > 50:
-                                    step_desc = step_desc[:47] + "..."
-                                
-                                valid_steps.append(step_desc)
-                                step_counter += 1
-                        
-                        # Build mermaid diagram
-                        for i, step in enumerate(valid_steps):
-                            safe_step = step.replace('"', "'").replace('\n', ' ')
-                            mermaid_code += f'    Step{i}["{safe_step}"]\n'
-                            
-                            if i > 0:
-                                mermaid_code += f"    Step{i-1} --> Step{i}\n"
-                        
-                        st.code(mermaid_code, language="mermaid")
-                        
-                    except Exception as e:
-                        st.warning(f"Could not generate flowchart diagram: {str(e)}")
-                        
-                else:
-                    st.error(f"Failed to generate process flow: {process_flow}")
-                    
+            with span("flow_graph", target=selected_target):
+                graph = build_flow_graph(file_code_map[flow_file], flow_function)
+
+            if not graph:
+                st.error(f"Could not build a control flow graph for {selected_target}.")
+            else:
+                decision_points = list_decision_points(graph)
+                st.success(f"✅ Control flow extracted: {len(graph['nodes'])} steps, {len(decision_points)} decision points")
+                if graph['truncated']:
+                    st.warning("The flow is very large and was truncated. Chart a smaller function for full detail.")
+
+                labels = {}
+                if label_with_llm:
+                    with st.spinner("Generating business labels for the flow..."):
+                        labels = generate_flow_labels(graph, model, cache=get_response_cache())
+                    if not labels:
+                        st.warning("Could not generate business labels, showing code instead.")
+
+                st.markdown("### Process Steps:")
+                step_lines = []
+                for node in graph['nodes']:
+                    if node['kind'] in ('start', 'end'):
+                        continue
+                    label = labels.get(node['id'], node['text'])
+                    line_info = f" (line {node['line']})" if node['line'] else ""
+                    step_lines.append(f"- **{node['id']}** [{node['kind']}] {label}{line_info}")
+                st.markdown("\n".join(step_lines) if step_lines else "No steps found.")
+
+                st.markdown("### Visual Flowchart:")
+                with span("mermaid_build", nodes=len(graph['nodes'])):
+                    mermaid_source = to_mermaid(graph, labels)
+                st.code(mermaid_source, language="mermaid")
+
         except Exception as e:
             st.error(f"Error generating process flow: {str(e)}")
 
@@ -304,4 +888,15 @@ else:
     - StarCoder
     - WizardCoder
     - CodeLlama 13B
-    """)
\ No newline at end of file
+    """)
+
+if show_performance:
+    show_performance_panel([session_owner, st.session_state.get("brd_run_id") or ""])
+
+if st.query_params.get("admin"):
+    show_admin_view(get_job_queue())
+
+if auto_refresh_run:
+    # Poll the background run until it finishes
+    time.sleep(2)
+    st.rerun()
@@ -0,0 +1,385 @@
+import math
+import os
+import sqlite3
+import threading
+
+from llm_engine.hierarchical_summary import (
+    DEFAULT_FUNCTION_PROMPT, DEFAULT_PROJECT_PROMPT, DEFAULT_ROLLUP_PROMPT,
+    MAX_UNIT_CHARS, SUMMARY_BUDGET, group_functions
+)
+from llm_engine.run_local_llm import load_brd_prompt, load_prompt
+
+DEFAULT_STATS_PATH = os.path.join(".bare_cache", "llm_stats.sqlite")
+
+# Processing modes offered by the UI
+MODE_INDIVIDUAL = "Individual Functions (Recommended)"
+MODE_BATCH = "Batch Processing"
+MODE_HIERARCHICAL = "Hierarchical Rollup"
+PROCESSING_MODES = (MODE_INDIVIDUAL, MODE_BATCH, MODE_HIERARCHICAL)
+
+# Characters per token for source code by model family (Llama/StarCoder style
+# BPE vocabularies), used until calls to the model have been observed
+CODE_CHARS_PER_TOKEN = {
+    'mistral': 3.4,
+    'codellama': 3.2,
+    'starcoder': 3.6,
+    'wizardcoder': 3.6,
+}
+DEFAULT_CHARS_PER_TOKEN = 3.5
+# Generated summaries are prose
+PROSE_CHARS_PER_TOKEN = 4.0
+
+# Typical response length per task before any run has been observed
+DEFAULT_OUTPUT_TOKENS = {
+    'brd': 1200,
+    'function summary': 150,
+    'class summary': 250,
+    'module summary': 350,
+    'project BRD': 1200,
+    'flow label': 200,
+    'triage': 100,
+    'process flow': 800,
+}
+TASK_KINDS = tuple(kind for kind in DEFAULT_OUTPUT_TOKENS if kind != 'brd')
+
+# Throughput of a 7-13B model on a single consumer GPU, until observed
+DEFAULT_PROMPT_TOKENS_PER_SECOND = 400.0
+DEFAULT_OUTPUT_TOKENS_PER_SECOND = 20.0
+CALL_OVERHEAD_SECONDS = 0.3
+# Each extra parallel request adds this fraction of a request's throughput;
+# Ollama batches parallel requests on one GPU, so scaling is sub-linear
+PARALLEL_EFFICIENCY = 0.6
+# Ollama silently truncates prompts longer than the context window
+DEFAULT_NUM_CTX = 4096
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    model TEXT NOT NULL,
+    task TEXT NOT NULL,
+    calls INTEGER NOT NULL,
+    prompt_chars INTEGER NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    prompt_seconds REAL NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    output_seconds REAL NOT NULL,
+    wall_seconds REAL NOT NULL,
+    PRIMARY KEY (model, task)
+)
+"""
+
+
+def task_kind(task):
+    """Map a call_ollama task label (e.g. "function summary pkg.f") to its prompt kind."""
+    for kind in TASK_KINDS:
+        if task.startswith(kind):
+            return kind
+    return 'brd'
+
+
+def _model_family(model):
+    return model.split(":", 1)[0].lower()
+
+
+def default_rates(model):
+    """Rates assumed for a model that has not been observed yet."""
+    return {
+        'observed_calls': 0,
+        'chars_per_token': CODE_CHARS_PER_TOKEN.get(_model_family(model), DEFAULT_CHARS_PER_TOKEN),
+        'prompt_tokens_per_second': DEFAULT_PROMPT_TOKENS_PER_SECOND,
+        'output_tokens_per_second': DEFAULT_OUTPUT_TOKENS_PER_SECOND,
+        'output_tokens': dict(DEFAULT_OUTPUT_TOKENS)
+    }
+
+
+class ThroughputStats:
+    """Aggregated token counts and timings of past Ollama calls, per model and task.
+
+    Install `record` with run_local_llm.set_call_observer() to collect them.
+    """
+
+    def __init__(self, path=DEFAULT_STATS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._connection.execute(SCHEMA)
+            self._connection.commit()
+
+    def record(self, model, task, prompt_chars, response, wall_seconds):
+        """Add one call; `response` is the JSON body returned by Ollama."""
+        prompt_tokens = response.get("prompt_eval_count") or 0
+        output_tokens = response.get("eval_count") or 0
+        row = (
+            model, task_kind(task), prompt_chars if prompt_tokens else 0, prompt_tokens,
+            (response.get("prompt_eval_duration") or 0) / 1e9, output_tokens,
+            (response.get("eval_duration") or 0) / 1e9, wall_seconds
+        )
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO observations VALUES (?, ?, 1, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (model, task) DO UPDATE SET calls = calls + 1, "
+                "prompt_chars = prompt_chars + excluded.prompt_chars, "
+                "prompt_tokens = prompt_tokens + excluded.prompt_tokens, "
+                "prompt_seconds = prompt_seconds + excluded.prompt_seconds, "
+                "output_tokens = output_tokens + excluded.output_tokens, "
+                "output_seconds = output_seconds + excluded.output_seconds, "
+                "wall_seconds = wall_seconds + excluded.wall_seconds",
+                row
+            )
+            self._connection.commit()
+
+    def rates(self, model):
+        """Observed (or default) tokens/s, chars/token and output tokens per task for a model."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT task, calls, prompt_chars, prompt_tokens, prompt_seconds, output_tokens, output_seconds "
+                "FROM observations WHERE model = ?",
+                (model,)
+            ).fetchall()
+
+        rates = default_rates(model)
+        rates['observed_calls'] = sum(row[1] for row in rows)
+        prompt_chars = sum(row[2] for row in rows)
+        prompt_tokens = sum(row[3] for row in rows)
+        prompt_seconds = sum(row[4] for row in rows)
+        output_tokens = sum(row[5] for row in rows)
+        output_seconds = sum(row[6] for row in rows)
+
+        if prompt_tokens:
+            rates['chars_per_token'] = prompt_chars / prompt_tokens
+        if prompt_seconds:
+            rates['prompt_tokens_per_second'] = prompt_tokens / prompt_seconds
+        if output_seconds:
+            rates['output_tokens_per_second'] = output_tokens / output_seconds
+        for task, task_calls, _, _, _, task_output_tokens, _ in rows:
+            if task_output_tokens:
+                rates['output_tokens'][task] = task_output_tokens / task_calls
+        return rates
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def _unit_chars(func):
+    # Span length avoids reading sources that live in the on-disk index
+    if hasattr(func, 'end_offset'):
+        return func.end_offset - func.start_offset
+    return len(func['source'])
+
+
+def _file_header_chars(filename):
+    return len(f"# Function from file: {filename}\n\n")
+
+
+class _Plan:
+    """Calls of one run, grouped into stages that must finish one after another.
+
+    Each call's context window comes from `router` (a model_router.ModelRouter)
+    when one is installed, as call_ollama would pick it, and is `num_ctx` otherwise.
+    Calls about one function pass its metrics, so size-limited routes such as
+    "small function" match as they do at run time.
+    """
+
+    def __init__(self, rates, num_ctx, model=None, router=None):
+        self.rates = rates
+        self.num_ctx = num_ctx
+        self.model = model
+        self.router = router
+        self.stages = []
+
+    def stage(self, name):
+        self.stages.append({'name': name, 'calls': []})
+
+    def call(self, kind, prompt_chars, metrics=None):
+        prompt_tokens = math.ceil(prompt_chars / self.rates['chars_per_token'])
+        num_ctx = self.num_ctx
+        if self.router is not None:
+            num_ctx = self.router.decide(self.model, kind, prompt_tokens, metrics, rates=self.rates)['num_ctx']
+        self.stages[-1]['calls'].append({
+            'kind': kind,
+            'prompt_tokens': prompt_tokens,
+            'output_tokens': self.rates['output_tokens'].get(kind, DEFAULT_OUTPUT_TOKENS['brd']),
+            'num_ctx': num_ctx
+        })
+
+    def summarize(self, concurrency):
+        rates = self.rates
+        calls = prompt_tokens = output_tokens = overflows = 0
+        gpu_seconds = wall_seconds = 0.0
+        for stage in self.stages:
+            stage_seconds = 0.0
+            for call in stage['calls']:
+                if call['prompt_tokens'] > call['num_ctx']:
+                    overflows += 1
+                # Ollama drops whatever does not fit the context window
+                effective_prompt = min(call['prompt_tokens'], call['num_ctx'])
+                stage_seconds += (
+                    effective_prompt / rates['prompt_tokens_per_second']
+                    + call['output_tokens'] / rates['output_tokens_per_second']
+                    + CALL_OVERHEAD_SECONDS
+                )
+                prompt_tokens += effective_prompt
+                output_tokens += call['output_tokens']
+            calls += len(stage['calls'])
+            gpu_seconds += stage_seconds
+            parallel = min(concurrency, len(stage['calls'])) or 1
+            wall_seconds += stage_seconds / (1 + (parallel - 1) * PARALLEL_EFFICIENCY)
+        return {
+            'calls': calls,
+            'prompt_tokens': prompt_tokens,
+            'output_tokens': output_tokens,
+            'context_overflows': overflows,
+            'gpu_seconds': gpu_seconds,
+            'wall_seconds': wall_seconds
+        }
+
+
+def _template_chars(template):
+    return len(template.replace("{{CODE_BLOCK}}", "").replace("{{SUMMARY_BLOCK}}", "").replace("{{NAME}}", ""))
+
+
+def _rollup_calls(plan, kind, reduce_kind, item_chars, name_chars):
+    """Add the calls HierarchicalSummarizer.rollup makes for items of the given sizes."""
+    total = sum(item_chars)
+    if total > SUMMARY_BUDGET and len(item_chars) > 1:
+        parts = math.ceil(total / SUMMARY_BUDGET)
+        for _ in range(parts):
+            plan.call(reduce_kind, name_chars + min(total / parts, MAX_UNIT_CHARS))
+        total = parts * plan.rates['output_tokens'][reduce_kind] * PROSE_CHARS_PER_TOKEN
+    plan.call(kind, name_chars + min(total, MAX_UNIT_CHARS))
+
+
+def _summary_chars(plan, kind):
+    return plan.rates['output_tokens'][kind] * PROSE_CHARS_PER_TOKEN
+
+
+def _plan_run(file_function_map, total_code_chars, mode, rates, num_ctx, model=None, router=None, metrics_table=None):
+    plan = _Plan(rates, num_ctx, model, router)
+    # Only routing looks at function metrics
+    if router is not None and metrics_table is not None:
+        metrics_for = metrics_table.metrics
+    else:
+        def metrics_for(func):
+            return None
+
+    if mode in (MODE_INDIVIDUAL, MODE_BATCH):
+        brd_overhead = _template_chars(load_brd_prompt())
+        # Same truncation as generate_brd
+        full_prompt = brd_overhead + total_code_chars
+        if full_prompt > 32000:
+            full_prompt = brd_overhead + 20000
+        # Individual mode queues the project and function jobs together
+        plan.stage("brd")
+        plan.call('brd', full_prompt)
+
+        if mode == MODE_INDIVIDUAL:
+            for filename, functions in file_function_map.items():
+                for func in functions:
+                    plan.call('brd', brd_overhead + _file_header_chars(filename) + _unit_chars(func), metrics_for(func))
+        return plan
+
+    function_overhead = _template_chars(load_prompt("function_summary_prompt.txt", DEFAULT_FUNCTION_PROMPT))
+    class_overhead = _template_chars(load_prompt("class_summary_prompt.txt", DEFAULT_ROLLUP_PROMPT))
+    module_overhead = _template_chars(load_prompt("module_summary_prompt.txt", DEFAULT_ROLLUP_PROMPT))
+    project_overhead = _template_chars(load_prompt("project_brd_prompt.txt", DEFAULT_PROJECT_PROMPT))
+    function_summary = _summary_chars(plan, 'function summary')
+    class_summary = _summary_chars(plan, 'class summary')
+    module_summary = _summary_chars(plan, 'module summary')
+
+    plan.stage("functions")
+    for filename, functions in file_function_map.items():
+        for func in functions:
+            plan.call(
+                'function summary', function_overhead + _file_header_chars(filename) + min(_unit_chars(func), MAX_UNIT_CHARS),
+                metrics_for(func)
+            )
+
+    modules = group_functions(file_function_map)
+    plan.stage("classes")
+    for module in modules.values():
+        for class_name, methods in module['classes'].items():
+            _rollup_calls(
+                plan, 'class summary', 'class summary',
+                [len(method['qualname']) + function_summary + 6 for method in methods],
+                class_overhead + len(class_name)
+            )
+
+    plan.stage("modules")
+    for filename, module in modules.items():
+        items = [len(class_name) + class_summary + 12 for class_name in module['classes']]
+        items += [len(func['qualname']) + function_summary + 15 for func in module['functions']]
+        if items:
+            _rollup_calls(plan, 'module summary', 'module summary', items, module_overhead + len(filename))
+
+    plan.stage("project")
+    items = [len(filename) + module_summary + 15 for filename, module in modules.items()
+             if module['classes'] or module['functions']]
+    if items:
+        _rollup_calls(plan, 'project BRD', 'module summary', items, project_overhead + 7)
+    return plan
+
+
+def estimate_run(file_function_map, total_code_chars, model, mode, concurrency=1, stats=None, num_ctx=DEFAULT_NUM_CTX,
+                 router=None, metrics_table=None):
+    """Predict calls, tokens and time of a BRD run before starting it.
+
+    `total_code_chars` is the size of all files together (used for the
+    full-project prompt). Token counts use the model's observed characters
+    per token when `stats` (a ThroughputStats) has seen calls to it, and a
+    per-model approximation otherwise; times use observed tokens/s likewise.
+    'gpu_seconds' is the time with one request at a time, 'wall_seconds' the
+    expected duration with `concurrency` parallel requests. With a `router`
+    (see model_router.ModelRouter), every call gets the num_ctx its route
+    would pick instead of `num_ctx`; pass the project's `metrics_table` (a
+    parsers.metrics.MetricsTable) so routes limited by function metrics apply.
+    """
+    if mode not in PROCESSING_MODES:
+        raise ValueError(f"Unknown processing mode: {mode}")
+    rates = stats.rates(model) if stats is not None else default_rates(model)
+
+    estimate = _plan_run(
+        file_function_map, total_code_chars, mode, rates, num_ctx, model, router, metrics_table
+    ).summarize(concurrency)
+    estimate.update({
+        'mode': mode,
+        'model': model,
+        'concurrency': concurrency,
+        'observed_calls': rates['observed_calls']
+    })
+    return estimate
+
+
+def estimate_options(file_function_map, total_code_chars, model, concurrency_levels=(1, 2, 4, 8), stats=None,
+                     num_ctx=DEFAULT_NUM_CTX, router=None, metrics_table=None):
+    """Estimates for every processing mode and concurrency level, cheapest first (see estimate_run)."""
+    rates = stats.rates(model) if stats is not None else default_rates(model)
+    estimates = []
+    for mode in PROCESSING_MODES:
+        plan = _plan_run(file_function_map, total_code_chars, mode, rates, num_ctx, model, router, metrics_table)
+        # A single call does not get faster with more parallel requests
+        for concurrency in (concurrency_levels[:1] if mode == MODE_BATCH else concurrency_levels):
+            estimate = plan.summarize(concurrency)
+            estimate.update({
+                'mode': mode,
+                'model': model,
+                'concurrency': concurrency,
+                'observed_calls': rates['observed_calls']
+            })
+            estimates.append(estimate)
+    return sorted(estimates, key=lambda estimate: (estimate['gpu_seconds'], estimate['wall_seconds']))
+
+
+def format_duration(seconds):
+    """Compact human readable duration, e.g. '2h 05m', '4m 10s' or '12s'."""
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
@@ -0,0 +1,246 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_engine.run_local_llm import call_ollama, check_ollama_connection, load_prompt
+from llm_engine.tracing import span
+
+# Summaries at one level are combined until they reach this size, then they
+# are rolled up into intermediate summaries so every prompt fits in context.
+SUMMARY_BUDGET = 12000
+MAX_UNIT_CHARS = 20000
+
+DEFAULT_FUNCTION_PROMPT = "Summarize the business purpose of the following Python function in a few bullet points:\n\n{{CODE_BLOCK}}"
+DEFAULT_ROLLUP_PROMPT = "Combine the following business summaries of `{{NAME}}` into one compact business summary:\n\n{{SUMMARY_BLOCK}}"
+DEFAULT_PROJECT_PROMPT = "Generate a Business Requirements Document from the following module summaries:\n\n{{SUMMARY_BLOCK}}"
+
+
+def function_key(func):
+    """Build a unique key for an extracted function."""
+    return f"{func.get('file', '')}::{func.get('qualname', func['name'])}::{func['start_line']}"
+
+
+def group_functions(file_function_map):
+    """Group each file's methods under their (qualified) class name.
+
+    Returns {filename: {'classes': {class_qualname: [methods]}, 'functions': [functions]}}
+    where 'functions' holds the functions that are not methods.
+    """
+    modules = {}
+    for filename, functions in file_function_map.items():
+        module = {'classes': {}, 'functions': []}
+        for func in functions:
+            if func.get('kind') == 'method' and func.get('parent'):
+                module['classes'].setdefault(func['parent'], []).append(func)
+            else:
+                module['functions'].append(func)
+        modules[filename] = module
+    return modules
+
+
+def _format_summaries(items):
+    return "\n\n".join(f"### {title}\n{summary}" for title, summary in items)
+
+
+def _chunk_items(items, budget):
+    """Split (title, summary) items into groups whose text stays under the budget."""
+    chunks = []
+    current = []
+    current_size = 0
+    for item in items:
+        item_size = len(item[0]) + len(item[1]) + 6
+        if current and current_size + item_size > budget:
+            chunks.append(current)
+            current = []
+            current_size = 0
+        current.append(item)
+        current_size += item_size
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class HierarchicalSummarizer:
+    """Bottom-up BRD pipeline: function -> class -> module -> project.
+
+    Every level runs its LLM calls in parallel on a thread pool and goes through
+    the optional response cache, so re-running on an unchanged project is cheap.
+    With a `semantic_index` (see semantic_index.SemanticIndex), each module
+    summary also sees the module's code most relevant to the BRD sections.
+    """
+
+    def __init__(self, model, cache=None, max_workers=4, progress_callback=None, semantic_index=None):
+        self.model = model
+        self.cache = cache
+        self.max_workers = max_workers
+        self.progress_callback = progress_callback
+        self.semantic_index = semantic_index
+        self.errors = []
+
+        self.function_prompt = load_prompt("function_summary_prompt.txt", DEFAULT_FUNCTION_PROMPT)
+        self.class_prompt = load_prompt("class_summary_prompt.txt", DEFAULT_ROLLUP_PROMPT)
+        self.module_prompt = load_prompt("module_summary_prompt.txt", DEFAULT_ROLLUP_PROMPT)
+        self.project_prompt = load_prompt("project_brd_prompt.txt", DEFAULT_PROJECT_PROMPT)
+
+    def _report(self, stage, completed, total):
+        if self.progress_callback:
+            self.progress_callback(stage, completed, total)
+
+    def _call(self, prompt, task, metrics=None):
+        response = call_ollama(prompt, self.model, task=task, cache=self.cache, metrics=metrics)
+        if response.startswith("Error:"):
+            self.errors.append(f"{task}: {response}")
+            return None
+        return response
+
+    def _run_parallel(self, stage, jobs):
+        """Run (key, callable) jobs on the thread pool and collect their results."""
+        results = {}
+        if not jobs:
+            return results
+        total = len(jobs)
+        self._report(stage, 0, total)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # Copy the context so requests keep the owner set by the job worker
+            futures = [(key, executor.submit(contextvars.copy_context().run, job)) for key, job in jobs]
+            for completed, (key, future) in enumerate(futures, start=1):
+                try:
+                    results[key] = future.result()
+                except Exception as e:
+                    self.errors.append(f"{stage} {key}: {e}")
+                    results[key] = None
+                self._report(stage, completed, total)
+        return results
+
+    def summarize_function(self, func):
+        with span("prompt_render", template="function_summary_prompt.txt"):
+            source = func['source']
+            if len(source) > MAX_UNIT_CHARS:
+                source = source[:MAX_UNIT_CHARS] + "\n\n[... code truncated ...]"
+            code = f"# Function from file: {func.get('file', '')}\n\n{source}"
+            prompt = self.function_prompt.replace("{{CODE_BLOCK}}", code)
+        # Metrics are precomputed by the caller when it has a MetricsTable
+        metrics = func.get('metrics')
+        if not metrics:
+            # Imported lazily: parsers.metrics loads NumPy
+            from parsers.metrics import function_metrics
+
+            metrics = function_metrics(func)
+        return self._call(prompt, f"function summary {func.get('qualname', func['name'])}", metrics=metrics)
+
+    def rollup(self, name, items, template, task, reduce_template=None, parallel=False):
+        """Summarize (title, summary) items, reducing them first if they exceed the budget.
+
+        Intermediate groups are summarized with `reduce_template` (defaults to
+        `template`) so only the final call produces the level's output format.
+        Set `parallel` when calling from the main thread to reduce groups on the pool.
+        """
+        reduce_template = reduce_template or template
+        items = [(title, summary) for title, summary in items if summary]
+        if not items:
+            return None
+
+        # Tree reduction: each pass shrinks the text by summarizing groups
+        while len(_format_summaries(items)) > SUMMARY_BUDGET and len(items) > 1:
+            chunks = _chunk_items(items, SUMMARY_BUDGET)
+            if len(chunks) == len(items):
+                # Every item is already over budget on its own; stop reducing
+                break
+            part_jobs = []
+            for index, chunk in enumerate(chunks, start=1):
+                part_name = f"{name} (part {index})"
+                part_jobs.append((
+                    part_name,
+                    lambda part_name=part_name, chunk=chunk: self._render_rollup(part_name, chunk, reduce_template, task)
+                ))
+            if parallel:
+                part_summaries = self._run_parallel(f"{name} rollup", part_jobs)
+            else:
+                part_summaries = {part_name: job() for part_name, job in part_jobs}
+            items = [(part_name, summary) for part_name, summary in part_summaries.items() if summary]
+            if not items:
+                return None
+
+        return self._render_rollup(name, items, template, task)
+
+    def _render_rollup(self, name, items, template, task):
+        with span("prompt_render", template=task):
+            summary_block = _format_summaries(items)
+            if len(summary_block) > MAX_UNIT_CHARS:
+                summary_block = summary_block[:MAX_UNIT_CHARS] + "\n\n[... summaries truncated ...]"
+            prompt = template.replace("{{NAME}}", name).replace("{{SUMMARY_BLOCK}}", summary_block)
+        return self._call(prompt, f"{task} {name}")
+
+    def run(self, file_function_map):
+        """Run the full pipeline and return the summaries for every level."""
+        if not check_ollama_connection():
+            self.errors.append("Cannot connect to Ollama. Please ensure Ollama is running on localhost:11434")
+            return {'functions': {}, 'classes': {}, 'modules': {}, 'project_brd': None, 'errors': self.errors}
+
+        modules = group_functions(file_function_map)
+
+        # Level 1: functions
+        function_jobs = []
+        for functions in file_function_map.values():
+            for func in functions:
+                function_jobs.append((function_key(func), lambda func=func: self.summarize_function(func)))
+        function_summaries = self._run_parallel("functions", function_jobs)
+
+        # Level 2: classes
+        class_jobs = []
+        for filename, module in modules.items():
+            for class_name, methods in module['classes'].items():
+                items = [(method['qualname'], function_summaries.get(function_key(method))) for method in methods]
+                class_jobs.append((
+                    f"{filename}::{class_name}",
+                    lambda class_name=class_name, items=items: self.rollup(class_name, items, self.class_prompt, "class summary")
+                ))
+        class_summaries = self._run_parallel("classes", class_jobs)
+
+        # Level 3: modules
+        module_jobs = []
+        for filename, module in modules.items():
+            items = []
+            for class_name in module['classes']:
+                items.append((f"Class {class_name}", class_summaries.get(f"{filename}::{class_name}")))
+            for func in module['functions']:
+                items.append((f"Function {func['qualname']}", function_summaries.get(function_key(func))))
+            if self.semantic_index is not None:
+                # Imported lazily: the semantic index loads NumPy
+                from llm_engine.semantic_index import MODULE_CONTEXT_CHARS, relevant_code
+
+                code = relevant_code(
+                    self.semantic_index, file_function_map[filename], MODULE_CONTEXT_CHARS, files=[filename]
+                )
+                items.append(("Relevant code", f"```python\n{code}\n```"))
+            module_jobs.append((
+                filename,
+                lambda filename=filename, items=items: self.rollup(filename, items, self.module_prompt, "module summary")
+            ))
+        module_summaries = self._run_parallel("modules", module_jobs)
+
+        # Level 4: project BRD from module summaries
+        self._report("project", 0, 1)
+        project_items = [(filename, summary) for filename, summary in module_summaries.items() if summary]
+        project_brd = self.rollup(
+            "project", project_items, self.project_prompt, "project BRD",
+            reduce_template=self.module_prompt, parallel=True
+        ) if project_items else None
+        self._report("project", 1, 1)
+
+        return {
+            'functions': {key: value for key, value in function_summaries.items() if value},
+            'classes': {key: value for key, value in class_summaries.items() if value},
+            'modules': {key: value for key, value in module_summaries.items() if value},
+            'project_brd': project_brd,
+            'errors': self.errors
+        }
+
+
+def generate_hierarchical_brd(file_function_map, model, cache=None, max_workers=4, progress_callback=None,
+                              semantic_index=None):
+    """Generate a project BRD bottom-up from function, class and module summaries."""
+    summarizer = HierarchicalSummarizer(
+        model, cache=cache, max_workers=max_workers, progress_callback=progress_callback,
+        semantic_index=semantic_index
+    )
+    return summarizer.run(file_function_map)
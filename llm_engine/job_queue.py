@@ -0,0 +1,609 @@
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from llm_engine.llm_scheduler import current_owner
+from llm_engine.response_cache import ResponseCache
+from llm_engine.result_journal import ResultJournal, input_hash
+from llm_engine.run_local_llm import generate_brd
+from llm_engine.tracing import current_trace, profile, span, tracer
+
+DEFAULT_QUEUE_PATH = os.path.join(".bare_jobs", "jobs.sqlite")
+
+# A running job whose lease expires is handed to another worker. Workers renew
+# the lease every HEARTBEAT_SECONDS while the job runs (including LLM calls and
+# waits for the scheduler), so it only expires when the worker stops.
+JOB_LEASE_SECONDS = 5 * 60
+HEARTBEAT_SECONDS = 60
+# Jobs that keep killing their worker are failed instead of requeued forever
+MAX_ATTEMPTS = 3
+POLL_INTERVAL = 1.0
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id TEXT PRIMARY KEY,
+    description TEXT NOT NULL,
+    model TEXT NOT NULL,
+    owner TEXT NOT NULL DEFAULT '',
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS owners (
+    name TEXT PRIMARY KEY,
+    last_claimed REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT NOT NULL REFERENCES runs(id),
+    position INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    title TEXT NOT NULL,
+    model TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    input_hash TEXT,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    progress TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, id);
+CREATE INDEX IF NOT EXISTS idx_jobs_run ON jobs(run_id, position);
+CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs(finished);
+"""
+
+
+def _run_brd_job(payload, model, report_progress, cache):
+    return generate_brd(payload['code'], model, cache=cache, metrics=payload.get('metrics'))
+
+
+def _run_hierarchical_job(payload, model, report_progress, cache):
+    # Imported lazily so the queue does not pull in the summarizer unless needed
+    from llm_engine.hierarchical_summary import generate_hierarchical_brd
+
+    file_function_map = {}
+    for func in payload['functions']:
+        file_function_map.setdefault(func['file'], []).append(func)
+
+    semantic_index = None
+    if payload.get('semantic'):
+        from llm_engine.semantic_index import SemanticIndex
+
+        semantic_index = SemanticIndex(payload['semantic']['index_path'])
+        report_progress(f"indexing {len(payload['functions'])} functions")
+        # Progress renews the job's lease, which a long embedding pass would outlive
+        semantic_index.update(
+            payload['functions'], payload['semantic'].get('embedding_model') or None,
+            progress_callback=lambda completed, total: report_progress(f"embedding {completed}/{total}")
+        )
+
+    result = generate_hierarchical_brd(
+        file_function_map, model,
+        cache=cache if cache is not None else ResponseCache(),
+        max_workers=payload.get('max_workers', 4),
+        progress_callback=lambda stage, completed, total: report_progress(f"{stage}: {completed}/{total}"),
+        semantic_index=semantic_index
+    )
+    if not result['project_brd']:
+        errors = "; ".join(result['errors'][:5])
+        return f"Error: Failed to generate full project BRD from module summaries. {errors}"
+    return json.dumps(result)
+
+
+def _run_template_job(payload, model, report_progress, cache):
+    # Prepared when the run was submitted (e.g. trivial functions), no LLM call
+    return payload['text']
+
+
+def _run_triaged_batch_job(payload, model, report_progress, cache):
+    from llm_engine.triage import run_triaged_batch
+
+    return run_triaged_batch(payload, model, report_progress, cache)
+
+
+def _run_semantic_brd_job(payload, model, report_progress, cache):
+    from llm_engine.semantic_index import run_semantic_brd
+
+    return run_semantic_brd(payload, model, report_progress, cache)
+
+
+# Job kinds and the functions that run them:
+# handler(payload, model, report_progress, cache) -> str
+JOB_HANDLERS = {
+    'brd': _run_brd_job,
+    'hierarchical_brd': _run_hierarchical_job,
+    'template': _run_template_job,
+    'triaged_batch': _run_triaged_batch_job,
+    'semantic_brd': _run_semantic_brd_job,
+}
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class JobQueue:
+    """Persistent SQLite job queue for long BRD generation runs.
+
+    Jobs are grouped into runs. Worker threads (or separate worker processes
+    started with `python -m llm_engine.job_queue`) claim queued jobs, so a
+    run keeps going across Streamlit reruns and browser disconnects, and
+    unfinished jobs are picked up again after a restart.
+
+    Every run has an owner (the analyst who submitted it). Workers serve
+    owners fairly: the next job comes from the owner with the fewest running
+    jobs, then the one served least recently, so a huge run from one analyst
+    does not block everybody else. `cache` is an optional shared
+    ResponseCache passed to the job handlers.
+
+    Completed jobs are also appended to a ResultJournal (by default
+    journal.jsonl next to the queue database). Jobs whose input was already
+    journaled are not run again, whether they come from a resumed run or a
+    new run over the same code.
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH, cache=None, journal=None):
+        self.path = path
+        self.cache = cache
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.journal = journal if journal is not None else ResultJournal(os.path.join(directory, "journal.jsonl"))
+
+        self._stop = threading.Event()
+        self._workers = []
+        self._worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+        with self._transaction() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            columns = {row['name'] for row in connection.execute("PRAGMA table_info(runs)")}
+            if columns and 'owner' not in columns:
+                # Queues created before runs had owners
+                connection.execute("ALTER TABLE runs ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+            columns = {row['name'] for row in connection.execute("PRAGMA table_info(jobs)")}
+            if columns and 'input_hash' not in columns:
+                # Queues created before the result journal
+                connection.execute("ALTER TABLE jobs ADD COLUMN input_hash TEXT")
+            connection.executescript(SCHEMA)
+
+    def _connect(self):
+        # One short-lived connection per operation keeps threads and processes independent
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        connection = self._connect()
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    # Submitting and reading runs
+
+    def submit_run(self, jobs, model, description="", owner=""):
+        """Queue a run for `owner`. `jobs` is a list of dicts with 'kind', 'title' and 'payload'.
+
+        Jobs with a journaled result for the same input are stored as done
+        right away. Returns the new run id.
+        """
+        run_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        rows = []
+        for position, job in enumerate(jobs):
+            job_hash = input_hash(job['kind'], model, job['payload'])
+            journaled = self.journal.lookup(job_hash)
+            rows.append((
+                run_id, position, job['kind'], job['title'], model, json.dumps(job['payload']), job_hash,
+                QUEUED if journaled is None else DONE, journaled,
+                None if journaled is None else "from journal", now, None if journaled is None else now
+            ))
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT INTO runs (id, description, model, owner, created) VALUES (?, ?, ?, ?, ?)",
+                (run_id, description, model, owner, now)
+            )
+            connection.executemany(
+                "INSERT INTO jobs (run_id, position, kind, title, model, payload, input_hash, status, result, "
+                "progress, created, finished) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        return run_id
+
+    def resume_run(self, run_id):
+        """Requeue the failed and cancelled jobs of a run; finished jobs are kept.
+
+        Returns the number of requeued jobs.
+        """
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET status = ?, error = NULL, progress = NULL, attempts = 0, worker = NULL, "
+                "started = NULL, finished = NULL, lease_until = NULL WHERE run_id = ? AND status IN (?, ?)",
+                (QUEUED, run_id, FAILED, CANCELLED)
+            )
+            return cursor.rowcount
+
+    def run_status(self, run_id):
+        """Return job counts per status plus the progress of running jobs."""
+        with self._transaction() as connection:
+            counts = {row['status']: row['count'] for row in connection.execute(
+                "SELECT status, COUNT(*) AS count FROM jobs WHERE run_id = ? GROUP BY status", (run_id,)
+            )}
+            running = [dict(row) for row in connection.execute(
+                "SELECT title, progress, started FROM jobs WHERE run_id = ? AND status = ? ORDER BY position",
+                (run_id, RUNNING)
+            )]
+        total = sum(counts.values())
+        finished = counts.get(DONE, 0) + counts.get(FAILED, 0) + counts.get(CANCELLED, 0)
+        return {
+            'total': total,
+            'queued': counts.get(QUEUED, 0),
+            'running': counts.get(RUNNING, 0),
+            'done': counts.get(DONE, 0),
+            'failed': counts.get(FAILED, 0),
+            'cancelled': counts.get(CANCELLED, 0),
+            'complete': total > 0 and finished == total,
+            'running_jobs': running
+        }
+
+    def run_results(self, run_id, include_failed=False, with_results=True):
+        """Return the finished jobs of a run in submission order.
+
+        With with_results=False the (potentially large) outputs are left out;
+        fetch them one at a time with job_result().
+        """
+        statuses = (DONE, FAILED) if include_failed else (DONE,)
+        placeholders = ", ".join("?" for _ in statuses)
+        result_column = "result" if with_results else "NULL AS result"
+        with self._transaction() as connection:
+            rows = connection.execute(
+                f"SELECT id, kind, title, status, {result_column}, error FROM jobs "
+                f"WHERE run_id = ? AND status IN ({placeholders}) ORDER BY position",
+                (run_id,) + statuses
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def job_result(self, job_id):
+        with self._transaction() as connection:
+            row = connection.execute("SELECT result FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row['result'] if row else None
+
+    def recent_runs(self, limit=20, owner=None):
+        """Return the latest runs, optionally only those of one owner."""
+        owner_filter = "WHERE r.owner = ? " if owner is not None else ""
+        owner_args = (owner,) if owner is not None else ()
+        with self._transaction() as connection:
+            rows = connection.execute(
+                "SELECT r.id, r.description, r.model, r.owner, r.created, COUNT(j.id) AS total, "
+                "SUM(CASE WHEN j.status IN (?, ?, ?) THEN 1 ELSE 0 END) AS finished "
+                "FROM runs r LEFT JOIN jobs j ON j.run_id = r.id " + owner_filter +
+                "GROUP BY r.id ORDER BY r.created DESC LIMIT ?",
+                (DONE, FAILED, CANCELLED) + owner_args + (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def queue_stats(self, window=3600):
+        """Queue depth per owner and throughput over the last `window` seconds."""
+        since = time.time() - window
+        with self._transaction() as connection:
+            depth = connection.execute(
+                "SELECT r.owner, j.status, COUNT(*) AS count FROM jobs j JOIN runs r ON r.id = j.run_id "
+                "WHERE j.status IN (?, ?) GROUP BY r.owner, j.status",
+                (QUEUED, RUNNING)
+            ).fetchall()
+            finished = connection.execute(
+                "SELECT COUNT(*) AS count, SUM(CASE WHEN status = ? THEN 1 ELSE 0 END) AS failed, "
+                "AVG(finished - started) AS duration, AVG(started - created) AS wait "
+                "FROM jobs WHERE finished >= ? AND started IS NOT NULL",
+                (FAILED, since)
+            ).fetchone()
+            workers = connection.execute(
+                "SELECT COUNT(DISTINCT worker) FROM jobs WHERE status = ?", (RUNNING,)
+            ).fetchone()[0]
+
+        owners = {}
+        for row in depth:
+            owners.setdefault(row['owner'], {'owner': row['owner'], QUEUED: 0, RUNNING: 0})[row['status']] = row['count']
+        return {
+            'owners': sorted(owners.values(), key=lambda owner: (-owner[QUEUED], owner['owner'])),
+            'queued': sum(owner[QUEUED] for owner in owners.values()),
+            'running': sum(owner[RUNNING] for owner in owners.values()),
+            'busy_workers': workers,
+            'window_seconds': window,
+            'finished': finished['count'],
+            'failed': finished['failed'] or 0,
+            'jobs_per_minute': finished['count'] / (window / 60),
+            'avg_duration_seconds': finished['duration'] or 0.0,
+            'avg_wait_seconds': finished['wait'] or 0.0
+        }
+
+    def cancel_run(self, run_id):
+        """Cancel the queued jobs of a run; jobs already running finish normally."""
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE jobs SET status = ?, finished = ? WHERE run_id = ? AND status = ?",
+                (CANCELLED, time.time(), run_id, QUEUED)
+            )
+
+    # Worker side
+
+    def recover(self):
+        """Requeue running jobs whose worker died or whose lease expired.
+
+        Jobs that already used MAX_ATTEMPTS are marked failed instead.
+        Returns the number of jobs that were requeued.
+        """
+        hostname = socket.gethostname()
+        now = time.time()
+        requeue = []
+        give_up = []
+        with self._transaction() as connection:
+            rows = connection.execute(
+                "SELECT id, worker, lease_until, attempts FROM jobs WHERE status = ?", (RUNNING,)
+            ).fetchall()
+            for row in rows:
+                worker_host, _, rest = (row['worker'] or "").partition(":")
+                worker_pid = rest.split(":", 1)[0]
+                dead_worker = worker_host == hostname and worker_pid.isdigit() and not _pid_alive(int(worker_pid))
+                if dead_worker or (row['lease_until'] or 0) < now:
+                    if row['attempts'] >= MAX_ATTEMPTS:
+                        give_up.append(row['id'])
+                    else:
+                        requeue.append(row['id'])
+            connection.executemany(
+                "UPDATE jobs SET status = ?, worker = NULL, lease_until = NULL WHERE id = ? AND status = ?",
+                [(QUEUED, job_id, RUNNING) for job_id in requeue]
+            )
+            connection.executemany(
+                "UPDATE jobs SET status = ?, error = ?, finished = ?, lease_until = NULL WHERE id = ? AND status = ?",
+                [(FAILED, f"Error: Worker stopped {MAX_ATTEMPTS} times while running this job", now, job_id, RUNNING)
+                 for job_id in give_up]
+            )
+        return len(requeue)
+
+    def claim_next(self, worker_id):
+        """Atomically mark the next queued job as running and return it (or None).
+
+        Picks the oldest queued job of the owner with the fewest running jobs,
+        breaking ties by serving the owner that waited longest since its last claim.
+        """
+        connection = self._connect()
+        connection.isolation_level = None
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            candidates = connection.execute(
+                "SELECT r.owner, MIN(j.id) AS job_id FROM jobs j JOIN runs r ON r.id = j.run_id "
+                "WHERE j.status = ? GROUP BY r.owner",
+                (QUEUED,)
+            ).fetchall()
+            if not candidates:
+                connection.execute("COMMIT")
+                return None
+
+            running = {row['owner']: row['count'] for row in connection.execute(
+                "SELECT r.owner, COUNT(*) AS count FROM jobs j JOIN runs r ON r.id = j.run_id "
+                "WHERE j.status = ? GROUP BY r.owner",
+                (RUNNING,)
+            )}
+            last_claimed = {row['name']: row['last_claimed'] for row in connection.execute(
+                "SELECT name, last_claimed FROM owners"
+            )}
+            chosen = min(candidates, key=lambda candidate: (
+                running.get(candidate['owner'], 0), last_claimed.get(candidate['owner'], 0), candidate['job_id']
+            ))
+            row = connection.execute(
+                "SELECT j.*, r.owner FROM jobs j JOIN runs r ON r.id = j.run_id WHERE j.id = ?",
+                (chosen['job_id'],)
+            ).fetchone()
+
+            now = time.time()
+            connection.execute(
+                "UPDATE jobs SET status = ?, worker = ?, started = ?, lease_until = ?, attempts = attempts + 1 "
+                "WHERE id = ?",
+                (RUNNING, worker_id, now, now + JOB_LEASE_SECONDS, row['id'])
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO owners (name, last_claimed) VALUES (?, ?)", (row['owner'], now)
+            )
+            connection.execute("COMMIT")
+            return dict(row, status=RUNNING, worker=worker_id, started=now)
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def report_progress(self, job, progress):
+        """Record a claimed job's progress and renew its lease; False if its worker no longer owns it."""
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET progress = ?, lease_until = ? WHERE id = ? AND worker = ? AND status = ?",
+                (progress, time.time() + JOB_LEASE_SECONDS, job['id'], job['worker'], RUNNING)
+            )
+            return cursor.rowcount > 0
+
+    def renew_lease(self, job):
+        """Extend a claimed job's lease; False if its worker no longer owns it."""
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = ?",
+                (time.time() + JOB_LEASE_SECONDS, job['id'], job['worker'], RUNNING)
+            )
+            return cursor.rowcount > 0
+
+    @contextmanager
+    def _heartbeat(self, job):
+        """Keep renewing `job`'s lease in a background thread while the block runs."""
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(HEARTBEAT_SECONDS):
+                try:
+                    if not self.renew_lease(job):
+                        return
+                except sqlite3.Error as e:
+                    print(f"Could not renew the lease of job {job['id']}: {e}")
+
+        thread = threading.Thread(target=beat, daemon=True, name=f"bare-heartbeat-{job['id']}")
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def complete(self, job, result, journal=True):
+        """Store the output of a claimed job; results starting with "Error:" mark it as failed.
+
+        Successful outputs are journaled first, so a crash right after a job
+        finishes never loses its result. The job is only updated while the
+        worker that claimed it still owns it: if its lease expired and it was
+        handed to another worker, that worker's result wins. Returns whether
+        the result was stored.
+        """
+        failed = not result or result.startswith("Error:")
+        if not failed and journal and job.get('input_hash'):
+            self.journal.append({
+                'job_id': job['id'], 'run_id': job['run_id'], 'position': job['position'], 'kind': job['kind'],
+                'title': job['title'], 'model': job['model'], 'input_hash': job['input_hash'],
+                'output': result, 'finished': time.time()
+            })
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished = ?, lease_until = NULL "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (FAILED if failed else DONE, None if failed else result, result if failed else None,
+                 time.time(), job['id'], job['worker'], RUNNING)
+            )
+            return cursor.rowcount > 0
+
+    def process_one(self, worker_id):
+        """Claim and run one job. Returns False when the queue is empty."""
+        job = self.claim_next(worker_id)
+        if job is None:
+            return False
+
+        handler = JOB_HANDLERS.get(job['kind'])
+        if handler is None:
+            self.complete(job, f"Error: Unknown job kind '{job['kind']}'")
+            return True
+
+        # Journaled by a worker that stopped before it could mark the job done
+        journaled = self.journal.lookup(job['input_hash']) if job['input_hash'] else None
+        if journaled is not None:
+            self.complete(job, journaled, journal=False)
+            return True
+
+        # LLM requests made by the job are scheduled under its owner and traced under its run
+        owner_token = current_owner.set(job['owner'])
+        trace_token = current_trace.set(job['run_id'])
+        tracer.record("queue_wait", job['created'], job['started'] - job['created'], {'job': job['title']})
+        try:
+            with self._heartbeat(job), span("job", kind=job['kind'], title=job['title']), profile(f"job-{job['id']}"):
+                result = handler(
+                    json.loads(job['payload']), job['model'],
+                    lambda progress: self.report_progress(job, progress),
+                    self.cache
+                )
+        except Exception as e:
+            result = f"Error: {str(e)}"
+        finally:
+            current_trace.reset(trace_token)
+            current_owner.reset(owner_token)
+        if not self.complete(job, result):
+            print(f"Job {job['id']} was handed to another worker after its lease expired; dropped this result")
+        return True
+
+    def _worker_loop(self, worker_id):
+        while not self._stop.is_set():
+            try:
+                if not self.process_one(worker_id):
+                    self._stop.wait(POLL_INTERVAL)
+            except Exception as e:
+                print(f"Job worker {worker_id} error: {e}")
+                self._stop.wait(POLL_INTERVAL)
+
+    def start_workers(self, count=1):
+        """Recover interrupted jobs and start `count` daemon worker threads."""
+        recovered = self.recover()
+        if recovered:
+            print(f"Requeued {recovered} interrupted jobs")
+        for _ in range(count):
+            worker_id = f"{self._worker_prefix}:{uuid.uuid4().hex[:6]}"
+            thread = threading.Thread(target=self._worker_loop, args=(worker_id,), daemon=True, name=f"bare-job-{worker_id}")
+            thread.start()
+            self._workers.append(thread)
+
+    def stop_workers(self, timeout=None):
+        self._stop.set()
+        for thread in self._workers:
+            thread.join(timeout)
+        self._workers = []
+        self._stop.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run BARE background job workers")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker threads")
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH, help="Path to the job queue database")
+    parser.add_argument("--trace", help="Write a Chrome trace of the processed jobs to this file on exit")
+    parser.add_argument("--resume", metavar="RUN_ID", action="append", default=[],
+                        help="Requeue the failed and cancelled jobs of a run before starting")
+    parser.add_argument("--routes", help="JSON file with model routing rules, or 'off' (default: BARE_MODEL_ROUTES)")
+    parser.add_argument("--fast-model", help="Model for small functions with the default routing rules (default: BARE_FAST_MODEL)")
+    args = parser.parse_args()
+
+    from llm_engine.estimator import ThroughputStats
+    from llm_engine.model_router import ModelRouter
+    from llm_engine.run_local_llm import set_call_observer, set_model_router
+
+    # Feed the run estimator with the speed of this machine
+    stats = ThroughputStats()
+    set_call_observer(stats.record)
+    router = ModelRouter.from_config(args.routes, stats=stats, fast_model=args.fast_model)
+    set_model_router(router)
+    queue = JobQueue(args.queue, cache=ResponseCache())
+    for run_id in args.resume:
+        print(f"Requeued {queue.resume_run(run_id)} jobs of run {run_id}")
+    queue.start_workers(args.workers)
+    print(f"Processing jobs from {args.queue} with {args.workers} workers. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(60)
+            # Pick up jobs abandoned by other crashed workers
+            queue.recover()
+    except KeyboardInterrupt:
+        queue.stop_workers(timeout=5)
+        if router is not None:
+            for decision in router.report():
+                print(f"{decision['calls']:>6} calls  {decision['rule']:<24} {decision['model']:<20} num_ctx={decision['num_ctx']}")
+        if args.trace:
+            print(f"Trace written to {tracer.export_chrome_trace(args.trace)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import contextvars
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from llm_engine.tracing import tracer
+
+# Who the current LLM request is made for. Job workers set it per job and the
+# hierarchical summarizer copies it into its thread pool.
+current_owner = contextvars.ContextVar("bare_llm_owner", default="")
+
+
+class LLMScheduler:
+    """Fair-share limiter for concurrent Ollama requests.
+
+    At most `max_concurrent` requests run at once. When requests are waiting,
+    the next free slot goes to the owner with the fewest requests in flight
+    and, among those, the one served least recently, so one analyst's large
+    run cannot starve everyone else sharing the server.
+    """
+
+    def __init__(self, max_concurrent=2):
+        self.max_concurrent = max(1, max_concurrent)
+        self._condition = threading.Condition()
+        self._waiting = {}
+        self._active = {}
+        self._last_served = {}
+        self._turns = itertools.count()
+        self._in_flight = 0
+        self.granted = 0
+        self.completed = 0
+        self.total_wait = 0.0
+
+    def _next_owner(self):
+        return min(self._waiting, key=lambda owner: (self._active.get(owner, 0), self._last_served.get(owner, -1)))
+
+    @contextmanager
+    def slot(self, owner=None):
+        """Hold one request slot for `owner` (defaults to current_owner)."""
+        owner = current_owner.get() if owner is None else owner
+        requested = time.time()
+        queued_at = time.monotonic()
+        with self._condition:
+            self._waiting[owner] = self._waiting.get(owner, 0) + 1
+            while self._in_flight >= self.max_concurrent or self._next_owner() != owner:
+                self._condition.wait()
+
+            self._waiting[owner] -= 1
+            if not self._waiting[owner]:
+                del self._waiting[owner]
+            self._active[owner] = self._active.get(owner, 0) + 1
+            self._last_served[owner] = next(self._turns)
+            self._in_flight += 1
+            self.granted += 1
+            waited = time.monotonic() - queued_at
+            self.total_wait += waited
+            # Another owner may be next in line if slots are still free
+            self._condition.notify_all()
+        tracer.record("llm_slot_wait", requested, waited, {'owner': owner})
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active[owner] -= 1
+                if not self._active[owner]:
+                    del self._active[owner]
+                self._in_flight -= 1
+                self.completed += 1
+                self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'in_flight': self._in_flight,
+                'waiting': sum(self._waiting.values()),
+                'active_by_owner': dict(self._active),
+                'waiting_by_owner': dict(self._waiting),
+                'completed': self.completed,
+                'avg_wait_seconds': self.total_wait / self.granted if self.granted else 0.0
+            }
@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+from collections import Counter, deque
+
+from llm_engine.estimator import DEFAULT_CHARS_PER_TOKEN, DEFAULT_NUM_CTX, default_rates, task_kind
+
+# Context sizes a route may pick. Ollama reloads a model whenever num_ctx
+# changes, so prompts are rounded up to a few fixed sizes rather than sized exactly.
+CONTEXT_SIZES = (4096, 8192, 16384, 32768)
+# Routing decisions kept for the performance panel
+MAX_DECISIONS = 1000
+# Environment variable naming a small, fast model (e.g. qwen2.5-coder:1.5b)
+# for the "small function" route of the default rules
+FAST_MODEL_ENV = "BARE_FAST_MODEL"
+
+# Rules are tried in order and the first match wins. Any of 'tasks',
+# 'max_prompt_tokens', 'max_complexity', 'max_lines' and 'max_fan_out' can be
+# left out; a missing 'model' keeps the model chosen in the UI. 'max_ctx'
+# caps the context window picked for the prompt.
+DEFAULT_ROUTES = [
+    {
+        'name': "small function",
+        'tasks': ['brd', 'function summary', 'triage', 'flow label'],
+        'max_prompt_tokens': 2500,
+        'max_complexity': 10,
+        'max_ctx': 4096,
+    },
+    {
+        'name': "long context summary",
+        'tasks': ['class summary', 'module summary', 'project BRD'],
+        'max_ctx': 32768,
+    },
+    {
+        'name': "default",
+        'max_ctx': 16384,
+    },
+]
+
+
+def default_routes(fast_model=None):
+    """DEFAULT_ROUTES, with small functions sent to `fast_model` when one is given."""
+    routes = [dict(rule) for rule in DEFAULT_ROUTES]
+    if fast_model:
+        next(rule for rule in routes if rule['name'] == "small function")['model'] = fast_model
+    return routes
+
+
+def load_routes(path):
+    """Read routing rules from a JSON file: a list of rules like DEFAULT_ROUTES."""
+    with open(path, "r", encoding="utf-8") as f:
+        routes = json.load(f)
+    if not isinstance(routes, list) or not all(isinstance(rule, dict) for rule in routes):
+        raise ValueError(f"{path} must contain a JSON list of routing rules")
+    return routes
+
+
+def context_size(tokens, max_ctx):
+    """Smallest context size that holds `tokens`, capped at `max_ctx`."""
+    for size in CONTEXT_SIZES:
+        if size >= tokens:
+            return min(size, max_ctx)
+    return max_ctx
+
+
+class ModelRouter:
+    """Picks the model and num_ctx for every Ollama call.
+
+    Decisions use the prompt's estimated token count plus the expected output
+    length, the call's task and, for single functions, the parser's complexity
+    metrics (see parsers.metrics.MetricsTable.metrics). Install it with
+    run_local_llm.set_model_router(); the latest decisions are kept for reporting.
+    """
+
+    def __init__(self, routes=None, stats=None):
+        self.routes = list(routes if routes is not None else DEFAULT_ROUTES)
+        self.stats = stats
+        self._decisions = deque(maxlen=MAX_DECISIONS)
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, path=None, stats=None, fast_model=None):
+        """Router for BARE_MODEL_ROUTES (or `path`); None if routing is turned off.
+
+        Without a rules file the default rules are used, sending small
+        functions to `fast_model` (default: BARE_FAST_MODEL) when one is set.
+        """
+        path = path if path is not None else os.environ.get("BARE_MODEL_ROUTES", "")
+        if path.lower() in ("off", "none", "0"):
+            return None
+        if not path:
+            fast_model = fast_model if fast_model is not None else os.environ.get(FAST_MODEL_ENV, "").strip()
+            return cls(default_routes(fast_model), stats=stats)
+        return cls(load_routes(path), stats=stats)
+
+    def _rates(self, model):
+        if self.stats is not None:
+            try:
+                return self.stats.rates(model)
+            except Exception as e:
+                print(f"Could not read call statistics for {model}: {e}")
+        return default_rates(model)
+
+    @staticmethod
+    def _matches(rule, kind, prompt_tokens, metrics):
+        if rule.get('tasks') and kind not in rule['tasks']:
+            return False
+        if rule.get('max_prompt_tokens') is not None and prompt_tokens > rule['max_prompt_tokens']:
+            return False
+        for limit, metric in (('max_complexity', 'complexity'), ('max_lines', 'lines'), ('max_fan_out', 'fan_out')):
+            if rule.get(limit) is None:
+                continue
+            # Size limits only apply to calls about one function
+            if metrics is None or metrics.get(metric, 0) > rule[limit]:
+                return False
+        return True
+
+    def decide(self, model, kind, prompt_tokens, metrics=None, rates=None):
+        """Routing decision for a call of prompt kind `kind`, without recording it.
+
+        Also used by the estimator to predict the num_ctx of planned calls;
+        pass `rates` to avoid reading call statistics for every call.
+        """
+        rates = rates if rates is not None else self._rates(model)
+        needed = prompt_tokens + int(rates['output_tokens'].get(kind, 0))
+
+        rule = next((rule for rule in self.routes if self._matches(rule, kind, prompt_tokens, metrics)), None)
+        if rule is None:
+            return {'model': model, 'num_ctx': DEFAULT_NUM_CTX, 'rule': "none", 'prompt_tokens': prompt_tokens}
+        return {
+            'model': rule.get('model') or model,
+            'num_ctx': context_size(needed, rule.get('max_ctx', CONTEXT_SIZES[-1])),
+            'rule': rule.get('name', "unnamed"),
+            'prompt_tokens': prompt_tokens
+        }
+
+    def route(self, prompt, model, task="", metrics=None):
+        """Return {'model', 'num_ctx', 'rule', 'prompt_tokens'} for one call."""
+        rates = self._rates(model)
+        prompt_tokens = int(len(prompt) / (rates.get('chars_per_token') or DEFAULT_CHARS_PER_TOKEN)) + 1
+        decision = self.decide(model, task_kind(task or 'brd'), prompt_tokens, metrics, rates)
+
+        with self._lock:
+            self._decisions.append(dict(decision, task=task or 'brd', metrics=metrics))
+            self._counts[(decision['rule'], decision['model'], decision['num_ctx'])] += 1
+        return decision
+
+    def decisions(self):
+        """The most recent routing decisions, oldest first."""
+        with self._lock:
+            return list(self._decisions)
+
+    def report(self):
+        """Calls per (rule, model, num_ctx) since the router was created."""
+        with self._lock:
+            counts = list(self._counts.items())
+        return [
+            {'rule': rule, 'model': model, 'num_ctx': num_ctx, 'calls': calls}
+            for (rule, model, num_ctx), calls in sorted(counts, key=lambda item: -item[1])
+        ]
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(".bare_cache", "llm_responses.sqlite")
+
+
+def make_cache_key(model, prompt, options=None):
+    """Build a stable cache key from the model, prompt and generation options."""
+    key_data = json.dumps({
+        'model': model,
+        'prompt': prompt,
+        'options': options or {}
+    }, sort_keys=True)
+    return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed cache of LLM responses keyed by model, prompt and options.
+
+    Only successful responses are stored, so errors are always retried.
+    The cache is safe to share between worker threads.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT, response TEXT, created REAL)"
+            )
+            self._connection.commit()
+
+    def get(self, model, prompt, options=None):
+        """Return the cached response for a prompt, or None."""
+        key = make_cache_key(model, prompt, options)
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT response FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0]
+
+    def set(self, model, prompt, response, options=None):
+        """Store a successful response."""
+        if not response or response.startswith("Error:"):
+            return
+        key = make_cache_key(model, prompt, options)
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created) VALUES (?, ?, ?, ?)",
+                (key, model, response, time.time())
+            )
+            self._connection.commit()
+
+    def stats(self):
+        """Return hit/miss counters and the number of stored responses."""
+        with self._lock:
+            size = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {'hits': self.hits, 'misses': self.misses, 'entries': size}
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
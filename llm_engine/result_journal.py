@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized between threads
+    fcntl = None
+
+DEFAULT_JOURNAL_PATH = os.path.join(".bare_jobs", "journal.jsonl")
+
+
+def input_hash(kind, model, payload):
+    """Stable hash of everything that determines a job's output."""
+    text = json.dumps({'kind': kind, 'model': model, 'payload': payload}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ResultJournal:
+    """Append-only JSONL journal of completed jobs.
+
+    Every line holds one finished job: its id, run id, title, input hash and
+    output. Lines are flushed and fsynced as they are written, so the journal
+    survives crashes of the worker, Ollama or the queue database, and a torn
+    last line is skipped on reading. Reads and appends hold a file lock, so
+    several worker processes can share one journal. Outputs are looked up by input hash, which
+    lets a resumed or resubmitted run skip work that was already done.
+    """
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # input hash -> byte offset of its latest entry, covering the first
+        # _indexed_size bytes; lines other processes append are indexed on demand
+        self._offsets = {}
+        self._indexed_size = 0
+
+    @staticmethod
+    def _lock_file(f, exclusive):
+        """Lock the open journal against other processes until `f` is closed."""
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+    @staticmethod
+    def _scan(f, start=0):
+        """Yield (start, end, entry) for every complete line from byte `start`; entry is None if unreadable."""
+        f.seek(start)
+        offset = start
+        for line in f:
+            begin = offset
+            offset += len(line)
+            if not line.endswith(b"\n"):
+                break  # torn write at the end of the file
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                entry = None
+            yield begin, offset, entry if isinstance(entry, dict) else None
+
+    def _refresh(self, f):
+        """Index the lines appended since the last refresh, by this or another process."""
+        size = os.fstat(f.fileno()).st_size
+        if size < self._indexed_size:
+            # The journal was replaced or truncated; index it from the start
+            self._offsets, self._indexed_size = {}, 0
+        if size == self._indexed_size:
+            return
+        for start, end, entry in self._scan(f, self._indexed_size):
+            if entry and entry.get('input_hash'):
+                self._offsets[entry['input_hash']] = start
+            self._indexed_size = end
+
+    def append(self, entry):
+        """Durably add one completed job (a dict with at least 'input_hash' and 'output')."""
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock, open(self.path, "ab+") as f:
+            self._lock_file(f, exclusive=True)
+            self._refresh(f)
+            offset = f.seek(0, os.SEEK_END)
+            if offset:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # Terminate a line torn by a crash so this entry stays readable
+                    f.write(b"\n")
+                    offset += 1
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+            if entry.get('input_hash'):
+                self._offsets[entry['input_hash']] = offset
+            self._indexed_size = offset + len(line)
+
+    def lookup(self, input_hash):
+        """Return the journaled output for `input_hash`, or None."""
+        with self._lock:
+            try:
+                f = open(self.path, "rb")
+            except FileNotFoundError:
+                return None
+            with f:
+                self._lock_file(f, exclusive=False)
+                self._refresh(f)
+                offset = self._offsets.get(input_hash)
+                if offset is None:
+                    return None
+                f.seek(offset)
+                line = f.readline()
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return None
+        # Never hand out another job's output, whatever the offset points at
+        if not isinstance(entry, dict) or entry.get('input_hash') != input_hash:
+            return None
+        return entry.get('output')
+
+    def entries(self, run_id=None):
+        """Journaled jobs in completion order, optionally of one run only."""
+        with self._lock:
+            try:
+                f = open(self.path, "rb")
+            except FileNotFoundError:
+                return []
+            with f:
+                self._lock_file(f, exclusive=False)
+                return [entry for _, _, entry in self._scan(f)
+                        if entry and (run_id is None or entry.get('run_id') == run_id)]
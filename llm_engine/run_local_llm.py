@@ -1,16 +1,76 @@
-import requests
 import os
 import json
+import re
 import time
+from contextlib import nullcontext
+
+from llm_engine.tracing import span
+
+# `requests` is imported inside the functions that make HTTP calls so that
+# importing this module (and starting the UI) does not pay for the HTTP stack
 
 OLLAMA_API_URL = "http://localhost:11434/api/generate"
+OLLAMA_EMBEDDINGS_URL = "http://localhost:11434/api/embeddings"
+
+# Optional process-wide LLMScheduler (see llm_scheduler.py) shared by all callers
+_scheduler = None
+# Optional callable(model, task, prompt_chars, response_json, wall_seconds) told about every completed call
+_call_observer = None
+# Optional ModelRouter (see model_router.py) choosing model and num_ctx per call
+_router = None
+
+
+def set_llm_scheduler(scheduler):
+    """Route every Ollama request through `scheduler`, or None to disable limiting."""
+    global _scheduler
+    _scheduler = scheduler
+
+
+def set_call_observer(observer):
+    """Report every successful Ollama response to `observer` (e.g. estimator.ThroughputStats.record)."""
+    global _call_observer
+    _call_observer = observer
+
+
+def set_model_router(router):
+    """Let `router` pick the model and num_ctx of every Ollama request, or None to use them as given."""
+    global _router
+    _router = router
+
+
+# Prompt templates by path, with the modification time they were read at
+_prompt_cache = {}
+
+
+def _read_prompt_file(path):
+    """Read a prompt file once and reuse it until the file changes on disk."""
+    mtime = os.stat(path).st_mtime
+    cached = _prompt_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    _prompt_cache[path] = (mtime, text)
+    return text
+
+
+def load_prompt(filename, default=None):
+    """Load a prompt template from the prompts directory."""
+    try:
+        return _read_prompt_file(os.path.join("prompts", filename))
+    except FileNotFoundError:
+        print(f"Warning: {filename} not found, using default prompt")
+        return default
+    except Exception as e:
+        print(f"Error loading prompt {filename}: {e}")
+        return default
+
 
 # Load BRD prompt template
 def load_brd_prompt():
     """Load the BRD prompt template with error handling."""
     try:
-        with open("prompts/brd_prompt.txt", "r", encoding="utf-8") as f:
-            return f.read()
+        return _read_prompt_file("prompts/brd_prompt.txt")
     except FileNotFoundError:
         print("Warning: brd_prompt.txt not found, using default prompt")
         return """
@@ -90,6 +150,8 @@ Here is the project code:
 
 def check_ollama_connection():
     """Check if Ollama is running and accessible."""
+    import requests
+
     try:
         response = requests.get("http://localhost:11434/api/tags", timeout=5)
         return response.status_code == 200
@@ -97,8 +159,12 @@ def check_ollama_connection():
         return False
 
 
-def generate_brd(function_source, model):
-    """Generate Business Requirements Document from code."""
+def generate_brd(function_source, model, cache=None, metrics=None):
+    """Generate Business Requirements Document from code.
+
+    `metrics` (see parsers.metrics.MetricsTable.metrics) describes the function
+    being analyzed and is passed on to the model router.
+    """
     # Input validation
     if not function_source or not function_source.strip():
         return "Error: No code provided for analysis."
@@ -111,60 +177,109 @@ def generate_brd(function_source, model):
         return "Error: Cannot connect to Ollama. Please ensure Ollama is running on localhost:11434"
     
     # Load and prepare prompt
-    prompt_template = load_brd_prompt()
-    prompt = prompt_template.replace("{{CODE_BLOCK}}", function_source)
-    
-    # Truncate prompt if too long (some models have context limits)
-    if len(prompt) > 32000:  # Conservative limit
-        print(f"Warning: Prompt is {len(prompt)} characters, truncating...")
-        code_part = function_source[:20000]  # Keep first 20k chars of code
-        prompt = prompt_template.replace("{{CODE_BLOCK}}", code_part + "\n\n[... code truncated ...]")
+    with span("prompt_render", template="brd_prompt.txt", code_chars=len(function_source)):
+        prompt_template = load_brd_prompt()
+        prompt = prompt_template.replace("{{CODE_BLOCK}}", function_source)
+        
+        # Truncate prompt if too long (some models have context limits)
+        if len(prompt) > 32000:  # Conservative limit
+            print(f"Warning: Prompt is {len(prompt)} characters, truncating...")
+            code_part = function_source[:20000]  # Keep first 20k chars of code
+            prompt = prompt_template.replace("{{CODE_BLOCK}}", code_part + "\n\n[... code truncated ...]")
     
+    return call_ollama(prompt, model, cache=cache, metrics=metrics)
+
+
+def call_ollama(prompt, model, options=None, task="", timeout=300, max_retries=3, cache=None, metrics=None):
+    """Send a prompt to Ollama with retry logic and return the generated text.
+
+    Errors are returned as strings starting with "Error:" like the generators do.
+    `task` is only used to make log lines and error messages more specific.
+    When a `cache` (see response_cache.ResponseCache) is given, cached responses
+    are returned without calling the model and new successful ones are stored.
+    With a model router installed, the model and num_ctx are picked from the
+    prompt size, `task` and the function `metrics`, unless `options` sets num_ctx.
+    """
+    import requests
+
+    request_options = {
+        "temperature": 0.7,
+        "top_p": 0.9,
+        "num_ctx": 4096  # Context window
+    }
+    if options:
+        request_options.update(options)
+    if _router is not None and not (options and "num_ctx" in options):
+        route = _router.route(prompt, model, task=task, metrics=metrics)
+        model = route['model']
+        request_options["num_ctx"] = route['num_ctx']
+
     payload = {
-        "model": model, 
-        "prompt": prompt, 
+        "model": model,
+        "prompt": prompt,
         "stream": False,
-        "options": {
-            "temperature": 0.7,
-            "top_p": 0.9,
-            "num_ctx": 4096  # Context window
-        }
+        "options": request_options
     }
-    
+
+    if cache is not None:
+        cached = cache.get(model, prompt, request_options)
+        if cached is not None:
+            return cached
+
+    task_prefix = f"{task} " if task else ""
+    task_suffix = f" for {task} generation" if task else ""
+    log_prefix = f"[{task}] " if task else ""
+    request_name = f"{task.capitalize()} request" if task else "Request"
+
     try:
-        print(f"Making request to Ollama with model: {model}")
-        print(f"Prompt length: {len(prompt)} characters")
+        print(f"Making {task_prefix}request to Ollama with model: {model}")
+        print(f"{log_prefix}Prompt length: {len(prompt)} characters")
         
         # Add retry logic
-        max_retries = 3
         for attempt in range(max_retries):
             try:
-                response = requests.post(
-                    OLLAMA_API_URL,
-                    json=payload,
-                    timeout=300  # 5 minutes timeout
-                )
+                with _scheduler.slot() if _scheduler is not None else nullcontext():
+                    with span("llm_call", task=task or "brd", model=model, prompt_chars=len(prompt),
+                              num_ctx=request_options["num_ctx"]) as llm_span:
+                        request_started = time.perf_counter()
+                        response = requests.post(
+                            OLLAMA_API_URL,
+                            json=payload,
+                            timeout=timeout
+                        )
+                        llm_span['status'] = response.status_code
+                        result = response.json() if response.status_code == 200 else None
+                        if result:
+                            # Token counts reported by Ollama
+                            llm_span['prompt_tokens'] = result.get("prompt_eval_count")
+                            llm_span['output_tokens'] = result.get("eval_count")
+                            if _call_observer is not None:
+                                try:
+                                    _call_observer(model, task, len(prompt), result, time.perf_counter() - request_started)
+                                except Exception as e:
+                                    print(f"{log_prefix}Could not record call statistics: {e}")
                 
-                print(f"Response status: {response.status_code}")
+                print(f"{log_prefix}Response status: {response.status_code}")
                 
                 if response.status_code == 200:
-                    result = response.json()
                     generated_text = result.get("response", "").strip()
                     
                     if generated_text:
+                        if cache is not None:
+                            cache.set(model, prompt, generated_text, request_options)
                         return generated_text
                     else:
-                        return "Error: Empty response from LLM."
+                        return f"Error: Empty response from LLM{task_suffix}."
                 
                 elif response.status_code == 404:
                     return f"Error: Model '{model}' not found. Please check if the model is installed in Ollama."
                 
                 else:
                     error_msg = f"HTTP {response.status_code}: {response.text}"
-                    print(f"Error response: {error_msg}")
+                    print(f"{log_prefix}Error response: {error_msg}")
                     
                     if attempt < max_retries - 1:
-                        print(f"Retrying in 2 seconds... (attempt {attempt + 1}/{max_retries})")
+                        print(f"{log_prefix}Retrying in 2 seconds... (attempt {attempt + 1}/{max_retries})")
                         time.sleep(2)
                         continue
                     
@@ -172,130 +287,111 @@ def generate_brd(function_source, model):
                     
             except requests.exceptions.Timeout:
                 if attempt < max_retries - 1:
-                    print(f"Request timed out, retrying... (attempt {attempt + 1}/{max_retries})")
+                    print(f"{log_prefix}Request timed out, retrying... (attempt {attempt + 1}/{max_retries})")
                     time.sleep(2)
                     continue
-                return "Error: Request timed out. The model might be too slow or the prompt too long."
+                return f"Error: {request_name} timed out. The model might be too slow or the prompt too long."
                 
             except requests.exceptions.ConnectionError:
                 return "Error: Cannot connect to Ollama. Please ensure Ollama is running."
                 
-        return "Error: Max retries exceeded."
+        return f"Error: Max retries exceeded{task_suffix}."
         
     except requests.exceptions.RequestException as e:
-        return f"Error: Request failed - {str(e)}"
+        return f"Error: {request_name} failed - {str(e)}"
 
-def generate_process_flow(code_source, model):
-    """Generate Business Process Flow from code."""
-    # Input validation
-    if not code_source or not code_source.strip():
-        return "Error: No code provided for process flow analysis."
-    
-    if not model:
-        return "Error: No model specified."
-    
-    # Check Ollama connection
-    if not check_ollama_connection():
-        return "Error: Cannot connect to Ollama. Please ensure Ollama is running on localhost:11434"
-    
-    # Process flow prompt template
-    process_flow_prompt = """
-You are an expert Business Analyst AI assistant specialized in analyzing software code and extracting business process flows.
 
-Your task is to analyze the following Python code and identify the business process steps, workflow, and decision points.
+def call_ollama_embedding(text, model, timeout=60):
+    """Embed `text` with an Ollama embedding model (e.g. nomic-embed-text).
 
-Focus on:
-1. Main business processes and workflows
-2. Decision points and conditional logic
-3. Data flow and transformations
-4. User interactions and system responses
-5. Sequential steps in business operations
+    Returns the embedding as a list of floats, or None if the request failed.
+    Requests share the LLM scheduler with generation calls.
+    """
+    import requests
 
-Return your output as a numbered list of business process steps in this format:
+    try:
+        with _scheduler.slot() if _scheduler is not None else nullcontext():
+            with span("llm_call", task="embedding", model=model, prompt_chars=len(text)) as llm_span:
+                response = requests.post(
+                    OLLAMA_EMBEDDINGS_URL,
+                    json={"model": model, "prompt": text},
+                    timeout=timeout
+                )
+                llm_span['status'] = response.status_code
+        if response.status_code != 200:
+            print(f"[embedding] Error response: HTTP {response.status_code}: {response.text}")
+            return None
+        return response.json().get("embedding") or None
+    except requests.exceptions.RequestException as e:
+        print(f"[embedding] Request failed: {e}")
+        return None
 
-1. [Step Description] - [Business Purpose]
-2. [Step Description] - [Business Purpose]
-3. [Decision Point] - [Condition and Outcomes]
-4. [Step Description] - [Business Purpose]
 
-Keep each step concise but descriptive enough for business stakeholders to understand.
+FLOW_LABEL_PROMPT = """
+You are an expert Business Analyst AI assistant.
 
-Here is the code to analyze:
+Below are the steps and decision points of a control flow graph that was extracted from the Python code of `{{FLOW_NAME}}`.
+Each line has a node id followed by the code for that node.
 
-{{CODE_BLOCK}}
+For every node, write a short business label (at most 8 words) that explains what the step or decision means for the business.
+Decision points should be phrased as a question.
+
+Return exactly one line per node in this format and nothing else:
+
+N1: <business label>
+N2: <business label>
+
+Here are the nodes:
+
+{{NODE_BLOCK}}
 """
-    
-    # Prepare prompt
-    prompt = process_flow_prompt.replace("{{CODE_BLOCK}}", code_source)
-    
-    # Truncate prompt if too long
-    if len(prompt) > 32000:
-        print(f"Warning: Process flow prompt is {len(prompt)} characters, truncating...")
-        code_part = code_source[:20000]
-        prompt = process_flow_prompt.replace("{{CODE_BLOCK}}", code_part + "\n\n[... code truncated ...]")
-    
-    payload = {
-        "model": model, 
-        "prompt": prompt, 
-        "stream": False,
-        "options": {
-            "temperature": 0.7,
-            "top_p": 0.9,
-            "num_ctx": 4096
-        }
-    }
-    
-    try:
-        print(f"Making process flow request to Ollama with model: {model}")
-        print(f"Process flow prompt length: {len(prompt)} characters")
-        
-        # Add retry logic
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                response = requests.post(
-                    OLLAMA_API_URL,
-                    json=payload,
-                    timeout=300
-                )
-                
-                print(f"Process flow response status: {response.status_code}")
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    generated_text = result.get("response", "").strip()
-                    
-                    if generated_text:
-                        return generated_text
-                    else:
-                        return "Error: Empty response from LLM for process flow generation."
-                
-                elif response.status_code == 404:
-                    return f"Error: Model '{model}' not found. Please check if the model is installed in Ollama."
-                
-                else:
-                    error_msg = f"HTTP {response.status_code}: {response.text}"
-                    print(f"Process flow error response: {error_msg}")
-                    
-                    if attempt < max_retries - 1:
-                        print(f"Retrying process flow generation in 2 seconds... (attempt {attempt + 1}/{max_retries})")
-                        time.sleep(2)
-                        continue
-                    
-                    return f"Error: {error_msg}"
-                    
-            except requests.exceptions.Timeout:
-                if attempt < max_retries - 1:
-                    print(f"Process flow request timed out, retrying... (attempt {attempt + 1}/{max_retries})")
-                    time.sleep(2)
-                    continue
-                return "Error: Process flow request timed out. The model might be too slow or the prompt too long."
-                
-            except requests.exceptions.ConnectionError:
-                return "Error: Cannot connect to Ollama. Please ensure Ollama is running."
-                
-        return "Error: Max retries exceeded for process flow generation."
-        
-    except requests.exceptions.RequestException as e:
-        return f"Error: Process flow request failed - {str(e)}"
-  
\ No newline at end of file
+
+
+def generate_flow_labels(graph, model, cache=None):
+    """Ask the LLM for short business labels for every node of a flow graph.
+
+    All nodes are labelled in a single batched call. Returns a dict mapping
+    node ids to labels; on failure the dict is empty so callers fall back to
+    the code text of each node.
+    """
+    if not graph or not graph.get('nodes'):
+        return {}
+
+    if not model:
+        return {}
+
+    if not check_ollama_connection():
+        print("Warning: Cannot connect to Ollama, using code text as flow labels")
+        return {}
+
+    node_lines = []
+    for node in graph['nodes']:
+        if node['kind'] in ('start', 'end'):
+            continue
+        node_lines.append(f"{node['id']}: {node['text']}")
+
+    if not node_lines:
+        return {}
+
+    prompt = FLOW_LABEL_PROMPT.replace("{{FLOW_NAME}}", graph.get('name', 'code'))
+    prompt = prompt.replace("{{NODE_BLOCK}}", "\n".join(node_lines))
+
+    # Labels are short, so a low temperature keeps them consistent between runs
+    response = call_ollama(prompt, model, options={"temperature": 0.2}, task="flow label", cache=cache)
+    if response.startswith("Error:"):
+        print(f"Could not generate flow labels: {response}")
+        return {}
+
+    return parse_flow_labels(response, {node['id'] for node in graph['nodes']})
+
+
+def parse_flow_labels(response, node_ids):
+    """Parse "N<id>: label" lines from an LLM response."""
+    labels = {}
+    for line in response.splitlines():
+        match = re.match(r"^\s*[-*]?\s*\**(N\d+)\**\s*[:\-\u2013]\s*(.+)$", line)
+        if match and match.group(1) in node_ids:
+            label = match.group(2).strip().strip('"').strip()
+            if label:
+                labels[match.group(1)] = label
+    return labels
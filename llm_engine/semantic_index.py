@@ -0,0 +1,409 @@
+import hashlib
+import json
+import keyword
+import os
+import re
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from llm_engine.run_local_llm import call_ollama_embedding, generate_brd
+
+DEFAULT_SEMANTIC_DIR = os.path.join(".bare_index", "semantic")
+# Bump when the on-disk layout changes; older indexes are rebuilt
+INDEX_VERSION = 1
+
+# Hashed TF-IDF vectors: identifiers are hashed into this many buckets, so no
+# vocabulary has to be stored and queries map into the same space
+TFIDF_DIMENSIONS = 512
+# Characters of each function sent to the embedding model
+EMBED_SOURCE_CHARS = 4000
+# Parallel embedding requests (the LLM scheduler still caps them server-wide)
+EMBED_WORKERS = 4
+
+# Random-hyperplane LSH: LSH_TABLES tables of LSH_BITS-bit signatures. Up to
+# EXACT_SEARCH_ROWS rows an exact scan is cheaper than probing the tables.
+LSH_BITS = 12
+LSH_TABLES = 6
+LSH_SEED = 1234
+EXACT_SEARCH_ROWS = 5000
+# Fewer LSH candidates than this many per requested neighbour falls back to an exact scan
+MIN_CANDIDATES_PER_RESULT = 4
+
+# Code budgets per prompt. The project prompt stays under generate_brd's
+# truncation limit, so the selected code is never cut off.
+PROJECT_CONTEXT_CHARS = 20000
+MODULE_CONTEXT_CHARS = 3000
+# Neighbours looked at per BRD section
+SECTION_RESULTS = 25
+
+# What each part of the BRD (prompts/brd_prompt.txt) needs to see in the code
+SECTION_QUERIES = [
+    ("Executive Summary and Business Objectives",
+     "main entry point run application workflow process business purpose service"),
+    ("Scope and Stakeholders",
+     "user customer admin role permission account access request owner"),
+    ("Functional Requirements",
+     "create update delete submit approve calculate validate order payment report generate export import"),
+    ("Non-Functional Requirements",
+     "performance security authentication encryption logging error exception retry timeout cache audit"),
+    ("Assumptions and Constraints",
+     "config settings limit maximum minimum threshold default environment format rule check"),
+    ("Technical Architecture",
+     "database connection query api endpoint server client http queue file storage schema"),
+]
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_WORD = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|[0-9]+")
+_STOP_WORDS = frozenset(word.lower() for word in keyword.kwlist) | {'self', 'cls', 'args', 'kwargs', 'str', 'int'}
+
+
+def tokenize_code(text):
+    """Lower-case words of the identifiers and comments in `text`, with snake_case and CamelCase split."""
+    words = []
+    for identifier in _IDENTIFIER.findall(text):
+        for word in _WORD.findall(identifier):
+            word = word.lower()
+            if len(word) > 1 and word not in _STOP_WORDS:
+                words.append(word)
+    return words
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class TfidfEmbedder:
+    """Local fallback embedder: sublinear TF-IDF over hashed identifier words."""
+
+    name = "tfidf"
+
+    def __init__(self, idf=None):
+        self.idf = idf if idf is not None else np.ones(TFIDF_DIMENSIONS, dtype=np.float32)
+
+    @staticmethod
+    def _counts(text):
+        buckets = [zlib.crc32(word.encode("utf-8")) % TFIDF_DIMENSIONS for word in tokenize_code(text)]
+        return np.bincount(np.array(buckets, dtype=np.int64), minlength=TFIDF_DIMENSIONS).astype(np.float32)
+
+    def fit(self, texts):
+        """Learn inverse document frequencies from the indexed texts and embed them."""
+        counts = np.stack([self._counts(text) for text in texts]) if texts else np.zeros((0, TFIDF_DIMENSIONS), np.float32)
+        document_frequency = (counts > 0).sum(axis=0)
+        self.idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+        return self._weigh(counts)
+
+    def _weigh(self, counts):
+        weights = np.zeros_like(counts)
+        np.log(counts, out=weights, where=counts > 0)
+        weights[counts > 0] += 1
+        return _normalize(weights * self.idf)
+
+    def embed(self, texts):
+        return self._weigh(np.stack([self._counts(text) for text in texts]))
+
+
+class OllamaEmbedder:
+    """Embeds texts with an Ollama embedding model through /api/embeddings."""
+
+    def __init__(self, model):
+        self.model = model
+        self.name = f"ollama:{model}"
+
+    def embed(self, texts, progress_callback=None):
+        """Embeddings of `texts` as normalized rows; raises RuntimeError if any request fails."""
+        vectors = [None] * len(texts)
+        with ThreadPoolExecutor(max_workers=EMBED_WORKERS) as executor:
+            futures = [executor.submit(call_ollama_embedding, text[:EMBED_SOURCE_CHARS], self.model) for text in texts]
+            for index, future in enumerate(futures):
+                vectors[index] = future.result()
+                if vectors[index] is None:
+                    for pending in futures[index + 1:]:
+                        pending.cancel()
+                    raise RuntimeError(f"Could not embed text {index + 1} of {len(texts)} with {self.model}")
+                if progress_callback:
+                    progress_callback(index + 1, len(texts))
+        if not vectors:
+            return np.zeros((0, 0), dtype=np.float32)
+        return _normalize(np.array(vectors, dtype=np.float32))
+
+
+def function_text(func):
+    """Text embedded for one function: where it lives, its name and its source."""
+    return f"# {func.get('file') or ''} {func.get('qualname') or func['name']}\n{func['source']}"
+
+
+def function_key(func):
+    return [func.get('file') or "", func.get('qualname') or func['name'], func['start_line']]
+
+
+def default_semantic_index_path(project):
+    """Index directory for a project (a directory root, or any name for uploads)."""
+    digest = hashlib.sha1(project.encode("utf-8", "surrogatepass")).hexdigest()[:16]
+    return os.path.join(DEFAULT_SEMANTIC_DIR, digest)
+
+
+class SemanticIndex:
+    """On-disk embedding index of a project's functions with approximate nearest-neighbour search.
+
+    Vectors are stored as a float16 NumPy array next to a JSON file listing
+    which function each row belongs to and the hash of its text. update()
+    only embeds functions whose text changed, so re-running on a large project
+    mostly reuses stored vectors. Queries probe random-hyperplane LSH tables
+    (rebuilt from a fixed seed when the index is loaded) and rank the
+    candidates by exact cosine similarity.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.embedder = None
+        self.vectors = np.zeros((0, 0), dtype=np.float16)
+        self._set_entries([])
+        self._load()
+
+    def _set_entries(self, entries):
+        """Replace the entries and reset everything derived from them or the vectors."""
+        self.entries = entries
+        self._tables = None
+        # Query text -> vector (None if it could not be embedded), so fixed
+        # queries such as SECTION_QUERIES are embedded once per index
+        self._query_vectors = {}
+        # File -> its rows, for searches restricted to some files
+        self._file_rows = {}
+        for row, entry in enumerate(entries):
+            self._file_rows.setdefault(entry[0], []).append(row)
+
+    def _files(self):
+        return (os.path.join(self.path, "index.json"), os.path.join(self.path, "vectors.npy"),
+                os.path.join(self.path, "idf.npy"))
+
+    def _load(self):
+        meta_path, vectors_path, idf_path = self._files()
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get('version') != INDEX_VERSION:
+                return
+            vectors = np.load(vectors_path)
+            idf = np.load(idf_path) if meta['embedder'] == TfidfEmbedder.name else None
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"Could not load semantic index {self.path}, rebuilding it: {e}")
+            return
+        self.vectors = vectors
+        self.embedder = (TfidfEmbedder(idf) if meta['embedder'] == TfidfEmbedder.name
+                         else OllamaEmbedder(meta['embedder'].split(":", 1)[1]))
+        self._set_entries(meta['entries'])
+
+    def _save(self):
+        os.makedirs(self.path, exist_ok=True)
+        meta_path, vectors_path, idf_path = self._files()
+        # Written to temporary files first so a crash never leaves a half-written index
+        np.save(vectors_path + ".tmp.npy", self.vectors)
+        os.replace(vectors_path + ".tmp.npy", vectors_path)
+        if isinstance(self.embedder, TfidfEmbedder):
+            np.save(idf_path + ".tmp.npy", self.embedder.idf)
+            os.replace(idf_path + ".tmp.npy", idf_path)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({'version': INDEX_VERSION, 'embedder': self.embedder.name, 'entries': self.entries}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def update(self, functions, embedding_model=None, progress_callback=None):
+        """Bring the index in line with `functions` and save it.
+
+        With `embedding_model`, functions are embedded by that Ollama model and
+        unchanged ones keep their stored vectors; if Ollama cannot embed them,
+        or without a model, the hashed TF-IDF embedder is used. Returns
+        {'embedder', 'functions', 'embedded', 'reused', 'seconds'}.
+        """
+        started = time.perf_counter()
+        texts = [function_text(func) for func in functions]
+        hashes = [hashlib.sha1(text.encode("utf-8", "surrogatepass")).hexdigest() for text in texts]
+        entries = [function_key(func) + [text_hash] for func, text_hash in zip(functions, hashes)]
+        embedded = reused = 0
+
+        if embedding_model:
+            embedder = OllamaEmbedder(embedding_model)
+            stored = {}
+            if self.embedder is not None and self.embedder.name == embedder.name:
+                stored = {entry[3]: row for row, entry in enumerate(self.entries)}
+            missing = [index for index, text_hash in enumerate(hashes) if text_hash not in stored]
+            try:
+                new_vectors = embedder.embed([texts[index] for index in missing], progress_callback)
+            except RuntimeError as e:
+                print(f"{e}; falling back to TF-IDF embeddings")
+                embedder = None
+            else:
+                dimensions = new_vectors.shape[1] if len(missing) else self.vectors.shape[1]
+                vectors = np.zeros((len(texts), dimensions), dtype=np.float16)
+                reused_rows = [(index, stored[text_hash]) for index, text_hash in enumerate(hashes) if text_hash in stored]
+                if reused_rows:
+                    targets, sources = zip(*reused_rows)
+                    vectors[list(targets)] = self.vectors[list(sources)]
+                if missing:
+                    vectors[missing] = new_vectors
+                embedded, reused = len(missing), len(reused_rows)
+        else:
+            embedder = None
+
+        if embedder is None:
+            # TF-IDF weights depend on the whole corpus, and embedding is cheap, so everything is redone
+            embedder = TfidfEmbedder()
+            vectors = embedder.fit(texts).astype(np.float16)
+            embedded = len(texts)
+
+        self.embedder = embedder
+        self.vectors = vectors
+        self._set_entries(entries)
+        self._save()
+        return {
+            'embedder': embedder.name,
+            'functions': len(entries),
+            'embedded': embedded,
+            'reused': reused,
+            'seconds': time.perf_counter() - started
+        }
+
+    def _planes(self):
+        dimensions = self.vectors.shape[1]
+        rng = np.random.default_rng(LSH_SEED)
+        return rng.standard_normal((LSH_TABLES * LSH_BITS, dimensions)).astype(np.float32)
+
+    def _signatures(self, vectors, planes):
+        """(rows, LSH_TABLES) int signatures of float32 `vectors`."""
+        bits = (vectors @ planes.T > 0).reshape(len(vectors), LSH_TABLES, LSH_BITS)
+        return bits.astype(np.int64) @ (1 << np.arange(LSH_BITS, dtype=np.int64))
+
+    def _lsh_tables(self):
+        """Per table: (sorted signatures, row order), built on first use."""
+        if self._tables is None:
+            planes = self._planes()
+            signatures = np.concatenate([
+                self._signatures(self.vectors[start:start + 65536].astype(np.float32), planes)
+                for start in range(0, len(self), 65536)
+            ])
+            tables = []
+            for table in range(LSH_TABLES):
+                order = np.argsort(signatures[:, table], kind='stable')
+                tables.append((signatures[order, table], order))
+            self._tables = (planes, tables)
+        return self._tables
+
+    def _candidates(self, query):
+        """Rows whose signature matches the query's, or differs in one bit, in any table."""
+        planes, tables = self._lsh_tables()
+        signatures = self._signatures(query[None, :], planes)[0]
+        flips = np.concatenate([[0], 1 << np.arange(LSH_BITS, dtype=np.int64)])
+        candidates = []
+        for table, (sorted_signatures, order) in enumerate(tables):
+            probes = signatures[table] ^ flips
+            starts = np.searchsorted(sorted_signatures, probes, side='left')
+            ends = np.searchsorted(sorted_signatures, probes, side='right')
+            candidates.extend(order[start:end] for start, end in zip(starts, ends) if end > start)
+        return np.unique(np.concatenate(candidates)) if candidates else np.zeros(0, dtype=np.int64)
+
+    def embed_query(self, text):
+        """Query vector in the index's space, or None if it cannot be computed.
+
+        Vectors are cached per index, so repeated queries cost no embedding requests.
+        """
+        if self.embedder is None or not len(self):
+            return None
+        if text not in self._query_vectors:
+            try:
+                self._query_vectors[text] = self.embedder.embed([text])[0].astype(np.float32)
+            except RuntimeError as e:
+                print(f"Could not embed query: {e}")
+                self._query_vectors[text] = None
+        return self._query_vectors[text]
+
+    def search(self, text, k=10, files=None):
+        """The `k` functions most similar to `text` as [(entry, score)], best first.
+
+        `entry` is [file, qualname, start_line, hash]. With `files`, only
+        functions of those files are searched (exactly, as modules are small).
+        """
+        query = self.embed_query(text)
+        if query is None:
+            return []
+        if files:
+            rows = np.array([row for name in set(files) for row in self._file_rows.get(name, ())], dtype=np.int64)
+        elif len(self) > EXACT_SEARCH_ROWS:
+            rows = self._candidates(query)
+            if len(rows) < k * MIN_CANDIDATES_PER_RESULT:
+                rows = np.arange(len(self))
+        else:
+            rows = np.arange(len(self))
+        if not len(rows):
+            return []
+
+        scores = self.vectors[rows].astype(np.float32) @ query
+        if k < len(rows):
+            best = np.argpartition(-scores, k)[:k]
+        else:
+            best = np.arange(len(rows))
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [(self.entries[rows[index]], float(scores[index])) for index in best]
+
+
+def relevant_code(index, functions, budget=PROJECT_CONTEXT_CHARS, files=None):
+    """Code block with the functions most relevant to each BRD section, within `budget` characters.
+
+    Every section of SECTION_QUERIES gets an equal share of the budget (unused
+    share carries over to the next one) and each function is included at most
+    once. Falls back to the functions in order if the index cannot be queried.
+    """
+    by_key = {tuple(function_key(func)): func for func in functions}
+    share = budget // len(SECTION_QUERIES)
+    included = set()
+    blocks = []
+    remaining = 0
+    for section, query in SECTION_QUERIES:
+        header = f"# === Relevant to: {section} ===\n\n"
+        remaining += share - len(header)
+        section_blocks = []
+        for entry, score in index.search(query, k=SECTION_RESULTS, files=files):
+            key = tuple(entry[:3])
+            func = by_key.get(key)
+            if func is None or key in included or score <= 0:
+                continue
+            block = f"# Function from file: {func.get('file') or ''}\n{func['source']}"
+            if len(block) > remaining:
+                if section_blocks or remaining < 500:
+                    continue
+                block = block[:remaining] + "\n    # [... shortened ...]"
+            included.add(key)
+            section_blocks.append(block)
+            remaining -= len(block) + 2
+        if section_blocks:
+            blocks.append(header + "\n\n".join(section_blocks))
+        else:
+            remaining += len(header)
+
+    if not blocks:
+        # No usable search results: keep the old behaviour of taking code in order
+        code = "\n\n".join(f"# Function from file: {func.get('file') or ''}\n{func['source']}" for func in functions)
+        return code[:budget]
+    return "\n\n".join(blocks)
+
+
+def run_semantic_brd(payload, model, report_progress, cache):
+    """Job handler: project BRD from the code most relevant to each BRD section."""
+    functions = payload['functions']
+    index = SemanticIndex(payload['index_path'])
+    report_progress(f"indexing {len(functions)} functions")
+    summary = index.update(
+        functions, payload.get('embedding_model') or None,
+        progress_callback=lambda completed, total: report_progress(f"embedding {completed}/{total}")
+    )
+    print(f"Semantic index: {summary}")
+    report_progress("selecting relevant code")
+    return generate_brd(relevant_code(index, functions), model, cache=cache)
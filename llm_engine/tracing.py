@@ -0,0 +1,189 @@
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Spans kept in memory per process; the oldest are dropped first
+MAX_EVENTS = 200000
+# Upper bounds (ms) of the duration histogram buckets; the last bucket is open
+HISTOGRAM_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 60000)
+DEFAULT_PROFILE_DIR = ".bare_traces"
+
+# Groups spans into one trace: the job worker sets it to the run id, the UI to its session
+current_trace = contextvars.ContextVar("bare_trace", default="")
+
+
+def _bucket_label(index):
+    if index == len(HISTOGRAM_BUCKETS_MS):
+        return f">{HISTOGRAM_BUCKETS_MS[-1]}ms"
+    return f"<={HISTOGRAM_BUCKETS_MS[index]}ms"
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class Tracer:
+    """Collects timed spans for the pipeline stages of a process.
+
+    Spans are recorded with wall-clock start times so they can be exported in
+    Chrome trace format (chrome://tracing, Perfetto) and aggregated into
+    per-stage duration statistics and histograms.
+    """
+
+    def __init__(self, max_events=MAX_EVENTS):
+        self._events = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage, **args):
+        """Time the enclosed block as one `stage` span.
+
+        Yields the span's args dict, so the block can attach results such as
+        token counts.
+        """
+        started = time.time()
+        clock = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.record(stage, started, time.perf_counter() - clock, args)
+
+    def record(self, stage, started, duration, args=None, trace=None):
+        """Add a span that was timed elsewhere (`started` is a time.time() value)."""
+        event = (
+            stage, started, duration, current_trace.get() if trace is None else trace,
+            threading.get_ident(), dict(args or {})
+        )
+        with self._lock:
+            self._events.append(event)
+
+    def _select(self, traces):
+        with self._lock:
+            events = list(self._events)
+        if traces is None:
+            return events
+        traces = {traces} if isinstance(traces, str) else set(traces)
+        return [event for event in events if event[3] in traces]
+
+    def events(self, traces=None):
+        """Recorded spans as dicts, optionally limited to one or more trace ids."""
+        return [
+            {'stage': stage, 'started': started, 'duration': duration, 'trace': trace, 'thread': thread, 'args': args}
+            for stage, started, duration, trace, thread, args in self._select(traces)
+        ]
+
+    def stage_stats(self, traces=None):
+        """Per-stage count, total, mean, p50/p95/max (ms) and duration histogram."""
+        durations = {}
+        for stage, _, duration, _, _, _ in self._select(traces):
+            durations.setdefault(stage, []).append(duration * 1000)
+
+        stats = []
+        for stage, values in durations.items():
+            values.sort()
+            histogram = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+            for value in values:
+                histogram[bisect.bisect_left(HISTOGRAM_BUCKETS_MS, value)] += 1
+            stats.append({
+                'stage': stage,
+                'count': len(values),
+                'total_ms': sum(values),
+                'mean_ms': sum(values) / len(values),
+                'p50_ms': _percentile(values, 0.5),
+                'p95_ms': _percentile(values, 0.95),
+                'max_ms': values[-1],
+                'histogram': {_bucket_label(index): count for index, count in enumerate(histogram) if count}
+            })
+        return sorted(stats, key=lambda stage: stage['total_ms'], reverse=True)
+
+    def chrome_trace(self, traces=None):
+        """Spans as a Chrome trace ("X" complete events, one row per thread)."""
+        pid = os.getpid()
+        return {
+            'traceEvents': [
+                {
+                    'name': stage, 'cat': trace or 'bare', 'ph': 'X',
+                    'ts': int(started * 1e6), 'dur': int(duration * 1e6),
+                    'pid': pid, 'tid': thread, 'args': args
+                }
+                for stage, started, duration, trace, thread, args in self._select(traces)
+            ],
+            'displayTimeUnit': 'ms'
+        }
+
+    def export_chrome_trace(self, path, traces=None):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(traces), f, default=str)
+        return path
+
+    def reset(self):
+        with self._lock:
+            self._events.clear()
+
+
+# Process-wide tracer used by the pipeline
+tracer = Tracer()
+
+
+def span(stage, **args):
+    """Shortcut for tracer.span() on the process-wide tracer."""
+    return tracer.span(stage, **args)
+
+
+@contextmanager
+def profile(name, profiler=None, output_dir=DEFAULT_PROFILE_DIR):
+    """Profile the enclosed block when BARE_PROFILE (or `profiler`) is set.
+
+    'cprofile' writes a .prof file for pstats/snakeviz, 'pyinstrument' an HTML
+    report (falling back to cProfile if pyinstrument is not installed). Does
+    nothing otherwise, so it can stay in hot paths.
+    """
+    profiler = (profiler or os.environ.get("BARE_PROFILE", "")).lower()
+    if profiler not in ("cprofile", "pyinstrument"):
+        yield
+        return
+
+    os.makedirs(output_dir, exist_ok=True)
+    base_path = os.path.join(output_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{threading.get_ident()}")
+
+    if profiler == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("pyinstrument is not installed, using cProfile instead")
+        else:
+            active = Profiler()
+            active.start()
+            try:
+                yield
+            finally:
+                active.stop()
+                with open(base_path + ".html", "w", encoding="utf-8") as f:
+                    f.write(active.output_html())
+            return
+
+    import cProfile
+
+    active = cProfile.Profile()
+    try:
+        active.enable()
+    except ValueError as e:
+        # Only one profiler can be active at a time on newer Pythons
+        print(f"Profiling skipped for {name}: {e}")
+        yield
+        return
+    try:
+        yield
+    finally:
+        active.disable()
+        active.dump_stats(base_path + ".prof")
@@ -0,0 +1,178 @@
+import re
+
+from llm_engine.run_local_llm import call_ollama, generate_brd, load_prompt
+from parsers.triage import CRITICAL, ROUTINE, TRIVIAL, describe_trivial_function, triage_function
+
+DEFAULT_TRIAGE_PROMPT = (
+    "Classify each of the following Python functions as trivial, routine or business-critical. "
+    "Answer with one line per function, e.g. `F1: routine`.\n\n{{FUNCTION_BLOCK}}"
+)
+
+# Routine functions are sent to the big model together, up to this many per prompt
+ROUTINE_BATCH_SIZE = 8
+ROUTINE_BATCH_CHARS = 12000
+# Functions longer than this are shown to the triage model in shortened form
+TRIAGE_SOURCE_CHARS = 1500
+
+
+def _function_code(func):
+    return f"# Function from file: {func.get('file') or ''}\n\n{func['source']}"
+
+
+def _function_title(func):
+    name = func.get('qualname') or func['name']
+    return f"{name} ({func['file']})" if func.get('file') else name
+
+
+def render_trivial_brd(func, triage):
+    """Short templated BRD entry for a trivial function (no LLM call)."""
+    return (
+        f"**{_function_title(func)}**\n\n"
+        f"{describe_trivial_function(func)}\n\n"
+        f"_Classified as trivial ({triage['reason']}); it carries no business rules of its own, "
+        f"so no separate requirements are listed._"
+    )
+
+
+def parse_triage_labels(response, count):
+    """Parse "F<n>: category" lines; unreadable or missing answers are left out."""
+    labels = {}
+    for line in response.splitlines():
+        match = re.match(r"^\s*[-*]?\s*\**F(\d+)\**\s*[:\-–]\s*\**\s*([a-z\- ]+)", line, re.IGNORECASE)
+        if not match:
+            continue
+        index = int(match.group(1)) - 1
+        answer = match.group(2).strip().lower()
+        category = next((category for category in (CRITICAL, ROUTINE, TRIVIAL) if answer.startswith(category.split('-')[0])), None)
+        if 0 <= index < count and category:
+            labels[index] = category
+    return labels
+
+
+def classify_functions(functions, model, cache=None):
+    """Ask a small, fast model to triage `functions` in one call.
+
+    Returns one category per function; functions the model does not answer
+    for stay routine, so a bad answer never skips analysis.
+    """
+    blocks = []
+    for index, func in enumerate(functions, start=1):
+        source = func['source']
+        if len(source) > TRIAGE_SOURCE_CHARS:
+            source = source[:TRIAGE_SOURCE_CHARS] + "\n    # [... shortened ...]"
+        blocks.append(f"F{index}: {_function_title(func)}\n{source}")
+
+    prompt = load_prompt("triage_prompt.txt", DEFAULT_TRIAGE_PROMPT).replace("{{FUNCTION_BLOCK}}", "\n\n".join(blocks))
+    response = call_ollama(prompt, model, options={"temperature": 0.0}, task="triage", cache=cache)
+    if response.startswith("Error:"):
+        print(f"Could not triage functions with {model}: {response}")
+        return [ROUTINE] * len(functions)
+
+    labels = parse_triage_labels(response, len(functions))
+    return [labels.get(index, ROUTINE) for index in range(len(functions))]
+
+
+def _batch_routine(functions):
+    """Split functions into groups that fit one batched BRD prompt."""
+    batches = []
+    current = []
+    current_size = 0
+    for func in functions:
+        size = len(func['source'])
+        if current and (len(current) >= ROUTINE_BATCH_SIZE or current_size + size > ROUTINE_BATCH_CHARS):
+            batches.append(current)
+            current = []
+            current_size = 0
+        current.append(func)
+        current_size += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def build_triaged_jobs(functions, triage_model=None, metrics_table=None):
+    """Route per-function BRD jobs by how much analysis each function needs.
+
+    Business-critical functions get their own BRD job on the selected model,
+    trivial ones a templated entry without an LLM call, and routine ones are
+    batched several per prompt. With `triage_model`, each routine batch is
+    first re-checked by that (small) model when the job runs. Metrics for the
+    model router come from `metrics_table` (a parsers.metrics.MetricsTable)
+    when given. Returns (jobs, triage) where triage lists (function, result) pairs.
+    """
+    if metrics_table is not None:
+        metrics_for = metrics_table.metrics
+    else:
+        # Imported lazily: parsers.metrics loads NumPy
+        from parsers.metrics import function_metrics as metrics_for
+    triage = [(func, triage_function(func)) for func in functions]
+    jobs = []
+    routine = []
+    for func, result in triage:
+        if result['category'] == CRITICAL:
+            jobs.append({
+                'kind': 'brd',
+                'title': f"Function: {_function_title(func)}",
+                'payload': {'code': _function_code(func), 'metrics': metrics_for(func)}
+            })
+        elif result['category'] == TRIVIAL:
+            jobs.append({
+                'kind': 'template',
+                'title': f"Function: {_function_title(func)}",
+                'payload': {'text': render_trivial_brd(func, result)}
+            })
+        else:
+            routine.append(func)
+
+    for batch in _batch_routine(routine):
+        names = ", ".join(func.get('qualname', func['name']) for func in batch)
+        jobs.append({
+            'kind': 'triaged_batch',
+            'title': f"Functions: {names}",
+            'payload': {
+                'functions': [
+                    {key: func.get(key) for key in ('name', 'qualname', 'file', 'kind', 'source')}
+                    for func in batch
+                ],
+                'triage_model': triage_model or ""
+            }
+        })
+    return jobs, triage
+
+
+def run_triaged_batch(payload, model, report_progress, cache):
+    """Job handler for a batch of routine functions.
+
+    Functions the triage model promotes to business-critical get their own BRD
+    call, demoted ones a template; the rest share one BRD prompt.
+    """
+    functions = payload['functions']
+    if payload.get('triage_model'):
+        report_progress("triage")
+        categories = classify_functions(functions, payload['triage_model'], cache=cache)
+    else:
+        categories = [ROUTINE] * len(functions)
+
+    # Imported lazily: parsers.metrics loads NumPy
+    from parsers.metrics import function_metrics
+
+    sections = []
+    batched = [func for func, category in zip(functions, categories) if category == ROUTINE]
+    if batched:
+        report_progress(f"batched BRD for {len(batched)} functions")
+        response = generate_brd("\n\n".join(_function_code(func) for func in batched), model, cache=cache)
+        if response.startswith("Error:"):
+            return response
+        sections.append(response)
+
+    for func, category in zip(functions, categories):
+        if category == CRITICAL:
+            report_progress(f"BRD for {func['qualname']}")
+            response = generate_brd(_function_code(func), model, cache=cache, metrics=function_metrics(func))
+            if response.startswith("Error:"):
+                return response
+            sections.append(f"### Function: {_function_title(func)}\n\n{response}")
+        elif category == TRIVIAL:
+            sections.append(render_trivial_brd(func, {'reason': "triage model"}))
+
+    return "\n\n---\n\n".join(sections)
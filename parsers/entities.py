@@ -0,0 +1,247 @@
+import itertools
+import re
+
+# Same line terminators the Python tokenizer (and therefore ast line numbers) uses
+_LINE_END = re.compile(r"\r\n|\r|\n")
+
+_file_ids = itertools.count(1)
+
+
+def strip_line_end(text):
+    """Remove a single trailing line terminator."""
+    if text.endswith("\r\n"):
+        return text[:-2]
+    if text.endswith(("\n", "\r")):
+        return text[:-1]
+    return text
+
+
+class ModuleInfo:
+    """Shared source buffer for one file.
+
+    Every entity extracted from the file keeps a reference to the same
+    ModuleInfo and only stores its own spans, so source text is held once.
+    """
+
+    __slots__ = ('file_id', 'path', 'text', '_line_offsets')
+
+    def __init__(self, text, path=None, file_id=None):
+        self.file_id = file_id if file_id is not None else next(_file_ids)
+        self.path = path
+        self.text = text
+        self._line_offsets = None
+
+    @property
+    def line_offsets(self):
+        """Offsets of the start of every line, plus one past the end of the text."""
+        if self._line_offsets is None:
+            offsets = [0]
+            for match in _LINE_END.finditer(self.text):
+                offsets.append(match.end())
+            if offsets[-1] != len(self.text):
+                offsets.append(len(self.text))
+            self._line_offsets = offsets
+        return self._line_offsets
+
+    @property
+    def line_count(self):
+        return len(self.line_offsets) - 1
+
+    def line_span_to_offsets(self, start_line, end_line):
+        """Convert a 1-based inclusive line span to (start, end) offsets."""
+        offsets = self.line_offsets
+        start_line = max(1, min(start_line, self.line_count + 1))
+        end_line = max(start_line - 1, min(end_line, self.line_count))
+        return offsets[start_line - 1], offsets[end_line]
+
+    def segment(self, lineno, col_offset, end_lineno, end_col_offset):
+        """Source of an AST node from its position, reading only the lines it spans.
+
+        Columns are UTF-8 byte offsets, as in the ast module.
+        """
+        offsets = self.line_offsets
+        if not 1 <= lineno <= end_lineno <= self.line_count:
+            return None
+        lines = [
+            strip_line_end(self.text[offsets[line - 1]:offsets[line]]).encode("utf-8", "surrogatepass")
+            for line in range(lineno, end_lineno + 1)
+        ]
+        lines[-1] = lines[-1][:end_col_offset]
+        lines[0] = lines[0][col_offset:]
+        return "\n".join(line.decode("utf-8", "surrogatepass") for line in lines)
+
+    def read(self, start_offset, end_offset):
+        """Return the raw text between two offsets."""
+        return self.text[start_offset:end_offset]
+
+    def slice(self, start_offset, end_offset):
+        """Return the text between two offsets without its final line terminator."""
+        return strip_line_end(self.read(start_offset, end_offset))
+
+    def __repr__(self):
+        return f"ModuleInfo(file_id={self.file_id}, path={self.path!r}, lines={self.line_count})"
+
+
+class _CodeEntity:
+    """Base for extracted code units: a named line span into a ModuleInfo.
+
+    Entities also behave like the plain dicts the parser used to return
+    (entity['name'], entity.get('source'), 'file' in entity, ...), so existing
+    callers keep working. Assigning entity['file'] sets the module path.
+    """
+
+    __slots__ = ('name', 'qualname', 'parent', 'decorators', 'module',
+                 'start_line', 'end_line', 'start_offset', 'end_offset')
+
+    # Keys exposed through the dict-compatible view
+    _keys = ('name', 'qualname', 'parent', 'decorators', 'source', 'start_line', 'end_line', 'file')
+    # Attributes beyond the span, in the order used by to_span()/from_span()
+    _extra_fields = ('qualname', 'parent', 'decorators')
+
+    def __init__(self, name, module, start_line, end_line, qualname=None, parent=None, decorators=()):
+        self.name = name
+        self.qualname = qualname or name
+        self.parent = parent
+        self.decorators = tuple(decorators)
+        self.module = module
+        self.start_line = start_line
+        self.end_line = end_line
+        self.start_offset, self.end_offset = module.line_span_to_offsets(start_line, end_line)
+
+    @classmethod
+    def from_span(cls, name, module, start_line, end_line, start_offset, end_offset, *extras):
+        """Build an entity from a span that was computed earlier (e.g. loaded from an index).
+
+        `extras` are the values of `_extra_fields`, as returned by to_span().
+        """
+        entity = cls.__new__(cls)
+        entity.name = name
+        entity.qualname = name
+        entity.parent = None
+        entity.decorators = ()
+        entity._init_defaults()
+        entity.module = module
+        entity.start_line = start_line
+        entity.end_line = end_line
+        entity.start_offset = start_offset
+        entity.end_offset = end_offset
+        for field, value in zip(cls._extra_fields, extras):
+            if field == 'decorators':
+                value = tuple(value)
+            elif field == 'excluded':
+                value = tuple(tuple(span) for span in value)
+            setattr(entity, field, value)
+        return entity
+
+    def _init_defaults(self):
+        """Set defaults for subclass-specific attributes."""
+
+    def to_span(self):
+        """Compact, picklable tuple form accepted by from_span()."""
+        return (self.name, self.start_line, self.end_line, self.start_offset, self.end_offset) + \
+            tuple(getattr(self, field) for field in self._extra_fields)
+
+    @property
+    def source(self):
+        """Source code of the entity, sliced from the shared module buffer on demand."""
+        return self.module.slice(self.start_offset, self.end_offset)
+
+    @property
+    def file(self):
+        return self.module.path
+
+    @file.setter
+    def file(self, value):
+        self.module.path = value
+
+    @property
+    def file_id(self):
+        return self.module.file_id
+
+    # Dict-compatible view
+
+    def keys(self):
+        return [key for key in self._keys if key != 'file' or self.module.path is not None]
+
+    def __getitem__(self, key):
+        if key not in self._keys or (key == 'file' and self.module.path is None):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self._keys or key == 'source':
+            raise KeyError(f"Cannot set '{key}' on {type(self).__name__}")
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def to_dict(self):
+        """Return a plain dict copy (including the sliced source)."""
+        return dict(self.items())
+
+    def __repr__(self):
+        return f"{type(self).__name__}(name={self.qualname!r}, file={self.module.path!r}, lines={self.start_line}-{self.end_line})"
+
+
+class FunctionInfo(_CodeEntity):
+    """A function, method, nested function or named lambda extracted from a module.
+
+    `kind` is one of 'function', 'method', 'nested' or 'lambda'; `parent` is the
+    qualified name of the enclosing class or function, if any. `excluded` holds
+    (start_offset, end_offset, stub) spans of nested definitions that are
+    replaced by a one-line stub in `source` (see partition_functions).
+    """
+
+    __slots__ = ('kind', 'is_async', 'excluded')
+
+    _keys = _CodeEntity._keys + ('kind', 'is_async')
+    _extra_fields = _CodeEntity._extra_fields + ('kind', 'is_async', 'excluded')
+
+    def __init__(self, name, module, start_line, end_line, qualname=None, parent=None, decorators=(),
+                 kind='function', is_async=False):
+        super().__init__(name, module, start_line, end_line, qualname, parent, decorators)
+        self.kind = kind
+        self.is_async = is_async
+        self.excluded = ()
+
+    def _init_defaults(self):
+        self.kind = 'function'
+        self.is_async = False
+        self.excluded = ()
+
+    @property
+    def source(self):
+        """Source code of the function, with excluded nested definitions stubbed out."""
+        if not self.excluded:
+            return self.module.slice(self.start_offset, self.end_offset)
+
+        pieces = []
+        position = self.start_offset
+        for start_offset, end_offset, stub in self.excluded:
+            pieces.append(self.module.read(position, start_offset))
+            pieces.append(stub + "\n")
+            position = end_offset
+        pieces.append(self.module.read(position, self.end_offset))
+        return strip_line_end("".join(pieces))
+
+
+class ClassInfo(_CodeEntity):
+    """A class extracted from a module."""
+
+    __slots__ = ()
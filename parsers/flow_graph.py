@@ -0,0 +1,332 @@
+import ast
+
+from parsers.entities import ModuleInfo
+
+# Node kinds used in the control flow graph
+START = 'start'
+END = 'end'
+STEP = 'step'
+DECISION = 'decision'
+LOOP = 'loop'
+TRY = 'try'
+HANDLER = 'handler'
+EXIT = 'exit'
+
+MAX_TEXT_LENGTH = 60
+
+
+def build_flow_graph(code_string, function_name=None, max_nodes=200):
+    """Build a control flow graph for a function (or the module top level).
+
+    Returns a dict with 'name', 'nodes' and 'edges'. Each node is a dict with
+    'id', 'kind', 'text' and 'line'; each edge is a (source, target, label) tuple.
+    Consecutive plain statements are collapsed into a single step node so the
+    graph only branches at real decision points (if/for/while/try/match).
+    """
+    if not code_string or not code_string.strip():
+        return None
+
+    try:
+        tree = ast.parse(code_string)
+    except SyntaxError as e:
+        print(f"Syntax error in code: {e}")
+        return None
+
+    if function_name:
+        target = find_function_node(tree, function_name)
+        if target is None:
+            return None
+        name = function_name
+        body = target.body
+    else:
+        name = '<module>'
+        body = tree.body
+
+    builder = _FlowGraphBuilder(code_string, max_nodes)
+    return builder.build(name, body)
+
+
+def find_function_node(tree, function_name):
+    """Find a (possibly qualified) function definition node in a parsed tree."""
+    parts = function_name.split('.')
+    candidates = [tree]
+    for part in parts:
+        next_candidates = []
+        for candidate in candidates:
+            for node in ast.walk(candidate):
+                if (isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+                        and node.name == part and node is not candidate):
+                    next_candidates.append(node)
+        if not next_candidates:
+            return None
+        candidates = next_candidates
+
+    for candidate in candidates:
+        if isinstance(candidate, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            return candidate
+    return None
+
+
+def list_decision_points(graph):
+    """Return the decision and loop nodes of a flow graph."""
+    if not graph:
+        return []
+    return [node for node in graph['nodes'] if node['kind'] in (DECISION, LOOP, TRY)]
+
+
+def to_mermaid(graph, labels=None):
+    """Render a flow graph as a Mermaid flowchart.
+
+    `labels` optionally maps node ids to business labels; nodes without a
+    label fall back to the code text they were built from.
+    """
+    if not graph:
+        return "graph TD\n"
+
+    labels = labels or {}
+    mermaid_code = "graph TD\n"
+
+    for node in graph['nodes']:
+        text = labels.get(node['id']) or node['text']
+        safe_text = _escape_mermaid(text)
+        kind = node['kind']
+        if kind in (START, END):
+            mermaid_code += f'    {node["id"]}(["{safe_text}"])\n'
+        elif kind in (DECISION, LOOP):
+            mermaid_code += f'    {node["id"]}{{"{safe_text}"}}\n'
+        elif kind == HANDLER:
+            mermaid_code += f'    {node["id"]}[/"{safe_text}"/]\n'
+        elif kind == EXIT:
+            mermaid_code += f'    {node["id"]}[["{safe_text}"]]\n'
+        else:
+            mermaid_code += f'    {node["id"]}["{safe_text}"]\n'
+
+    for source, target, label in graph['edges']:
+        if label:
+            mermaid_code += f'    {source} -->|{_escape_mermaid(label)}| {target}\n'
+        else:
+            mermaid_code += f'    {source} --> {target}\n'
+
+    return mermaid_code
+
+
+def _escape_mermaid(text):
+    """Make a label safe to embed in a quoted Mermaid node."""
+    text = ' '.join(str(text).split())
+    # Mermaid entity codes keep comparisons and quotes readable in the diagram
+    for char, entity in (('"', '#quot;'), ('<', '#lt;'), ('>', '#gt;'), ('|', '#124;')):
+        text = text.replace(char, entity)
+    return text
+
+
+def _shorten(text):
+    """Collapse whitespace and cap the length of a node description."""
+    text = ' '.join(text.split())
+    if len(text) > MAX_TEXT_LENGTH:
+        text = text[:MAX_TEXT_LENGTH - 3] + "..."
+    return text
+
+
+class _FlowGraphBuilder:
+    """Walks statement lists and emits nodes/edges for a control flow graph."""
+
+    def __init__(self, code_string, max_nodes):
+        # Node text is sliced from its own line; ast.get_source_segment would
+        # split the whole file again for every node
+        self.module = ModuleInfo(code_string)
+        self.max_nodes = max_nodes
+        self.nodes = []
+        self.edges = []
+        self.truncated = False
+        # Stack of (loop_node_id, break_exits) for break/continue handling
+        self.loops = []
+        self.end_id = None
+
+    def build(self, name, body):
+        start_id = self._add_node(START, f"Start {name}", getattr(body[0], 'lineno', None) if body else None)
+        self.end_id = self._add_node(END, f"End {name}", None)
+
+        exits = self._build_block(body, [(start_id, None)])
+        self._connect(exits, self.end_id)
+
+        return {
+            'name': name,
+            'nodes': self.nodes,
+            'edges': self.edges,
+            'truncated': self.truncated
+        }
+
+    def _add_node(self, kind, text, line):
+        node_id = f"N{len(self.nodes)}"
+        self.nodes.append({
+            'id': node_id,
+            'kind': kind,
+            'text': _shorten(text),
+            'line': line
+        })
+        return node_id
+
+    def _connect(self, predecessors, target):
+        for source, label in predecessors:
+            self.edges.append((source, target, label))
+
+    def _text(self, node):
+        """Get the first line of source for a node."""
+        segment = None
+        lineno = getattr(node, 'lineno', None)
+        if lineno is not None and getattr(node, 'end_lineno', None) is not None:
+            end_col_offset = node.end_col_offset if node.end_lineno == lineno else None
+            segment = self.module.segment(lineno, node.col_offset, lineno, end_col_offset)
+        if not segment:
+            return type(node).__name__
+        return segment
+
+    def _header(self, keyword, expression):
+        if expression is None:
+            return keyword
+        return f"{keyword} {self._text(expression)}"
+
+    def _build_block(self, statements, predecessors):
+        """Emit nodes for a list of statements and return the dangling exits."""
+        current_step = None
+
+        for statement in statements:
+            if not predecessors:
+                # Unreachable code after return/raise/break/continue
+                break
+
+            if len(self.nodes) >= self.max_nodes:
+                self.truncated = True
+                break
+
+            if _is_compound(statement):
+                current_step = None
+                predecessors = self._build_compound(statement, predecessors)
+                continue
+
+            if isinstance(statement, (ast.Return, ast.Raise)):
+                node_id = self._add_node(EXIT, self._text(statement), statement.lineno)
+                self._connect(predecessors, node_id)
+                self.edges.append((node_id, self.end_id, None))
+                predecessors = []
+                current_step = None
+                continue
+
+            if isinstance(statement, ast.Break) and self.loops:
+                self.loops[-1][1].extend(predecessors)
+                predecessors = []
+                current_step = None
+                continue
+
+            if isinstance(statement, ast.Continue) and self.loops:
+                self._connect(predecessors, self.loops[-1][0])
+                predecessors = []
+                current_step = None
+                continue
+
+            # Plain statement: extend the current step block or start a new one
+            if current_step is not None and predecessors == [(current_step, None)]:
+                node = self.nodes[int(current_step[1:])]
+                if not node['text'].endswith("..."):
+                    node['text'] = _shorten(node['text'] + "; " + self._text(statement))
+                continue
+
+            current_step = self._add_node(STEP, self._text(statement), statement.lineno)
+            self._connect(predecessors, current_step)
+            predecessors = [(current_step, None)]
+
+        return predecessors
+
+    def _build_compound(self, statement, predecessors):
+        if isinstance(statement, ast.If):
+            node_id = self._add_node(DECISION, self._header("if", statement.test), statement.lineno)
+            self._connect(predecessors, node_id)
+            exits = self._build_block(statement.body, [(node_id, 'yes')])
+            if statement.orelse:
+                exits = exits + self._build_block(statement.orelse, [(node_id, 'no')])
+            else:
+                exits = exits + [(node_id, 'no')]
+            return exits
+
+        if isinstance(statement, (ast.For, ast.AsyncFor, ast.While)):
+            if isinstance(statement, ast.While):
+                text = self._header("while", statement.test)
+                body_label, done_label = 'true', 'false'
+            else:
+                text = f"for {self._text(statement.target)} in {self._text(statement.iter)}"
+                body_label, done_label = 'each', 'done'
+            node_id = self._add_node(LOOP, text, statement.lineno)
+            self._connect(predecessors, node_id)
+
+            self.loops.append((node_id, []))
+            body_exits = self._build_block(statement.body, [(node_id, body_label)])
+            _, break_exits = self.loops.pop()
+            self._connect(body_exits, node_id)
+
+            exits = [(node_id, done_label)]
+            if statement.orelse:
+                exits = self._build_block(statement.orelse, exits)
+            return exits + break_exits
+
+        if isinstance(statement, _TRY_TYPES):
+            node_id = self._add_node(TRY, "try", statement.lineno)
+            self._connect(predecessors, node_id)
+            exits = self._build_block(statement.body, [(node_id, None)])
+            if statement.orelse:
+                exits = self._build_block(statement.orelse, exits)
+
+            for handler in statement.handlers:
+                handler_text = self._header("except", handler.type)
+                handler_id = self._add_node(HANDLER, handler_text, handler.lineno)
+                self.edges.append((node_id, handler_id, 'error'))
+                exits = exits + self._build_block(handler.body, [(handler_id, None)])
+
+            if statement.finalbody:
+                exits = self._build_block(statement.finalbody, exits)
+            return exits
+
+        if isinstance(statement, (ast.With, ast.AsyncWith)):
+            items = ", ".join(self._text(item.context_expr) for item in statement.items)
+            node_id = self._add_node(STEP, f"with {items}", statement.lineno)
+            self._connect(predecessors, node_id)
+            return self._build_block(statement.body, [(node_id, None)])
+
+        if _MATCH_TYPE is not None and isinstance(statement, _MATCH_TYPE):
+            node_id = self._add_node(DECISION, self._header("match", statement.subject), statement.lineno)
+            self._connect(predecessors, node_id)
+            exits = []
+            for case in statement.cases:
+                label = _shorten(self._text(case.pattern))
+                exits = exits + self._build_block(case.body, [(node_id, label)])
+            last = statement.cases[-1] if statement.cases else None
+            if last is None or last.guard is not None or not _is_irrefutable(last.pattern):
+                # No case may match, in which case execution continues after the match
+                exits.append((node_id, 'no match'))
+            return exits
+
+        # Nested function/class definitions are a single step in the outer flow
+        node_id = self._add_node(STEP, f"define {getattr(statement, 'name', '')}", statement.lineno)
+        self._connect(predecessors, node_id)
+        return [(node_id, None)]
+
+
+_TRY_TYPES = (ast.Try,) + ((ast.TryStar,) if hasattr(ast, 'TryStar') else ())
+_MATCH_TYPE = getattr(ast, 'Match', None)
+
+
+def _is_irrefutable(pattern):
+    """True for patterns that match any subject: `_`, a bare capture, or an or-pattern containing one."""
+    if isinstance(pattern, ast.MatchAs):
+        return pattern.pattern is None or _is_irrefutable(pattern.pattern)
+    if isinstance(pattern, ast.MatchOr):
+        return any(_is_irrefutable(alternative) for alternative in pattern.patterns)
+    return False
+
+
+def _is_compound(statement):
+    """Check whether a statement opens a nested block."""
+    compound = (ast.If, ast.For, ast.AsyncFor, ast.While, ast.With, ast.AsyncWith,
+                ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef) + _TRY_TYPES
+    if _MATCH_TYPE is not None:
+        compound = compound + (_MATCH_TYPE,)
+    return isinstance(statement, compound)
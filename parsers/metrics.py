@@ -0,0 +1,200 @@
+import ast
+import textwrap
+from collections import Counter
+
+import numpy as np
+
+from parsers.python_parser import count_code_lines, node_metrics
+
+# Rough characters per token for code, as in llm_engine.estimator
+CHARS_PER_TOKEN = 3.5
+# Integer columns of a MetricsTable; 'tokens' is the estimated prompt size of the source
+COLUMNS = ('loc', 'complexity', 'nesting', 'fan_in', 'fan_out', 'chars', 'tokens')
+
+
+def _definition_node(source):
+    """The first definition in a function's source, or None if it does not parse."""
+    try:
+        tree = ast.parse(textwrap.dedent(source))
+    except SyntaxError:
+        return None
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            return node
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Lambda):
+            return node.value
+    return tree
+
+
+def source_metrics(source):
+    """node_metrics() row for one function's source, parsed on its own."""
+    lines = count_code_lines(source)
+    node = _definition_node(source)
+    if node is None:
+        return lines, 1, 0, ()
+    return node_metrics(node, lines)
+
+
+def function_metrics(func):
+    """Line count, cyclomatic complexity, fan-out (distinct callees) and nesting depth of a function.
+
+    Parses the function's source; use MetricsTable.metrics() when a table for
+    the project is at hand.
+    """
+    lines, complexity, nesting, calls = source_metrics(func['source'])
+    return {'lines': lines, 'complexity': complexity, 'fan_out': len(calls), 'nesting': nesting}
+
+
+def _function_chars(func):
+    if hasattr(func, 'start_offset'):
+        return func.end_offset - func.start_offset
+    return len(func['source'])
+
+
+class MetricsTable:
+    """Per-function metrics for a whole project, stored column-wise in NumPy arrays.
+
+    Row i describes functions[i]; every column in COLUMNS is an int array of
+    the same length, so sorting, filtering and top-N queries over 100k
+    functions are single vectorized operations. Rows come from the parser's
+    single pass over each file (see parallel_parser.parse_files) and only fall
+    back to re-parsing a function's source when that is not available.
+    """
+
+    def __init__(self, functions, rows):
+        self.functions = list(functions)
+        self.keys = [(func['file'], func['qualname'], func['start_line']) for func in self.functions]
+        self._positions = {key: position for position, key in enumerate(self.keys)}
+        self.files = np.array([key[0] for key in self.keys], dtype=str)
+        self.qualnames = np.array([key[1] for key in self.keys], dtype=str)
+        self.calls = [row[3] for row in rows]
+        count = len(self.functions)
+
+        self.loc = np.fromiter((row[0] for row in rows), dtype=np.int32, count=count)
+        self.complexity = np.fromiter((row[1] for row in rows), dtype=np.int32, count=count)
+        self.nesting = np.fromiter((row[2] for row in rows), dtype=np.int32, count=count)
+        self.fan_out = np.fromiter((len(calls) for calls in self.calls), dtype=np.int32, count=count)
+        self.chars = np.fromiter((_function_chars(func) for func in self.functions), dtype=np.int64, count=count)
+        self.tokens = np.ceil(self.chars / CHARS_PER_TOKEN).astype(np.int64)
+
+        # Fan-in: how many functions call this one's name directly (`name()`)
+        callers = Counter(call for calls in self.calls for call in calls if not call.startswith('.'))
+        self.fan_in = np.fromiter((callers[func['name']] for func in self.functions), dtype=np.int32, count=count)
+
+    @classmethod
+    def from_parsed(cls, parsed_files):
+        """Table for parse_files() results, reusing the metrics computed while parsing."""
+        functions = []
+        rows = []
+        for parsed in parsed_files.values():
+            functions.extend(parsed['functions'])
+            rows.extend(parsed.get('metrics') or [source_metrics(func['source']) for func in parsed['functions']])
+        return cls(functions, rows)
+
+    @classmethod
+    def from_functions(cls, functions, stored=None):
+        """Table for functions outside a parse_files() result (e.g. loaded from the project index).
+
+        `stored` maps (file, qualname, start_line) to metrics rows computed
+        earlier, such as ProjectIndex.function_metrics(); only functions
+        without a stored row are parsed again.
+        """
+        functions = list(functions)
+        stored = stored or {}
+        rows = [
+            stored.get((func['file'], func['qualname'], func['start_line'])) or source_metrics(func['source'])
+            for func in functions
+        ]
+        return cls(functions, rows)
+
+    def __len__(self):
+        return len(self.functions)
+
+    def column(self, name):
+        if name not in COLUMNS:
+            raise ValueError(f"Unknown metric: {name}")
+        return getattr(self, name)
+
+    def position(self, func):
+        """Row of `func` (matched by file, qualname and start line), or None."""
+        return self._positions.get((func['file'], func['qualname'], func['start_line']))
+
+    def metrics(self, func):
+        """Metrics of one function in the shape of function_metrics(), for the model router."""
+        position = self.position(func)
+        if position is None:
+            return function_metrics(func)
+        return {
+            'lines': int(self.loc[position]),
+            'complexity': int(self.complexity[position]),
+            'fan_out': int(self.fan_out[position]),
+            'nesting': int(self.nesting[position])
+        }
+
+    def positions(self, functions):
+        """Row positions of `functions`; functions not in the table are skipped."""
+        found = (self.position(func) for func in functions)
+        return np.fromiter((position for position in found if position is not None), dtype=np.int64)
+
+    def match(self, files=None, text=""):
+        """Boolean mask of rows in `files` (all if empty) whose qualname contains `text` (case-insensitive)."""
+        mask = np.isin(self.files, list(files)) if files else np.ones(len(self), dtype=bool)
+        if text:
+            mask &= np.char.find(np.char.lower(self.qualnames), text.lower()) >= 0
+        return mask
+
+    def query(self, **bounds):
+        """Boolean mask of rows within bounds such as complexity=(10, None) or tokens=(None, 2000).
+
+        Each bound is (minimum, maximum), both inclusive; None leaves a side open.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for name, (low, high) in bounds.items():
+            values = self.column(name)
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+        return mask
+
+    def order(self, column, descending=True, mask=None):
+        """Row positions sorted by `column`, optionally only those selected by `mask`."""
+        positions = np.flatnonzero(mask) if mask is not None else np.arange(len(self))
+        values = self.column(column)[positions]
+        ordered = np.argsort(-values if descending else values, kind='stable')
+        return positions[ordered]
+
+    def top(self, column, n=10, mask=None):
+        """Positions of the `n` rows with the largest `column` values, largest first."""
+        positions = np.flatnonzero(mask) if mask is not None else np.arange(len(self))
+        values = self.column(column)[positions]
+        if n < len(positions):
+            chosen = np.argpartition(-values, n)[:n]
+            positions, values = positions[chosen], values[chosen]
+        return positions[np.argsort(-values, kind='stable')]
+
+    def records(self, positions=None):
+        """Rows as dicts (file, function, kind and every column), for display."""
+        positions = range(len(self)) if positions is None else positions
+        columns = {name: self.column(name) for name in COLUMNS}
+        records = []
+        for position in positions:
+            func = self.functions[position]
+            record = {'file': func['file'], 'function': func['qualname'], 'kind': func['kind']}
+            record.update((name, int(values[position])) for name, values in columns.items())
+            records.append(record)
+        return records
+
+    def interlinks(self):
+        """(caller, caller_file, callee, callee_file) for direct calls across files.
+
+        Uses the calls recorded while parsing instead of walking the ASTs again.
+        """
+        name_to_file = {func['name']: func['file'] for func in self.functions}
+        interlinks = []
+        for func, calls in zip(self.functions, self.calls):
+            for call in calls:
+                callee_file = name_to_file.get(call)
+                if callee_file is not None and callee_file != func['file']:
+                    interlinks.append((func['qualname'], func['file'], call, callee_file))
+        return interlinks
@@ -0,0 +1,281 @@
+import ast
+import atexit
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from parsers.entities import ClassInfo, FunctionInfo, ModuleInfo
+from parsers.python_parser import definitions_with_metrics, parse_segment, top_level_segments
+
+# Below these sizes starting worker processes costs more than it saves
+MIN_PARALLEL_BYTES = 512 * 1024
+MIN_PARALLEL_FILES = 8
+# Aim for a few chunks per worker so slow files don't leave cores idle
+CHUNKS_PER_WORKER = 4
+# Source kept alive by a ParseCache before the least recently used files are dropped
+PARSE_CACHE_BYTES = 256 * 1024 * 1024
+# Files with syntax errors at least this large have their segments parsed on the pool
+MIN_PARALLEL_RECOVERY_BYTES = 256 * 1024
+
+_pool = None
+_pool_workers = None
+# The pool is shared by every session of a server; creating, replacing and
+# shutting it down must not interleave
+_pool_lock = threading.Lock()
+
+
+def _get_pool(max_workers):
+    """Reuse one process pool for the lifetime of the process."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != max_workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=max_workers)
+            _pool_workers = max_workers
+        return _pool
+
+
+@atexit.register
+def _shutdown_pool():
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+
+
+def _discard_pool(pool):
+    """Shut down and forget `pool` after it failed, unless it was already replaced.
+
+    Another session may have created a new pool in the meantime; that one is
+    left alone.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+            _pool_workers = None
+    pool.shutdown(wait=False)
+
+
+def _spans(entities):
+    return [entity.to_span() for entity in entities]
+
+
+def _shift_spans(spans, line_delta, offset_delta):
+    return [
+        (name, start_line + line_delta, end_line + line_delta, start_offset + offset_delta, end_offset + offset_delta) + tuple(extras)
+        for name, start_line, end_line, start_offset, end_offset, *extras in spans
+    ]
+
+
+def _parse_segments(segments, include_classes):
+    """Parse (text, first_line, start_offset) segments of one file.
+
+    Returns (function_spans, class_spans, syntax_errors, metrics) with spans
+    shifted to positions in the whole file, so only small tuples leave a
+    worker process.
+    """
+    function_spans, class_spans, syntax_errors, metrics = [], [], [], []
+    for text, first_line, start_offset in segments:
+        tree, error = parse_segment(text, first_line)
+        if error:
+            syntax_errors.append(error)
+            continue
+        functions, classes, function_metrics = definitions_with_metrics(tree, ModuleInfo(text))
+        function_spans.extend(_shift_spans(_spans(functions), first_line - 1, start_offset))
+        metrics.extend(function_metrics)
+        if include_classes:
+            class_spans.extend(_shift_spans(_spans(classes), first_line - 1, start_offset))
+    return function_spans, class_spans, syntax_errors, metrics
+
+
+def recover_source(code_string, include_classes=True, max_workers=1):
+    """Span tuples of every top-level definition that parses in a file with syntax errors.
+
+    Segments (see python_parser.top_level_segments) are parsed independently,
+    on the process pool when the file is large and `max_workers` allows it.
+    Returns (function_spans, class_spans, syntax_errors, metrics).
+    """
+    module = ModuleInfo(code_string)
+    segments = []
+    for start_line, end_line in top_level_segments(module):
+        start_offset, end_offset = module.line_span_to_offsets(start_line, end_line)
+        segments.append((module.read(start_offset, end_offset), start_line, start_offset))
+
+    if max_workers > 1 and len(code_string) >= MIN_PARALLEL_RECOVERY_BYTES and len(segments) > 1:
+        chunks = _make_chunks([(index, segment[0]) for index, segment in enumerate(segments)], max_workers * CHUNKS_PER_WORKER)
+        # Keep source order within each chunk so results merge back in order
+        chunks = [[segments[index] for index, _ in sorted(chunk)] for chunk in chunks]
+        pool = None
+        try:
+            pool = _get_pool(max_workers)
+            results = list(pool.map(_parse_segments, chunks, [include_classes] * len(chunks)))
+        except Exception as e:
+            print(f"Parallel recovery failed, falling back to in-process parsing: {e}")
+            if pool is not None:
+                _discard_pool(pool)
+            results = [_parse_segments(segments, include_classes)]
+    else:
+        results = [_parse_segments(segments, include_classes)]
+
+    functions = sorted(
+        (pair for result in results for pair in zip(result[0], result[3])),
+        key=lambda pair: (pair[0][3], -pair[0][4])
+    )
+    class_spans = sorted((span for result in results for span in result[1]), key=lambda span: (span[3], -span[4]))
+    syntax_errors = sorted((error for result in results for error in result[2]), key=lambda error: error['start_line'])
+    return [span for span, _ in functions], class_spans, syntax_errors, [row for _, row in functions]
+
+
+def parse_source(code_string, include_classes=True, recover=True, max_workers=1):
+    """Parse one file into compact, picklable span tuples.
+
+    Returns (function_spans, class_spans, syntax_errors, metrics) where each
+    span is the entity's to_span() tuple and metrics holds one
+    python_parser.node_metrics() row per function. The file is parsed once for
+    functions, classes and metrics. With `recover`, a file with syntax errors is
+    parsed segment by segment (see recover_source) and the skipped regions are
+    reported.
+    """
+    if not code_string or not code_string.strip():
+        return [], [], [], []
+
+    try:
+        tree = ast.parse(code_string)
+    except SyntaxError as e:
+        print(f"Syntax error in code: {e}")
+        if not recover:
+            return [], [], [{'start_line': 1, 'end_line': code_string.count("\n") + 1, 'line': e.lineno, 'error': e.msg}], []
+        return recover_source(code_string, include_classes, max_workers)
+
+    functions, classes, metrics = definitions_with_metrics(tree, ModuleInfo(code_string))
+    return _spans(functions), (_spans(classes) if include_classes else []), [], metrics
+
+
+def _parse_chunk(chunk, include_classes, max_workers=1):
+    """Worker entry point: parse a list of (filename, code_string) pairs."""
+    return [
+        (filename,) + parse_source(code_string, include_classes, max_workers=max_workers)
+        for filename, code_string in chunk
+    ]
+
+
+def _make_chunks(files, chunk_count):
+    """Split files into chunks of roughly equal total size (largest files first)."""
+    chunks = [[] for _ in range(chunk_count)]
+    sizes = [0] * chunk_count
+    for filename, code_string in sorted(files, key=lambda item: len(item[1]), reverse=True):
+        smallest = sizes.index(min(sizes))
+        chunks[smallest].append((filename, code_string))
+        sizes[smallest] += len(code_string)
+    return [chunk for chunk in chunks if chunk]
+
+
+class ParseCache:
+    """Thread-safe LRU cache of parse results keyed by file name and content hash.
+
+    Meant to be shared by every session of a server, so the same upload is
+    only parsed once. Cached entities are shared between callers and must be
+    treated as read-only.
+    """
+
+    def __init__(self, max_bytes=PARSE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(filename, code_string, include_classes):
+        digest = hashlib.sha256(code_string.encode("utf-8", "surrogatepass")).hexdigest()
+        return (filename, digest, include_classes)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, parsed, size):
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+            self._entries[key] = (parsed, size)
+            self._size += size
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                self._size -= self._entries.popitem(last=False)[1][1]
+
+    def stats(self):
+        with self._lock:
+            return {'files': len(self._entries), 'bytes': self._size, 'hits': self.hits, 'misses': self.misses}
+
+
+def parse_files(files, max_workers=None, include_classes=True, cache=None):
+    """Extract functions and classes from many files, in parallel when worthwhile.
+
+    `files` is a list of (filename, code_string) pairs. Returns a dict
+    {filename: {'functions': [FunctionInfo], 'classes': [ClassInfo], 'syntax_errors': [...], 'metrics': [...]}}
+    in input order; files with syntax errors keep every definition outside the
+    regions listed in 'syntax_errors' (see recover_source), and 'metrics' has
+    one node_metrics() row per function (see metrics.MetricsTable). Workers only send back span tuples; entities are rebuilt here
+    against the code strings the caller already holds. With a ParseCache,
+    files parsed before (by any caller sharing the cache) are not parsed again.
+    """
+    files = list(files)
+    if cache is not None:
+        keys = {filename: cache.make_key(filename, code_string, include_classes) for filename, code_string in files}
+        cached = {filename: cache.get(key) for filename, key in keys.items()}
+        missing = [(filename, code_string) for filename, code_string in files if cached[filename] is None]
+        parsed = parse_files(missing, max_workers, include_classes) if missing else {}
+        for filename, code_string in missing:
+            cache.set(keys[filename], parsed[filename], len(code_string))
+        return {filename: cached[filename] or parsed[filename] for filename, _ in files}
+
+    max_workers = max_workers or os.cpu_count() or 1
+    total_size = sum(len(code_string) for _, code_string in files)
+
+    use_pool = (
+        max_workers > 1
+        and len(files) >= MIN_PARALLEL_FILES
+        and total_size >= MIN_PARALLEL_BYTES
+    )
+
+    if use_pool:
+        chunks = _make_chunks(files, min(len(files), max_workers * CHUNKS_PER_WORKER))
+        pool = None
+        try:
+            pool = _get_pool(max_workers)
+            parsed = []
+            for chunk_result in pool.map(_parse_chunk, chunks, [include_classes] * len(chunks)):
+                parsed.extend(chunk_result)
+        except Exception as e:
+            # A broken pool (e.g. no fork support) should not stop the analysis
+            print(f"Parallel parsing failed, falling back to in-process parsing: {e}")
+            if pool is not None:
+                _discard_pool(pool)
+            parsed = _parse_chunk(files, include_classes)
+    else:
+        # Only broken files use the pool here, to parse their segments in parallel
+        parsed = _parse_chunk(files, include_classes, max_workers)
+
+    spans_by_file = {filename: spans for filename, *spans in parsed}
+
+    results = {}
+    for filename, code_string in files:
+        function_spans, class_spans, syntax_errors, metrics = spans_by_file.get(filename, ([], [], [], []))
+        module = ModuleInfo(code_string, filename)
+        results[filename] = {
+            'functions': [FunctionInfo.from_span(name, module, *span) for name, *span in function_spans],
+            'classes': [ClassInfo.from_span(name, module, *span) for name, *span in class_spans],
+            'syntax_errors': syntax_errors,
+            'metrics': metrics
+        }
+    return results
@@ -0,0 +1,473 @@
+import hashlib
+import json
+import os
+import sqlite3
+import textwrap
+import threading
+import time
+from collections.abc import Mapping
+
+from parsers.entities import FunctionInfo, strip_line_end
+from parsers.parallel_parser import parse_files
+from parsers.python_parser import get_function_calls
+from parsers.source_decoding import decode_source
+
+DEFAULT_INDEX_DIR = ".bare_index"
+# Bump when the schema changes; older indexes are rebuilt from scratch
+SCHEMA_VERSION = 3
+# Files read and parsed together while indexing a directory
+INDEX_BATCH_SIZE = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    content_hash TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entities (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    qualname TEXT NOT NULL,
+    parent TEXT,
+    function_kind TEXT,
+    is_async INTEGER NOT NULL DEFAULT 0,
+    decorators TEXT NOT NULL DEFAULT '[]',
+    start_line INTEGER NOT NULL,
+    end_line INTEGER NOT NULL,
+    start_offset INTEGER NOT NULL,
+    end_offset INTEGER NOT NULL,
+    loc INTEGER,
+    complexity INTEGER,
+    nesting INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_entities_file ON entities(file_id);
+CREATE INDEX IF NOT EXISTS idx_entities_name ON entities(name);
+CREATE TABLE IF NOT EXISTS calls (
+    caller_id INTEGER NOT NULL REFERENCES entities(id) ON DELETE CASCADE,
+    callee_name TEXT NOT NULL,
+    is_attribute INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_calls_caller ON calls(caller_id);
+CREATE INDEX IF NOT EXISTS idx_calls_callee ON calls(callee_name);
+CREATE TABLE IF NOT EXISTS outputs (
+    entity_key TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    model TEXT NOT NULL,
+    output TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (entity_key, kind, model)
+);
+"""
+
+
+def _content_hash(code_string):
+    return hashlib.sha256(code_string.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def default_index_path(root):
+    """Location of the index for a project root inside the local index directory."""
+    root = os.path.abspath(root)
+    name = os.path.basename(root.rstrip(os.sep)) or "project"
+    digest = hashlib.sha1(root.encode("utf-8")).hexdigest()[:10]
+    return os.path.join(DEFAULT_INDEX_DIR, f"{name}-{digest}.sqlite")
+
+
+class IndexedModule:
+    """Stand-in for ModuleInfo whose text stays on disk in the project index.
+
+    Entities built on it slice their source with a SQL substr() call, so only
+    the requested span is ever loaded into memory.
+    """
+
+    __slots__ = ('file_id', 'path', 'index')
+
+    def __init__(self, file_id, path, index):
+        self.file_id = file_id
+        self.path = path
+        self.index = index
+
+    def read(self, start_offset, end_offset):
+        return self.index.read_span(self.file_id, start_offset, end_offset)
+
+    def slice(self, start_offset, end_offset):
+        return strip_line_end(self.read(start_offset, end_offset))
+
+    def __repr__(self):
+        return f"IndexedModule(file_id={self.file_id}, path={self.path!r})"
+
+
+class _FileContentMap(Mapping):
+    """Read-only {path: content} mapping that loads each file on access."""
+
+    def __init__(self, index):
+        self._index = index
+        self._paths = index.file_paths()
+
+    def __getitem__(self, path):
+        content = self._index.read_file(path)
+        if content is None:
+            raise KeyError(path)
+        return content
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __len__(self):
+        return len(self._paths)
+
+
+class ProjectIndex:
+    """SQLite-backed index of a project's files, code spans, call edges and LLM outputs.
+
+    Files whose content hash has not changed are not parsed again, so reopening
+    an indexed repository is close to instant. Sources are read back by span.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA foreign_keys=ON")
+        version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            # The index is a cache of the source tree, so it is safe to rebuild
+            self._connection.executescript(
+                "DROP TABLE IF EXISTS calls; DROP TABLE IF EXISTS entities; DROP TABLE IF EXISTS files;"
+            )
+            self._connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._connection.executescript(SCHEMA)
+        self._connection.commit()
+        self._modules = {}
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    # Indexing
+
+    def is_unchanged(self, path, code_string):
+        """Check whether a file is already indexed with the same content."""
+        with self._lock:
+            row = self._connection.execute("SELECT content_hash FROM files WHERE path = ?", (path,)).fetchone()
+        return row is not None and row[0] == _content_hash(code_string)
+
+    def add_file(self, path, code_string, commit=True, parsed=None):
+        """Index one file. Returns True if it was (re)parsed, False if unchanged.
+
+        `parsed` may hold this file's entry from parallel_parser.parse_files()
+        when the caller already parsed it.
+        """
+        content_hash = _content_hash(code_string)
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT id, content_hash FROM files WHERE path = ?", (path,)
+            ).fetchone()
+            if row is not None and row[1] == content_hash:
+                return False
+
+            if parsed is None:
+                parsed = parse_files([(path, code_string)], max_workers=1)[path]
+
+            if row is not None:
+                # Entities, calls and spans cascade with the file row
+                self._connection.execute("DELETE FROM files WHERE id = ?", (row[0],))
+                self._modules.pop(row[0], None)
+
+            cursor = self._connection.execute(
+                "INSERT INTO files (path, content_hash, size, content, indexed_at) VALUES (?, ?, ?, ?, ?)",
+                (path, content_hash, len(code_string), code_string, time.time())
+            )
+            file_id = cursor.lastrowid
+
+            metrics = parsed.get('metrics') or [None] * len(parsed['functions'])
+            for function, function_metrics in zip(parsed['functions'], metrics):
+                loc, complexity, nesting, calls = function_metrics or (None, None, None, None)
+                cursor = self._connection.execute(
+                    "INSERT INTO entities (file_id, kind, name, qualname, parent, function_kind, is_async, decorators, "
+                    "start_line, end_line, start_offset, end_offset, loc, complexity, nesting) "
+                    "VALUES (?, 'function', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (file_id, function.name, function.qualname, function.parent, function.kind,
+                     int(function.is_async), json.dumps(list(function.decorators)),
+                     function.start_line, function.end_line, function.start_offset, function.end_offset,
+                     loc, complexity, nesting)
+                )
+                entity_id = cursor.lastrowid
+                if calls is not None:
+                    # Calls were collected in the parser's pass over the file; one row per
+                    # distinct call, so function_metrics() can restore them exactly
+                    rows = [(entity_id, call.lstrip('.'), int(call.startswith('.'))) for call in calls]
+                else:
+                    # Methods and nested functions are indented; dedent so they parse on their own
+                    source = textwrap.dedent(function.source)
+                    direct_calls = set(get_function_calls(source, include_attributes=False))
+                    rows = [(entity_id, callee, 0 if callee in direct_calls else 1) for callee in get_function_calls(source)]
+                self._connection.executemany(
+                    "INSERT INTO calls (caller_id, callee_name, is_attribute) VALUES (?, ?, ?)", rows
+                )
+
+            for cls in parsed['classes']:
+                self._connection.execute(
+                    "INSERT INTO entities (file_id, kind, name, qualname, parent, decorators, "
+                    "start_line, end_line, start_offset, end_offset) "
+                    "VALUES (?, 'class', ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (file_id, cls.name, cls.qualname, cls.parent, json.dumps(list(cls.decorators)),
+                     cls.start_line, cls.end_line, cls.start_offset, cls.end_offset)
+                )
+
+            if commit:
+                self._connection.commit()
+        return True
+
+    def index_directory(self, root, extensions=('.py',), progress_callback=None, max_workers=None):
+        """Index every matching file under a directory.
+
+        Files are read in batches; changed files in a batch are parsed on a
+        process pool, so memory stays bounded by the batch size.
+
+        Returns a dict with counts of 'indexed', 'unchanged', 'removed' and 'failed'
+        files, files per decoding method in 'decoded' (see source_decoding), the files
+        whose encoding was guessed or had bytes replaced in 'decode_problems', the
+        regions skipped because of syntax errors in 'syntax_errors', and the
+        'errors' that were encountered.
+        """
+        result = {'indexed': 0, 'unchanged': 0, 'removed': 0, 'failed': 0, 'decoded': {}, 'decode_problems': [],
+                  'syntax_errors': [], 'errors': []}
+        seen = set()
+
+        paths = []
+        for directory, subdirectories, filenames in os.walk(root):
+            # Skip hidden directories such as .git and virtual environments
+            subdirectories[:] = [d for d in subdirectories if not d.startswith('.') and d not in ('venv', '__pycache__')]
+            for filename in filenames:
+                if filename.endswith(tuple(extensions)):
+                    paths.append(os.path.join(directory, filename))
+        paths.sort()
+
+        for batch_start in range(0, len(paths), INDEX_BATCH_SIZE):
+            changed = []
+            for full_path in paths[batch_start:batch_start + INDEX_BATCH_SIZE]:
+                relative_path = os.path.relpath(full_path, root).replace(os.sep, '/')
+                seen.add(relative_path)
+                try:
+                    with open(full_path, "rb") as f:
+                        code_string, encoding, method = decode_source(f.read())
+                except Exception as e:
+                    result['failed'] += 1
+                    result['errors'].append(f"{relative_path}: {e}")
+                    continue
+                result['decoded'][method] = result['decoded'].get(method, 0) + 1
+                if method in ('fallback', 'replaced'):
+                    result['decode_problems'].append(f"{relative_path}: decoded as {encoding} ({method})")
+                if self.is_unchanged(relative_path, code_string):
+                    result['unchanged'] += 1
+                else:
+                    changed.append((relative_path, code_string))
+
+            parsed_files = parse_files(changed, max_workers=max_workers)
+            for relative_path, code_string in changed:
+                try:
+                    self.add_file(relative_path, code_string, commit=False, parsed=parsed_files[relative_path])
+                    result['indexed'] += 1
+                    result['syntax_errors'].extend(
+                        dict(error, file=relative_path) for error in parsed_files[relative_path]['syntax_errors']
+                    )
+                except Exception as e:
+                    result['failed'] += 1
+                    result['errors'].append(f"{relative_path}: {e}")
+
+            with self._lock:
+                self._connection.commit()
+            if progress_callback:
+                progress_callback(min(batch_start + INDEX_BATCH_SIZE, len(paths)), len(paths))
+
+        # Drop files that no longer exist in the directory
+        for path in self.file_paths():
+            if path not in seen:
+                self.remove_file(path, commit=False)
+                result['removed'] += 1
+
+        with self._lock:
+            self._connection.commit()
+        return result
+
+    def remove_file(self, path, commit=True):
+        with self._lock:
+            self._connection.execute("DELETE FROM files WHERE path = ?", (path,))
+            if commit:
+                self._connection.commit()
+
+    # Reading
+
+    def file_paths(self):
+        with self._lock:
+            return [row[0] for row in self._connection.execute("SELECT path FROM files ORDER BY path")]
+
+    def read_file(self, path):
+        with self._lock:
+            row = self._connection.execute("SELECT content FROM files WHERE path = ?", (path,)).fetchone()
+        return row[0] if row else None
+
+    def read_span(self, file_id, start_offset, end_offset):
+        """Read part of a file's content without loading the rest of it."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT substr(content, ?, ?) FROM files WHERE id = ?",
+                (start_offset + 1, end_offset - start_offset, file_id)
+            ).fetchone()
+        return row[0] if row else ""
+
+    def file_contents(self):
+        """Lazy {path: content} mapping over all indexed files."""
+        return _FileContentMap(self)
+
+    def _module(self, file_id, path):
+        module = self._modules.get(file_id)
+        if module is None:
+            module = IndexedModule(file_id, path, self)
+            self._modules[file_id] = module
+        return module
+
+    def count_functions(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM entities WHERE kind = 'function'").fetchone()[0]
+
+    def iter_functions(self, path=None, batch_size=500):
+        """Yield FunctionInfo entities page by page; their source is read lazily."""
+        query = (
+            "SELECT e.id, e.name, e.start_line, e.end_line, e.start_offset, e.end_offset, "
+            "e.qualname, e.parent, e.decorators, e.function_kind, e.is_async, f.id, f.path "
+            "FROM entities e JOIN files f ON f.id = e.file_id "
+            "WHERE e.kind = 'function' AND e.id > ?"
+        )
+        params = []
+        if path is not None:
+            query += " AND f.path = ?"
+            params.append(path)
+        query += " ORDER BY e.id LIMIT ?"
+
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._connection.execute(query, [last_id] + params + [batch_size]).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                (entity_id, name, start_line, end_line, start_offset, end_offset,
+                 qualname, parent, decorators, function_kind, is_async, file_id, file_path) = row
+                module = self._module(file_id, file_path)
+                yield FunctionInfo.from_span(
+                    name, module, start_line, end_line, start_offset, end_offset,
+                    qualname, parent, json.loads(decorators), function_kind, bool(is_async)
+                )
+            last_id = rows[-1][0]
+
+    def file_function_map(self):
+        """Group all indexed functions by file path (sources stay on disk)."""
+        functions_by_file = {path: [] for path in self.file_paths()}
+        for function in self.iter_functions():
+            functions_by_file.setdefault(function.file, []).append(function)
+        return functions_by_file
+
+    def function_metrics(self):
+        """{(path, qualname, start_line): node_metrics() row} stored while indexing.
+
+        Rows come from the parser's pass over each file, so a MetricsTable of
+        the index does not have to parse any function again (see
+        metrics.MetricsTable.from_functions).
+        """
+        query = (
+            "SELECT f.path, e.qualname, e.start_line, e.loc, e.complexity, e.nesting, "
+            "(SELECT group_concat(CASE WHEN c.is_attribute THEN '.' || c.callee_name ELSE c.callee_name END, char(10)) "
+            " FROM calls c WHERE c.caller_id = e.id) "
+            "FROM entities e JOIN files f ON f.id = e.file_id "
+            "WHERE e.kind = 'function' AND e.loc IS NOT NULL"
+        )
+        with self._lock:
+            rows = self._connection.execute(query).fetchall()
+        return {
+            (path, qualname, start_line): (loc, complexity, nesting, tuple(sorted(calls.split("\n"))) if calls else ())
+            for path, qualname, start_line, loc, complexity, nesting, calls in rows
+        }
+
+    def state(self):
+        """(files, time of the latest indexing): changes whenever a file is added, re-indexed or removed."""
+        with self._lock:
+            return tuple(self._connection.execute("SELECT COUNT(*), MAX(indexed_at) FROM files").fetchone())
+
+    def find_interlinks(self):
+        """Return (caller, caller_file, callee, callee_file) tuples for direct calls across files."""
+        query = (
+            "SELECT DISTINCT caller.qualname, caller_file.path, callee.name, callee_file.path "
+            "FROM calls c "
+            "JOIN entities caller ON caller.id = c.caller_id "
+            "JOIN files caller_file ON caller_file.id = caller.file_id "
+            "JOIN entities callee ON callee.name = c.callee_name AND callee.kind = 'function' "
+            "JOIN files callee_file ON callee_file.id = callee.file_id "
+            "WHERE c.is_attribute = 0 AND callee_file.id != caller_file.id "
+            "ORDER BY caller_file.path, caller.start_line"
+        )
+        with self._lock:
+            return self._connection.execute(query).fetchall()
+
+    # LLM outputs
+
+    def store_output(self, entity_key, kind, model, output):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO outputs (entity_key, kind, model, output, created) VALUES (?, ?, ?, ?, ?)",
+                (entity_key, kind, model, output, time.time())
+            )
+            self._connection.commit()
+
+    def get_output(self, entity_key, kind, model):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT output FROM outputs WHERE entity_key = ? AND kind = ? AND model = ?",
+                (entity_key, kind, model)
+            ).fetchone()
+        return row[0] if row else None
+
+    def iter_outputs(self, kind=None):
+        """Yield (entity_key, kind, model, output) rows one at a time."""
+        query = "SELECT entity_key, kind, model, output FROM outputs"
+        params = ()
+        if kind is not None:
+            query += " WHERE kind = ?"
+            params = (kind,)
+        query += " ORDER BY created"
+        with self._lock:
+            cursor = self._connection.execute(query, params)
+            rows = cursor.fetchmany(100)
+        # Fetch in pages so large outputs are not all held in memory at once
+        while rows:
+            for row in rows:
+                yield row
+            with self._lock:
+                rows = cursor.fetchmany(100)
+
+    def stats(self):
+        with self._lock:
+            files, size = self._connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files").fetchone()
+            functions = self._connection.execute("SELECT COUNT(*) FROM entities WHERE kind = 'function'").fetchone()[0]
+            classes = self._connection.execute("SELECT COUNT(*) FROM entities WHERE kind = 'class'").fetchone()[0]
+            calls = self._connection.execute("SELECT COUNT(*) FROM calls").fetchone()[0]
+            outputs = self._connection.execute("SELECT COUNT(*) FROM outputs").fetchone()[0]
+        return {
+            'files': files,
+            'characters': size,
+            'functions': functions,
+            'classes': classes,
+            'call_edges': calls,
+            'llm_outputs': outputs
+        }
@@ -1,18 +1,152 @@
 import ast
+import io
+import re
+import tokenize
 
+from parsers.entities import ClassInfo, FunctionInfo, ModuleInfo
 
-def parse_python_code(code_string):
-    """Parse Python code and extract summary information."""
+# How nested functions are turned into units for the LLM (see partition_functions)
+MODE_ALL = 'all'
+MODE_OUTERMOST = 'outermost'
+MODE_PARTITIONED = 'partitioned'
+EXTRACTION_MODES = (MODE_ALL, MODE_OUTERMOST, MODE_PARTITIONED)
+
+# Nodes that add one path through a function (McCabe)
+DECISION_NODES = (
+    ast.If, ast.IfExp, ast.For, ast.AsyncFor, ast.While, ast.ExceptHandler, ast.Assert,
+) + ((ast.match_case,) if hasattr(ast, 'match_case') else ())
+# Statements that open a nested block, for nesting depth
+BLOCK_NODES = (
+    ast.If, ast.For, ast.AsyncFor, ast.While, ast.Try, ast.With, ast.AsyncWith,
+) + ((ast.Match,) if hasattr(ast, 'Match') else ()) + ((ast.TryStar,) if hasattr(ast, 'TryStar') else ())
+# Nested definitions are separate units with their own metrics
+_NESTED_SCOPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+# Top-level lines that start a definition, for files the tokenizer gives up on
+_DEFINITION_LINE = re.compile(r"(?:async[ \t]+def|def|class)\b|@")
+
+
+def _top_level_starts(module):
+    """(line, first token) of every logical line that starts in column 0."""
+    starts = []
+    at_line_start = True
+    scanned_to = 0
     try:
-        tree = ast.parse(code_string)
+        for token in tokenize.generate_tokens(io.StringIO(module.text).readline):
+            if token.type == tokenize.NEWLINE:
+                at_line_start = True
+            elif token.type in (tokenize.NL, tokenize.COMMENT, tokenize.INDENT, tokenize.DEDENT, tokenize.ENDMARKER):
+                continue
+            elif at_line_start:
+                at_line_start = False
+                scanned_to = token.start[0]
+                if token.start[1] == 0:
+                    starts.append((token.start[0], token.string))
+    except (tokenize.TokenError, SyntaxError):
+        # Unterminated strings or brackets, bad dedents: scan the rest line by line
+        for line_number in range(scanned_to + 1, module.line_count + 1):
+            line = module.slice(*module.line_span_to_offsets(line_number, line_number))
+            if line and not line[0].isspace() and not line.startswith('#'):
+                match = _DEFINITION_LINE.match(line)
+                starts.append((line_number, match.group(0).split()[0] if match else line.split()[0]))
+    return starts
+
+
+def top_level_segments(module):
+    """Split a module into independently parseable (start_line, end_line) spans.
+
+    Every top-level def or class (with its decorators) is its own segment, and
+    the top-level statements between definitions are grouped into one. Logical
+    lines come from the tokenizer, so multi-line strings and bracketed code are
+    never split.
+    """
+    boundaries = []
+    previous = None
+    in_definition = False
+    for line, first_token in _top_level_starts(module):
+        is_definition = first_token in ('def', 'class', 'async', '@')
+        if previous == '@':
+            pass  # the decorated definition continues the decorator's segment
+        elif is_definition or in_definition:
+            boundaries.append(line)
+        in_definition = is_definition
+        previous = first_token
+
+    if not boundaries or boundaries[0] != 1:
+        boundaries.insert(0, 1)
+    ends = [start - 1 for start in boundaries[1:]] + [module.line_count]
+    return [(start, end) for start, end in zip(boundaries, ends) if end >= start]
+
+
+def parse_segment(text, first_line):
+    """Parse one segment; returns (tree, None) or (None, syntax error record) with absolute lines."""
+    try:
+        return ast.parse(text), None
+    except SyntaxError as e:
+        line_count = text.count("\n") + (0 if text.endswith("\n") else 1)
+        return None, {
+            'start_line': first_line,
+            'end_line': first_line + max(line_count, 1) - 1,
+            'line': first_line + (e.lineno or 1) - 1,
+            'error': e.msg if hasattr(e, 'msg') else str(e)
+        }
+
+
+def recover_tree(module):
+    """Parse everything that parses in a module with syntax errors.
+
+    The file is split with top_level_segments(); each segment is parsed on its
+    own and the good ones are combined into one tree with the original line
+    numbers. Returns (tree, syntax_errors) where every syntax error record
+    has the 'start_line'/'end_line' of the skipped region, the 'line' of the
+    error and the 'error' message.
+    """
+    body = []
+    syntax_errors = []
+    for start_line, end_line in top_level_segments(module):
+        tree, error = parse_segment(module.read(*module.line_span_to_offsets(start_line, end_line)), start_line)
+        if error:
+            syntax_errors.append(error)
+            continue
+        ast.increment_lineno(tree, start_line - 1)
+        body.extend(tree.body)
+    return ast.Module(body=body, type_ignores=[]), syntax_errors
+
+
+def _parse_module(code_string, filename, recover):
+    """Parse a whole file, falling back to recover_tree() on a syntax error.
+
+    Returns (tree, module, syntax_errors); tree is None if the file could not
+    be parsed and `recover` is off.
+    """
+    module = ModuleInfo(code_string, filename)
+    try:
+        return ast.parse(code_string), module, []
     except SyntaxError as e:
         print(f"Syntax error in code: {e}")
+        if not recover:
+            return None, module, [{'start_line': 1, 'end_line': module.line_count, 'line': e.lineno, 'error': e.msg}]
+    tree, syntax_errors = recover_tree(module)
+    return tree, module, syntax_errors
+
+
+def parse_python_code(code_string, filename=None, recover=True):
+    """Parse Python code and extract summary information.
+
+    Functions and classes are returned as FunctionInfo/ClassInfo entities that
+    share one ModuleInfo buffer and behave like the dicts used previously.
+    With `recover`, a file with syntax errors still yields every top-level
+    definition that parses; the skipped regions are listed in 'syntax_errors'.
+    """
+    tree, module, syntax_errors = _parse_module(code_string, filename, recover)
+    if tree is None:
         return {
             'functions': [],
             'classes': [],
             'imports': [],
             'variables': [],
-            'error': str(e)
+            'syntax_errors': syntax_errors,
+            'error': syntax_errors[0]['error']
         }
     
     summary = {
@@ -21,62 +155,21 @@ def parse_python_code(code_string):
         'imports': [],
         'variables': []
     }
+    if syntax_errors:
+        summary['syntax_errors'] = syntax_errors
+        summary['error'] = "; ".join(
+            f"lines {error['start_line']}-{error['end_line']}: {error['error']}" for error in syntax_errors
+        )
+
+    line_count = module.line_count
 
     # Add parent links for better analysis
     add_parent_links(tree)
     
+    summary['functions'], summary['classes'] = definitions_from_tree(tree, module)
+    
     for node in ast.walk(tree):
-        if isinstance(node, ast.FunctionDef):
-            try:
-                start_line = node.lineno - 1
-                # More robust end line detection
-                if hasattr(node, 'end_lineno') and node.end_lineno:
-                    end_line = node.end_lineno
-                else:
-                    # Fallback: estimate end line by looking at the next node
-                    end_line = start_line + 20  # Default fallback
-                
-                lines = code_string.splitlines()
-                if start_line < len(lines):
-                    if end_line > len(lines):
-                        end_line = len(lines)
-                    func_source = "\n".join(lines[start_line:end_line])
-                    
-                    summary['functions'].append({
-                        'name': node.name,
-                        'source': func_source,
-                        'start_line': start_line + 1,
-                        'end_line': end_line
-                    })
-            except Exception as e:
-                print(f"Error processing function {node.name}: {e}")
-                continue
-                
-        elif isinstance(node, ast.ClassDef):
-            try:
-                start_line = node.lineno - 1
-                if hasattr(node, 'end_lineno') and node.end_lineno:
-                    end_line = node.end_lineno
-                else:
-                    end_line = start_line + 30  # Default fallback for classes
-                
-                lines = code_string.splitlines()
-                if start_line < len(lines):
-                    if end_line > len(lines):
-                        end_line = len(lines)
-                    class_source = "\n".join(lines[start_line:end_line])
-                    
-                    summary['classes'].append({
-                        'name': node.name,
-                        'source': class_source,
-                        'start_line': start_line + 1,
-                        'end_line': end_line
-                    })
-            except Exception as e:
-                print(f"Error processing class {node.name}: {e}")
-                continue
-                
-        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
             try:
                 start_line = node.lineno - 1
                 if hasattr(node, 'end_lineno') and node.end_lineno:
@@ -84,11 +177,10 @@ def parse_python_code(code_string):
                 else:
                     end_line = start_line + 1
                 
-                lines = code_string.splitlines()
-                if start_line < len(lines):
-                    if end_line > len(lines):
-                        end_line = len(lines)
-                    import_source = "\n".join(lines[start_line:end_line])
+                if start_line < line_count:
+                    if end_line > line_count:
+                        end_line = line_count
+                    import_source = module.slice(*module.line_span_to_offsets(start_line + 1, end_line))
                     summary['imports'].append(import_source.strip())
             except Exception as e:
                 print(f"Error processing import: {e}")
@@ -131,124 +223,347 @@ def is_top_level_node(node):
     return True
 
 
-def extract_functions(code_string):
-    """Extract only functions from Python code."""
+def extract_functions(code_string, filename=None, mode=MODE_ALL, recover=True):
+    """Extract only functions from Python code as FunctionInfo entities.
+
+    `mode` controls nested functions, see partition_functions(). With
+    `recover`, functions outside the regions with syntax errors are still found.
+    """
     if not code_string or not code_string.strip():
         return []
     
-    try:
-        tree = ast.parse(code_string)
-    except SyntaxError as e:
-        print(f"Syntax error in code: {e}")
+    tree, module, _ = _parse_module(code_string, filename, recover)
+    if tree is None:
         return []
     
-    functions = []
-    lines = code_string.splitlines()
-    
-    for node in ast.walk(tree):
-        if isinstance(node, ast.FunctionDef):
-            try:
-                start_line = node.lineno - 1
-                
-                # Better end line detection
-                if hasattr(node, 'end_lineno') and node.end_lineno:
-                    end_line = node.end_lineno
-                else:
-                    # Fallback: find the end by looking for the next function/class or end of file
-                    end_line = len(lines)
-                    
-                    # Look for next top-level definition
-                    for next_node in ast.walk(tree):
-                        if (isinstance(next_node, (ast.FunctionDef, ast.ClassDef)) and 
-                            next_node != node and 
-                            next_node.lineno > node.lineno):
-                            end_line = min(end_line, next_node.lineno - 1)
-                
-                # Ensure we don't go beyond the file
-                if start_line < len(lines):
-                    if end_line > len(lines):
-                        end_line = len(lines)
-                    
-                    func_source = "\n".join(lines[start_line:end_line])
-                    
-                    # Basic validation - ensure we captured the function properly
-                    if func_source.strip().startswith(('def ', 'async def ')):
-                        functions.append({
-                            'name': node.name,
-                            'source': func_source,
-                            'start_line': start_line + 1,
-                            'end_line': end_line
-                        })
-                    else:
-                        # Fallback: just get a reasonable chunk
-                        fallback_end = min(start_line + 50, len(lines))
-                        func_source = "\n".join(lines[start_line:fallback_end])
-                        functions.append({
-                            'name': node.name,
-                            'source': func_source,
-                            'start_line': start_line + 1,
-                            'end_line': fallback_end
-                        })
-                        
-            except Exception as e:
-                print(f"Error extracting function {getattr(node, 'name', 'unknown')}: {e}")
-                continue
+    return partition_functions(functions_from_tree(tree, module), mode)
 
-    return functions
 
+def functions_from_tree(tree, module):
+    """Build FunctionInfo entities for every function in an already parsed tree."""
+    return definitions_from_tree(tree, module)[0]
 
-def extract_classes(code_string):
-    """Extract only classes from Python code."""
+
+def extract_classes(code_string, filename=None, recover=True):
+    """Extract only classes from Python code as ClassInfo entities (see extract_functions for `recover`)."""
     if not code_string or not code_string.strip():
         return []
     
-    try:
-        tree = ast.parse(code_string)
-    except SyntaxError as e:
-        print(f"Syntax error in code: {e}")
+    tree, module, _ = _parse_module(code_string, filename, recover)
+    if tree is None:
         return []
     
-    classes = []
-    lines = code_string.splitlines()
-    
-    for node in ast.walk(tree):
-        if isinstance(node, ast.ClassDef):
+    return classes_from_tree(tree, module)
+
+
+def classes_from_tree(tree, module):
+    """Build ClassInfo entities for every class in an already parsed tree."""
+    return definitions_from_tree(tree, module)[1]
+
+
+def definitions_from_tree(tree, module):
+    """Collect functions and classes from a parsed tree in one linear pass.
+
+    Handles sync and async functions, methods and nested functions (with
+    qualified names such as `Class.method` or `outer.inner`), decorators
+    (included in the span) and lambdas assigned to a name. Results are in
+    source order. Returns (functions, classes).
+    """
+    collector = _DefinitionCollector(module)
+    collector.visit_body(tree.body, scope=(), scope_kind=None, parent_end=module.line_count)
+    return collector.functions, collector.classes
+
+
+def definitions_with_metrics(tree, module):
+    """Like definitions_from_tree(), plus one node_metrics() row per function.
+
+    Returns (functions, classes, metrics) where metrics[i] belongs to functions[i].
+    """
+    collector = _DefinitionCollector(module, with_metrics=True)
+    collector.visit_body(tree.body, scope=(), scope_kind=None, parent_end=module.line_count)
+    return collector.functions, collector.classes, collector.metrics
+
+
+def count_code_lines(text):
+    """Lines that hold code (not blank, not comment-only)."""
+    count = 0
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith('#'):
+            count += 1
+    return count
+
+
+def _metric_children(node):
+    """Child nodes that belong to the same unit: nested definitions and named lambdas are skipped."""
+    for child in ast.iter_child_nodes(node):
+        if isinstance(child, _NESTED_SCOPES):
+            continue
+        if isinstance(child, ast.Lambda) and isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            if len(targets) == 1 and isinstance(targets[0], ast.Name):
+                # Extracted as its own unit by _DefinitionCollector._add_lambda
+                continue
+        yield child
+
+
+def node_metrics(node, code_lines=0):
+    """Metrics of one function node in a single walk over its subtree.
+
+    Returns (code_lines, cyclomatic complexity, nesting depth, calls) where
+    calls is a sorted tuple of the distinct called names, with method calls
+    (`obj.save()`) prefixed by a dot, e.g. ('.save', 'helper'). Nested
+    functions, classes and named lambdas (`f = lambda ...`) are not looked
+    into: they are extracted and measured on their own. Inline lambdas count
+    towards the function they appear in.
+    """
+    complexity = 1
+    max_depth = 0
+    calls = set()
+    # (node, block depth); the function's own body starts at depth 0
+    stack = [(child, 0) for child in _metric_children(node)]
+    while stack:
+        current, depth = stack.pop()
+        if isinstance(current, DECISION_NODES):
+            complexity += 1
+        elif isinstance(current, ast.BoolOp):
+            complexity += len(current.values) - 1
+        elif isinstance(current, ast.comprehension):
+            complexity += 1 + len(current.ifs)
+        elif isinstance(current, ast.Call):
+            if isinstance(current.func, ast.Name):
+                calls.add(current.func.id)
+            elif isinstance(current.func, ast.Attribute):
+                calls.add("." + current.func.attr)
+        if isinstance(current, BLOCK_NODES):
+            depth += 1
+            max_depth = max(max_depth, depth)
+        stack.extend((child, depth) for child in _metric_children(current))
+    return code_lines, complexity, max_depth, tuple(sorted(calls))
+
+
+def _definition_start(node):
+    """First line of a definition, including its decorators."""
+    decorators = getattr(node, 'decorator_list', None)
+    if decorators:
+        return min(node.lineno, min(decorator.lineno for decorator in decorators))
+    return node.lineno
+
+
+def _child_bodies(node):
+    """Statement lists nested in a compound statement (if/for/while/try/with/match)."""
+    for field in ('body', 'orelse', 'finalbody'):
+        statements = getattr(node, field, None)
+        if isinstance(statements, list) and statements and isinstance(statements[0], ast.stmt):
+            yield statements
+    for handler in getattr(node, 'handlers', None) or []:
+        yield handler.body
+    for case in getattr(node, 'cases', None) or []:
+        yield case.body
+
+
+class _DefinitionCollector:
+    """Walks statement lists once, tracking the enclosing scope of each definition."""
+
+    def __init__(self, module, with_metrics=False):
+        self.module = module
+        self.line_count = module.line_count
+        self.functions = []
+        self.classes = []
+        self.with_metrics = with_metrics
+        self.metrics = []
+
+    def _append_function(self, function, node):
+        if self.with_metrics:
+            self.metrics.append(node_metrics(node, count_code_lines(function.source)))
+        self.functions.append(function)
+
+    def _trim_blank_lines(self, start_line, end_line):
+        """Drop trailing blank and comment-only lines from an estimated span."""
+        while end_line > start_line:
+            line = self.module.slice(*self.module.line_span_to_offsets(end_line, end_line)).strip()
+            if line and not line.startswith('#'):
+                break
+            end_line -= 1
+        return end_line
+
+    def _decorator_names(self, node):
+        names = []
+        for decorator in getattr(node, 'decorator_list', None) or []:
+            # Sliced from the decorator's own lines; ast.get_source_segment would split the whole file each time
+            text = None
+            if getattr(decorator, 'end_lineno', None) is not None:
+                text = self.module.segment(
+                    decorator.lineno, decorator.col_offset, decorator.end_lineno, decorator.end_col_offset
+                )
+            names.append(text if text else type(decorator).__name__)
+        return names
+
+    def visit_body(self, statements, scope, scope_kind, parent_end):
+        for position, node in enumerate(statements):
+            # Without end_lineno a statement ends where its next sibling starts,
+            # which keeps span computation linear in the size of the tree
+            end_line = getattr(node, 'end_lineno', None)
+            if not end_line:
+                if position + 1 < len(statements):
+                    end_line = _definition_start(statements[position + 1]) - 1
+                else:
+                    end_line = parent_end
+                end_line = self._trim_blank_lines(node.lineno, min(end_line, self.line_count))
+            end_line = min(end_line, self.line_count)
+
             try:
-                start_line = node.lineno - 1
-                
-                if hasattr(node, 'end_lineno') and node.end_lineno:
-                    end_line = node.end_lineno
+                if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    self._add_function(node, scope, scope_kind, end_line)
+                    self.visit_body(node.body, scope + (node.name,), 'function', end_line)
+                elif isinstance(node, ast.ClassDef):
+                    self._add_class(node, scope, end_line)
+                    self.visit_body(node.body, scope + (node.name,), 'class', end_line)
+                elif isinstance(node, (ast.Assign, ast.AnnAssign)) and isinstance(node.value, ast.Lambda):
+                    self._add_lambda(node, scope, scope_kind, end_line)
                 else:
-                    # Fallback for classes
-                    end_line = len(lines)
-                    for next_node in ast.walk(tree):
-                        if (isinstance(next_node, (ast.FunctionDef, ast.ClassDef)) and 
-                            next_node != node and 
-                            next_node.lineno > node.lineno):
-                            end_line = min(end_line, next_node.lineno - 1)
-                
-                if start_line < len(lines):
-                    if end_line > len(lines):
-                        end_line = len(lines)
-                    
-                    class_source = "\n".join(lines[start_line:end_line])
-                    
-                    classes.append({
-                        'name': node.name,
-                        'source': class_source,
-                        'start_line': start_line + 1,
-                        'end_line': end_line
-                    })
-                    
+                    for body in _child_bodies(node):
+                        self.visit_body(body, scope, scope_kind, end_line)
             except Exception as e:
-                print(f"Error extracting class {getattr(node, 'name', 'unknown')}: {e}")
+                print(f"Error extracting definition {getattr(node, 'name', 'unknown')}: {e}")
                 continue
 
-    return classes
+    def _function_kind(self, scope_kind):
+        if scope_kind == 'class':
+            return 'method'
+        if scope_kind == 'function':
+            return 'nested'
+        return 'function'
+
+    def _add_function(self, node, scope, scope_kind, end_line):
+        start_line = _definition_start(node)
+        if start_line > self.line_count:
+            return
+
+        qualname = ".".join(scope + (node.name,))
+        attributes = {
+            'qualname': qualname,
+            'parent': ".".join(scope) or None,
+            'decorators': self._decorator_names(node),
+            'kind': self._function_kind(scope_kind),
+            'is_async': isinstance(node, ast.AsyncFunctionDef)
+        }
+        function = FunctionInfo(node.name, self.module, start_line, end_line, **attributes)
+
+        # Basic validation - ensure we captured the function properly
+        if not function.source.strip().startswith(('def ', 'async def ', '@')):
+            # Fallback: just get a reasonable chunk
+            fallback_end = min(start_line + 50, self.line_count)
+            function = FunctionInfo(node.name, self.module, start_line, fallback_end, **attributes)
+        self._append_function(function, node)
+
+    def _add_class(self, node, scope, end_line):
+        start_line = _definition_start(node)
+        if start_line > self.line_count:
+            return
+        self.classes.append(ClassInfo(
+            node.name, self.module, start_line, end_line,
+            qualname=".".join(scope + (node.name,)),
+            parent=".".join(scope) or None,
+            decorators=self._decorator_names(node)
+        ))
+
+    def _add_lambda(self, node, scope, scope_kind, end_line):
+        targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+        if len(targets) != 1 or not isinstance(targets[0], ast.Name):
+            return
+        name = targets[0].id
+        self._append_function(FunctionInfo(
+            name, self.module, node.lineno, end_line,
+            qualname=".".join(scope + (name,)),
+            parent=".".join(scope) or None,
+            kind='lambda' if scope_kind != 'class' else 'method'
+        ), node.value)
+
+
+def _nested_stub(function, indent):
+    """One-line placeholder for a nested definition inside its enclosing function.
+
+    The stub is valid Python, so the enclosing unit still parses for triage,
+    metrics and the flow graph.
+    """
+    keyword = "async def" if function.is_async else "def"
+    return f"{indent}{keyword} {function.name}(*args, **kwargs): ...  # nested, analyzed separately as {function.qualname}"
+
+
+def _indentation(function):
+    line = function.module.read(function.start_offset, function.end_offset).split("\n", 1)[0]
+    return line[:len(line) - len(line.lstrip())]
+
+
+def partition_functions(functions, mode=MODE_PARTITIONED):
+    """Turn extracted functions into LLM units without overlapping source.
+
+    - 'all': every function as extracted; nested code appears in its own unit
+      and again inside its enclosing function.
+    - 'outermost': only functions that are not inside another function; nested
+      helpers are analyzed as part of their enclosing function.
+    - 'partitioned': every function, but each nested definition is replaced by
+      a one-line stub in its enclosing function's source, so every line of
+      code is sent exactly once.
+
+    Lambdas defined inside a function always stay part of that function in the
+    'outermost' and 'partitioned' modes. Works on any FunctionInfo list,
+    including entities loaded from the project index.
+    """
+    if mode == MODE_ALL:
+        return list(functions)
+    if mode not in EXTRACTION_MODES:
+        raise ValueError(f"Unknown extraction mode: {mode}")
+
+    # Group by shared module buffer so containment is checked within one file
+    by_module = {}
+    for function in functions:
+        by_module.setdefault(function.module, []).append(function)
+
+    units = []
+    for module_functions in by_module.values():
+        ordered = sorted(module_functions, key=lambda f: (f.start_offset, -f.end_offset))
+        # Stack of enclosing functions; each entry is [function, direct children]
+        stack = []
+        enclosed = {}
+        kept = []
+        for function in ordered:
+            while stack and function.start_offset >= stack[-1][0].end_offset:
+                stack.pop()
+            if stack:
+                if function.kind == 'lambda':
+                    continue
+                if mode == MODE_OUTERMOST:
+                    continue
+                stack[-1][1].append(function)
+            kept.append(function)
+            if function.kind != 'lambda':
+                entry = [function, []]
+                enclosed[id(function)] = entry[1]
+                stack.append(entry)
+
+        for function in kept:
+            children = enclosed.get(id(function))
+            if mode == MODE_PARTITIONED and children:
+                unit = FunctionInfo.from_span(function.name, function.module, *function.to_span()[1:])
+                unit.excluded = tuple(
+                    (child.start_offset, child.end_offset, _nested_stub(child, _indentation(child)))
+                    for child in children
+                )
+                units.append(unit)
+            else:
+                units.append(function)
+
+    return units
+
 
+def get_function_calls(code_string, include_attributes=True):
+    """Extract function calls from Python code.
 
-def get_function_calls(code_string):
-    """Extract function calls from Python code."""
+    With include_attributes=False only direct calls by name (`helper()`) are
+    returned and method calls such as `obj.helper()` are skipped.
+    """
     try:
         tree = ast.parse(code_string)
     except SyntaxError:
@@ -259,7 +574,7 @@ def get_function_calls(code_string):
         if isinstance(node, ast.Call):
             if isinstance(node.func, ast.Name):
                 calls.append(node.func.id)
-            elif isinstance(node.func, ast.Attribute):
+            elif include_attributes and isinstance(node.func, ast.Attribute):
                 calls.append(node.func.attr)
     
     return list(set(calls))  # Remove duplicates
\ No newline at end of file
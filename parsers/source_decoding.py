@@ -0,0 +1,90 @@
+import codecs
+import io
+import re
+import time
+import tokenize
+
+# Bytes that cp1252 leaves undefined; files containing them are read as latin-1
+CP1252_UNDEFINED = frozenset(b"\x81\x8d\x8f\x90\x9d")
+# PEP 263 coding cookie, as matched by the tokenizer
+COOKIE_RE = re.compile(rb"^[ \t\f]*#.*?coding[:=][ \t]*[-\w.]+")
+
+
+def _fallback_encoding(data):
+    """Legacy 8-bit encoding for undeclared non-UTF-8 source, picked without trial decoding."""
+    return 'latin-1' if CP1252_UNDEFINED.intersection(data) else 'cp1252'
+
+
+def decode_source(data):
+    """Decode Python source bytes honouring BOMs and PEP 263 coding cookies.
+
+    Returns (text, encoding, method) where method is 'ascii' (fast path),
+    'bom', 'declared', 'utf-8', 'fallback' (undeclared cp1252/latin-1) or
+    'replaced' (undecodable bytes replaced). Every file is decoded at most
+    twice: once as declared (or UTF-8), once with the fallback encoding.
+    """
+    if data.isascii():
+        # Pure ASCII decodes the same under every encoding Python source may declare
+        return data.decode('ascii'), 'ascii', 'ascii'
+
+    head = io.BytesIO(data[:4096])
+    lines = [line for line in (head.readline(), head.readline()) if line]
+    declared = data.startswith(codecs.BOM_UTF8) or any(COOKIE_RE.match(line) for line in lines)
+    encoding = 'utf-8'
+    try:
+        encoding, _ = tokenize.detect_encoding(iter(lines + [b""]).__next__)
+        text = data.decode(encoding)
+    except (SyntaxError, UnicodeDecodeError):
+        if declared:
+            # A wrong or unknown cookie is kept visible rather than guessed around
+            return data.decode(encoding, 'replace'), encoding, 'replaced'
+        # Undeclared and not UTF-8: legacy 8-bit source
+        encoding = _fallback_encoding(data)
+        return data.decode(encoding), encoding, 'fallback'
+    if encoding == 'utf-8-sig':
+        return text, encoding, 'bom'
+    return text, encoding, 'declared' if declared else 'utf-8'
+
+
+class DecodeStats:
+    """Per-file record of how uploaded sources were decoded."""
+
+    def __init__(self):
+        self.files = []
+
+    def decode(self, name, source):
+        """Decode one file from bytes or a binary stream (e.g. a ZipFile member) and record it.
+
+        Returns the text, or None if the file could not be read.
+        """
+        started = time.perf_counter()
+        try:
+            data = source if isinstance(source, bytes) else source.read()
+            text, encoding, method = decode_source(data)
+        except Exception as e:
+            self.files.append({'file': name, 'bytes': 0, 'encoding': None, 'method': 'failed',
+                               'seconds': time.perf_counter() - started, 'error': str(e)})
+            return None
+        self.files.append({'file': name, 'bytes': len(data), 'encoding': encoding, 'method': method,
+                           'seconds': time.perf_counter() - started, 'error': None})
+        return text
+
+    def summary(self):
+        """File counts per decoding method and encoding, plus totals."""
+        methods = {}
+        encodings = {}
+        for record in self.files:
+            methods[record['method']] = methods.get(record['method'], 0) + 1
+            if record['encoding']:
+                encodings[record['encoding']] = encodings.get(record['encoding'], 0) + 1
+        return {
+            'files': len(self.files),
+            'bytes': sum(record['bytes'] for record in self.files),
+            'seconds': sum(record['seconds'] for record in self.files),
+            'methods': methods,
+            'encodings': encodings
+        }
+
+    def problems(self):
+        """Files that needed a guessed encoding, had bytes replaced or could not be read."""
+        return [record for record in self.files if record['method'] in ('fallback', 'replaced', 'failed')]
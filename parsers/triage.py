@@ -0,0 +1,170 @@
+import ast
+import textwrap
+
+TRIVIAL = 'trivial'
+ROUTINE = 'routine'
+CRITICAL = 'business-critical'
+CATEGORIES = (TRIVIAL, ROUTINE, CRITICAL)
+
+# Calls that read or write files, databases, networks or the console:
+# built-ins called by name (`open(...)`)
+IO_FUNCTIONS = frozenset({'open', 'print', 'input', 'urlopen'})
+# methods whose name alone means I/O, whatever they are called on
+IO_METHODS = frozenset({
+    'read', 'readline', 'readlines', 'write', 'writelines', 'execute', 'executemany', 'commit',
+    'rollback', 'cursor', 'sendall', 'recv', 'urlopen', 'read_csv', 'to_csv', 'read_sql', 'to_sql',
+    'read_text', 'write_text', 'read_bytes', 'write_bytes', 'unlink', 'makedirs', 'mkdir', 'Popen',
+})
+# generic method names (`get`, `remove`, `run`, ...) that only mean I/O on one of IO_RECEIVERS,
+# so `requests.get` or `os.remove` count but `dict.get` or `list.remove` do not
+IO_RECEIVER_METHODS = frozenset({
+    'get', 'post', 'put', 'patch', 'delete', 'head', 'request', 'send', 'connect', 'query',
+    'load', 'dump', 'save', 'remove', 'rename', 'replace', 'rmtree', 'copy', 'move', 'system',
+    'run', 'call', 'check_call', 'check_output', 'fetch', 'fetchone', 'fetchall', 'upload', 'download',
+})
+IO_RECEIVERS = frozenset({
+    'requests', 'httpx', 'urllib', 'session', 'client', 'http', 'api', 'os', 'shutil', 'subprocess',
+    'json', 'pickle', 'yaml', 'csv', 'sqlite3', 'db', 'conn', 'connection', 'cursor', 'cur', 'engine',
+    'socket', 'sock', 'ftp', 'smtp', 's3', 'bucket', 'storage', 'redis', 'cache',
+})
+
+BRANCH_NODES = (
+    ast.If, ast.IfExp, ast.For, ast.AsyncFor, ast.While, ast.Try, ast.With, ast.AsyncWith,
+    ast.BoolOp, ast.comprehension, ast.ExceptHandler, ast.Assert,
+) + ((ast.Match, ast.match_case) if hasattr(ast, 'Match') else ()) + ((ast.TryStar,) if hasattr(ast, 'TryStar') else ())
+
+# A trivial function has at most this many statements and AST nodes and no branches or I/O
+TRIVIAL_MAX_STATEMENTS = 2
+TRIVIAL_MAX_NODES = 40
+# A function is business-critical from this many branches (or branches plus I/O) or nodes
+CRITICAL_MIN_BRANCHES = 4
+CRITICAL_MIN_NODES = 300
+
+
+def _function_node(tree):
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            return node
+    return None
+
+
+def _body_statements(node):
+    body = list(node.body)
+    if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) \
+            and isinstance(body[0].value.value, str):
+        body = body[1:]  # docstring
+    return body
+
+
+def _receiver_name(node):
+    """Name an attribute call is made on: `requests` for requests.get, `session` for self.session.get."""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return None
+
+
+def io_calls(tree):
+    """Sorted I/O calls in `tree`, as `name` or `receiver.method`."""
+    calls = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        if isinstance(node.func, ast.Name):
+            if node.func.id in IO_FUNCTIONS:
+                calls.add(node.func.id)
+        elif isinstance(node.func, ast.Attribute):
+            method = node.func.attr
+            receiver = _receiver_name(node.func.value)
+            if method in IO_METHODS:
+                calls.add(f"{receiver}.{method}" if receiver else method)
+            elif method in IO_RECEIVER_METHODS and receiver and receiver.lower().lstrip('_') in IO_RECEIVERS:
+                calls.add(f"{receiver}.{method}")
+    return sorted(calls)
+
+
+def triage_function(func):
+    """Classify a function as trivial, routine or business-critical from its AST alone.
+
+    Uses AST size, branch count and whether it calls I/O functions (see
+    io_calls). Returns a dict with 'category', 'reason' and the
+    metrics behind the decision.
+    """
+    source = textwrap.dedent(func['source'])
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return {'category': ROUTINE, 'reason': "could not be parsed", 'nodes': 0, 'branches': 0,
+                'statements': 0, 'io_calls': []}
+
+    node = _function_node(tree)
+    if node is None:
+        # Named lambdas and fragments: look at the whole snippet
+        statements = tree.body
+        scope = tree
+    else:
+        statements = _body_statements(node)
+        scope = node
+
+    nodes = sum(1 for _ in ast.walk(scope))
+    branches = sum(1 for child in ast.walk(scope) if isinstance(child, BRANCH_NODES))
+    found_io = io_calls(scope)
+
+    metrics = {'nodes': nodes, 'branches': branches, 'statements': len(statements), 'io_calls': found_io}
+
+    if nodes >= CRITICAL_MIN_NODES:
+        return dict(metrics, category=CRITICAL, reason=f"large function ({nodes} AST nodes)")
+    if branches >= CRITICAL_MIN_BRANCHES:
+        return dict(metrics, category=CRITICAL, reason=f"{branches} branches")
+    if branches and found_io:
+        return dict(metrics, category=CRITICAL, reason=f"branches with I/O ({', '.join(found_io)})")
+    if not branches and not found_io and len(statements) <= TRIVIAL_MAX_STATEMENTS and nodes <= TRIVIAL_MAX_NODES:
+        return dict(metrics, category=TRIVIAL, reason="no branches, no I/O, tiny body")
+    return dict(metrics, category=ROUTINE, reason="small logic" if branches else "straight-line code")
+
+
+def describe_trivial_function(func):
+    """One-sentence description of a trivial function, used instead of an LLM call."""
+    name = func.get('qualname', func['name'])
+    if func['name'] in ('__repr__', '__str__', '__format__'):
+        return "Provides the text representation of the object."
+
+    try:
+        tree = ast.parse(textwrap.dedent(func['source']))
+    except SyntaxError:
+        return "Simple helper without business logic."
+    node = _function_node(tree)
+    if node is None:
+        return "Short inline expression without business logic."
+    statements = _body_statements(node)
+
+    if not statements or all(isinstance(statement, ast.Pass) or (
+            isinstance(statement, ast.Expr) and isinstance(statement.value, ast.Constant)) for statement in statements):
+        return "Placeholder with no behaviour of its own."
+
+    last = statements[-1]
+    if isinstance(last, ast.Return) and last.value is not None:
+        value = last.value
+        if isinstance(value, ast.Attribute) and isinstance(value.value, ast.Name) and value.value.id in ('self', 'cls'):
+            return f"Returns the `{value.attr}` attribute of the object."
+        if isinstance(value, ast.Constant):
+            return f"Returns the fixed value `{value.value!r}`."
+        if isinstance(value, ast.Call):
+            callee = value.func.attr if isinstance(value.func, ast.Attribute) else getattr(value.func, 'id', None)
+            if callee:
+                return f"Delegates to `{callee}` and returns its result."
+        return "Computes and returns a simple expression."
+
+    targets = [
+        target.attr for statement in statements if isinstance(statement, (ast.Assign, ast.AnnAssign))
+        for target in (statement.targets if isinstance(statement, ast.Assign) else [statement.target])
+        if isinstance(target, ast.Attribute)
+    ]
+    if targets:
+        return f"Sets the {', '.join(f'`{target}`' for target in targets)} attribute{'s' if len(targets) > 1 else ''} of the object."
+    if isinstance(last, ast.Expr) and isinstance(last.value, ast.Call):
+        callee = last.value.func.attr if isinstance(last.value.func, ast.Attribute) else getattr(last.value.func, 'id', None)
+        if callee:
+            return f"Forwards the call to `{callee}`."
+    return f"Simple helper (`{name}`) without business logic."
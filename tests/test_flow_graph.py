@@ -0,0 +1,102 @@
+from parsers.flow_graph import build_flow_graph, to_mermaid
+
+
+def edges(code, function_name='f'):
+    """Edges of a function's flow graph as (source text, target text, label)."""
+    graph = build_flow_graph(code, function_name)
+    text = {node['id']: node['text'] for node in graph['nodes']}
+    return {(text[source], text[target], label) for source, target, label in graph['edges']}
+
+
+def test_if_else_branches_and_joins():
+    code = '''
+def f(x):
+    if x > 0:
+        y = 1
+    else:
+        y = 2
+    return y
+'''
+    assert edges(code) >= {
+        ('if x > 0', 'y = 1', 'yes'),
+        ('if x > 0', 'y = 2', 'no'),
+        ('y = 1', 'return y', None),
+        ('y = 2', 'return y', None),
+    }
+
+
+def test_if_without_else_falls_through_on_no():
+    code = '''
+def f(x):
+    if x:
+        log(x)
+    return x
+'''
+    assert ('if x', 'return x', 'no') in edges(code)
+
+
+def test_match_without_wildcard_can_fall_through():
+    code = '''
+def f(command):
+    match command:
+        case "start":
+            return run()
+        case "stop" if ready:
+            return halt()
+    return None
+'''
+    result = edges(code)
+    assert ('match command', 'return run()', '"start"') in result
+    assert ('match command', 'return halt()', '"stop"') in result
+    assert ('match command', 'return None', 'no match') in result
+
+
+def test_match_with_wildcard_has_no_fall_through():
+    code = '''
+def f(command):
+    match command:
+        case "start":
+            return run()
+        case "a" | _:
+            return skip()
+    cleanup()
+'''
+    result = edges(code)
+    assert not any(label == 'no match' for _, _, label in result)
+    assert not any('cleanup()' in (source, target) for source, target, _ in result)
+
+
+def test_try_handlers_and_finally():
+    code = '''
+def f(path):
+    try:
+        data = load(path)
+    except (IOError, ValueError):
+        data = None
+    finally:
+        close(path)
+    return data
+'''
+    assert edges(code) >= {
+        ('try', 'data = load(path)', None),
+        ('try', 'except (IOError, ValueError)', 'error'),
+        ('except (IOError, ValueError)', 'data = None', None),
+        ('data = load(path)', 'close(path)', None),
+        ('data = None', 'close(path)', None),
+        ('close(path)', 'return data', None),
+    }
+
+
+def test_node_text_is_the_first_line_of_non_ascii_code():
+    code = '''
+def f(prices):
+    for name, price in prices.items():  # € prices
+        print("Prix é", name,
+              price)
+'''
+    graph = build_flow_graph(code, 'f')
+
+    assert [node['text'] for node in graph['nodes'][2:4]] == [
+        'for name, price in prices.items()', 'print("Prix é", name,'
+    ]
+    assert '"Prix é", name,' in to_mermaid(graph).replace('#quot;', '"')
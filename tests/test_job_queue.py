@@ -0,0 +1,67 @@
+import time
+
+from llm_engine import job_queue
+from llm_engine.job_queue import DONE, QUEUED, RUNNING, JobQueue
+
+
+def make_queue(tmp_path, count=1):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    jobs = [{'kind': 'template', 'title': f"job {n}", 'payload': {'text': f"output {n}"}} for n in range(count)]
+    return queue, queue.submit_run(jobs, "model")
+
+
+def expire_leases(queue):
+    with queue._transaction() as connection:
+        connection.execute("UPDATE jobs SET lease_until = ? WHERE status = ?", (time.time() - 1, RUNNING))
+
+
+def test_job_with_an_expired_lease_is_claimed_again(tmp_path):
+    queue, run_id = make_queue(tmp_path)
+    first = queue.claim_next("worker-a")
+    assert queue.claim_next("worker-b") is None
+
+    expire_leases(queue)
+    assert queue.recover() == 1
+    second = queue.claim_next("worker-b")
+
+    assert second['id'] == first['id']
+    assert second['worker'] == "worker-b"
+    assert queue.run_status(run_id)[RUNNING] == 1
+
+
+def test_complete_from_a_worker_that_lost_the_job_is_ignored(tmp_path):
+    queue, run_id = make_queue(tmp_path)
+    stale = queue.claim_next("worker-a")
+    expire_leases(queue)
+    queue.recover()
+    current = queue.claim_next("worker-b")
+
+    assert queue.complete(current, "fresh result")
+    assert not queue.complete(stale, "stale result")
+    assert not queue.report_progress(stale, "still going")
+
+    assert [job['result'] for job in queue.run_results(run_id)] == ["fresh result"]
+
+
+def test_complete_after_requeue_leaves_the_job_queued(tmp_path):
+    queue, run_id = make_queue(tmp_path)
+    stale = queue.claim_next("worker-a")
+    expire_leases(queue)
+    queue.recover()
+
+    assert not queue.complete(stale, "Error: timed out")
+    assert queue.run_status(run_id)[QUEUED] == 1
+
+
+def test_heartbeat_renews_the_lease_while_a_job_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, 'HEARTBEAT_SECONDS', 0.01)
+    queue, run_id = make_queue(tmp_path)
+    job = queue.claim_next("worker-a")
+    expire_leases(queue)
+
+    with queue._heartbeat(job):
+        time.sleep(0.2)
+
+    assert queue.recover() == 0
+    assert queue.complete(job, "done")
+    assert queue.run_status(run_id)[DONE] == 1
@@ -0,0 +1,128 @@
+import numpy as np
+
+from parsers import metrics
+from parsers.metrics import MetricsTable, function_metrics
+from parsers.parallel_parser import parse_files
+from parsers.project_index import ProjectIndex
+
+ORDERS = '''
+def place_order(order, user):
+    if not order.items or order.total <= 0:
+        raise ValueError("empty order")
+    for item in order.items:
+        while item.pending:
+            item.reserve()
+    return charge(order)
+
+
+def charge(order):
+    return order.total
+
+
+class Store:
+    def checkout(self, order):
+        def audit(entry):
+            if entry:
+                log(entry)
+        return place_order(order, self.user)
+'''
+
+PAYMENTS = '''
+def refund(order):
+    return charge(order) * -1
+'''
+
+
+def make_table():
+    return MetricsTable.from_parsed(parse_files([('orders.py', ORDERS), ('payments.py', PAYMENTS)], max_workers=1))
+
+
+def row(table, qualname):
+    return table.records([table.qualnames.tolist().index(qualname)])[0]
+
+
+def test_metrics_from_the_parse_pass():
+    table = make_table()
+    place_order = row(table, 'place_order')
+
+    assert len(table) == 5
+    assert place_order['loc'] == 7
+    # 1 + if + `or` + for + while
+    assert place_order['complexity'] == 5
+    assert place_order['nesting'] == 2
+    assert place_order['fan_out'] == 3  # ValueError(), .reserve() and charge()
+    assert place_order['fan_in'] == 1   # Store.checkout
+    assert row(table, 'charge')['fan_in'] == 2
+    assert place_order['tokens'] == int(np.ceil(place_order['chars'] / 3.5))
+
+
+def test_nested_definitions_are_measured_separately():
+    table = make_table()
+
+    checkout = row(table, 'Store.checkout')
+    assert checkout['complexity'] == 1
+    assert checkout['fan_out'] == 1
+    assert row(table, 'Store.checkout.audit')['complexity'] == 2
+
+
+def test_table_matches_per_function_metrics():
+    table = make_table()
+
+    for func in table.functions:
+        assert table.metrics(func) == function_metrics(func)
+    rebuilt = MetricsTable.from_functions(table.functions)
+    for column in ('loc', 'complexity', 'nesting', 'fan_in', 'fan_out'):
+        assert np.array_equal(rebuilt.column(column), table.column(column))
+
+
+def test_index_stores_the_parser_metrics(tmp_path, monkeypatch):
+    index = ProjectIndex(str(tmp_path / "index.sqlite"))
+    for filename, code_string in (('orders.py', ORDERS), ('payments.py', PAYMENTS)):
+        index.add_file(filename, code_string)
+    functions = [func for file_functions in index.file_function_map().values() for func in file_functions]
+
+    def reparse(source):
+        raise AssertionError("indexed functions must not be parsed again")
+
+    monkeypatch.setattr(metrics, 'source_metrics', reparse)
+    indexed = MetricsTable.from_functions(functions, index.function_metrics())
+
+    parsed = make_table()
+    assert indexed.qualnames.tolist() == parsed.qualnames.tolist()
+    assert indexed.calls == parsed.calls
+    for column in ('loc', 'complexity', 'nesting', 'fan_in', 'fan_out'):
+        assert np.array_equal(indexed.column(column), parsed.column(column))
+
+
+def test_index_state_changes_with_files_not_outputs(tmp_path):
+    index = ProjectIndex(str(tmp_path / "index.sqlite"))
+    index.add_file('orders.py', ORDERS)
+    state = index.state()
+
+    index.store_output('orders.py::charge', 'brd', 'model', "text")
+    assert index.state() == state
+    index.add_file('orders.py', ORDERS.replace("order.total", "order.amount"))
+    assert index.state() != state
+
+
+def test_vectorized_queries():
+    table = make_table()
+    names = table.qualnames
+
+    assert names[table.query(complexity=(2, None))].tolist() == ['place_order', 'Store.checkout.audit']
+    assert names[table.match(['payments.py'])].tolist() == ['refund']
+    assert names[table.match(text="CHECK")].tolist() == ['Store.checkout', 'Store.checkout.audit']
+    assert names[table.top('complexity', 1)].tolist() == ['place_order']
+    assert names[table.order('loc', descending=False)][0] in ('charge', 'refund')
+
+
+def test_interlinks_cross_files_only():
+    assert make_table().interlinks() == [('refund', 'payments.py', 'charge', 'orders.py')]
+
+
+def test_empty_table():
+    table = MetricsTable([], [])
+
+    assert len(table) == 0
+    assert table.order('loc').tolist() == []
+    assert table.interlinks() == []
@@ -0,0 +1,53 @@
+from llm_engine.estimator import MODE_INDIVIDUAL, _plan_run, default_rates
+from llm_engine.model_router import DEFAULT_ROUTES, ModelRouter
+from parsers.metrics import MetricsTable
+from parsers.parallel_parser import parse_files
+
+SMALL = {'lines': 5, 'complexity': 2, 'fan_out': 1, 'nesting': 1}
+COMPLEX = {'lines': 200, 'complexity': 40, 'fan_out': 12, 'nesting': 5}
+
+CODE = '''
+def total(order):
+    return sum(item.price for item in order.items)
+'''
+
+
+def test_small_functions_need_metrics_to_match():
+    router = ModelRouter()
+
+    assert router.decide("mistral", 'brd', 800, SMALL)['rule'] == "small function"
+    assert router.decide("mistral", 'brd', 800, SMALL)['num_ctx'] == 4096
+    assert router.decide("mistral", 'brd', 800, COMPLEX)['rule'] == "default"
+    assert router.decide("mistral", 'brd', 800)['rule'] == "default"
+
+
+def test_fast_model_for_small_functions(monkeypatch):
+    monkeypatch.delenv("BARE_MODEL_ROUTES", raising=False)
+    monkeypatch.setenv("BARE_FAST_MODEL", "qwen2.5-coder:1.5b")
+    router = ModelRouter.from_config()
+
+    assert router.decide("mistral", 'brd', 800, SMALL)['model'] == "qwen2.5-coder:1.5b"
+    assert router.decide("mistral", 'brd', 800, COMPLEX)['model'] == "mistral"
+    assert router.decide("mistral", 'module summary', 800)['model'] == "mistral"
+    assert 'model' not in DEFAULT_ROUTES[0]
+
+
+def test_routing_can_be_turned_off():
+    assert ModelRouter.from_config("off") is None
+
+
+def test_estimates_route_small_functions_with_their_metrics():
+    parsed = parse_files([('orders.py', CODE)], max_workers=1)
+    functions = {filename: result['functions'] for filename, result in parsed.items()}
+    # Long answers: without the small-function cap the prompt plus output needs 8192
+    rates = default_rates("mistral")
+    rates = dict(rates, output_tokens=dict(rates['output_tokens'], brd=4000))
+    router = ModelRouter()
+
+    with_metrics = _plan_run(functions, len(CODE), MODE_INDIVIDUAL, rates, 2048, "mistral", router,
+                             MetricsTable.from_parsed(parsed))
+    without_metrics = _plan_run(functions, len(CODE), MODE_INDIVIDUAL, rates, 2048, "mistral", router)
+
+    # The first call is the full-project BRD, the second the function's own BRD
+    assert with_metrics.stages[0]['calls'][1]['num_ctx'] == 4096
+    assert without_metrics.stages[0]['calls'][1]['num_ctx'] == 8192
@@ -0,0 +1,85 @@
+import ast
+import textwrap
+import time
+
+from parsers.python_parser import MODE_OUTERMOST, extract_functions, partition_functions
+
+SHOP = '''
+class Shop:
+    @staticmethod
+    def price(x):
+        def tax(y):
+            return y * 2
+        return tax(x)
+
+async def main():
+    pass
+
+handler = lambda event: event
+'''
+
+
+def by_qualname(functions):
+    return {func['qualname']: func for func in functions}
+
+
+def test_qualnames_kinds_and_parents():
+    functions = by_qualname(extract_functions(SHOP))
+
+    assert set(functions) == {'Shop.price', 'Shop.price.tax', 'main', 'handler'}
+    assert functions['Shop.price']['kind'] == 'method'
+    assert functions['Shop.price']['parent'] == 'Shop'
+    assert functions['Shop.price.tax']['kind'] == 'nested'
+    assert functions['Shop.price.tax']['parent'] == 'Shop.price'
+    assert functions['main']['is_async']
+    assert functions['handler']['kind'] == 'lambda'
+
+
+def test_spans_include_decorators():
+    price = by_qualname(extract_functions(SHOP))['Shop.price']
+
+    assert (price['start_line'], price['end_line']) == (3, 7)
+    assert price['source'].lstrip().startswith("@staticmethod")
+    assert price['decorators'] == ('staticmethod',)
+
+
+def test_multiline_decorator_text():
+    source = '@app.route("/é", methods=[\n    "GET"])\n@cache\ndef view():\n    pass\n'
+
+    assert extract_functions(source)[0]['decorators'] == ('app.route("/é", methods=[\n    "GET"])', 'cache')
+
+
+def test_partitioned_stubs_nested_definitions():
+    units = by_qualname(partition_functions(extract_functions(SHOP)))
+
+    price = units['Shop.price']['source']
+    assert "def tax(*args, **kwargs): ...  # nested, analyzed separately as Shop.price.tax" in price
+    ast.parse(textwrap.dedent(price))
+    assert "return y * 2" not in price
+    assert "return tax(x)" in price
+    assert "return y * 2" in units['Shop.price.tax']['source']
+
+
+def test_outermost_keeps_nested_code_in_its_parent():
+    units = by_qualname(partition_functions(extract_functions(SHOP), MODE_OUTERMOST))
+
+    assert set(units) == {'Shop.price', 'main', 'handler'}
+    assert "return y * 2" in units['Shop.price']['source']
+
+
+def test_decorator_extraction_is_linear(monkeypatch):
+    # ast.get_source_segment re-splits the whole file per call, which made this
+    # file take minutes; decorators must be sliced from their own lines
+    def fail(*args, **kwargs):
+        raise AssertionError("ast.get_source_segment must not be used per decorator")
+
+    monkeypatch.setattr(ast, 'get_source_segment', fail)
+    source = "".join(f"@register{i}(name='ü{i}')\ndef f{i}():\n    pass\n" for i in range(4000)) + "\n" * 4000
+
+    started = time.perf_counter()
+    functions = extract_functions(source)
+    elapsed = time.perf_counter() - started
+
+    assert len(functions) == 4000
+    assert functions[1234]['decorators'] == ("register1234(name='ü1234')",)
+    assert elapsed < 10
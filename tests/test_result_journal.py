@@ -0,0 +1,68 @@
+from llm_engine.job_queue import DONE, QUEUED, JobQueue
+from llm_engine.result_journal import ResultJournal
+
+
+def entry(input_hash, output):
+    return {'input_hash': input_hash, 'output': output}
+
+
+def test_lookup_returns_the_latest_output(tmp_path):
+    journal = ResultJournal(str(tmp_path / "journal.jsonl"))
+    journal.append(entry("a", "first"))
+    journal.append(entry("b", "other"))
+    journal.append(entry("a", "second"))
+
+    assert journal.lookup("a") == "second"
+    assert journal.lookup("b") == "other"
+    assert journal.lookup("missing") is None
+
+
+def test_lookup_sees_lines_appended_by_another_process(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    reader = ResultJournal(path)
+    assert reader.lookup("a") is None
+
+    # A second instance stands in for another worker process sharing the file
+    ResultJournal(path).append(entry("a", "from elsewhere"))
+
+    assert reader.lookup("a") == "from elsewhere"
+
+
+def test_lookup_rejects_a_line_of_another_input(tmp_path):
+    journal = ResultJournal(str(tmp_path / "journal.jsonl"))
+    journal.append(entry("a", "brd of a"))
+    journal.append(entry("b", "brd of b"))
+    # An offset that points at someone else's line, as a racing append could record
+    journal._offsets["b"] = journal._offsets["a"]
+
+    assert journal.lookup("b") is None
+
+
+def test_torn_last_line_is_skipped_and_terminated(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = ResultJournal(str(path))
+    journal.append(entry("a", "kept"))
+    with open(path, "ab") as f:
+        f.write(b'{"input_hash": "b", "outp')
+
+    reader = ResultJournal(str(path))
+    assert reader.lookup("b") is None
+    reader.append(entry("c", "after the crash"))
+
+    assert [item['input_hash'] for item in ResultJournal(str(path)).entries()] == ["a", "c"]
+    assert reader.lookup("c") == "after the crash"
+
+
+def test_resubmitted_run_skips_journaled_jobs(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    jobs = [{'kind': 'template', 'title': f"job {n}", 'payload': {'text': f"output {n}"}} for n in range(3)]
+    run_id = queue.submit_run(jobs[:2], "model")
+    while queue.process_one("worker"):
+        pass
+
+    resumed = queue.submit_run(jobs, "model")
+
+    assert queue.run_status(resumed)[DONE] == 2
+    assert queue.run_status(resumed)[QUEUED] == 1
+    assert [job['result'] for job in queue.run_results(resumed)] == ["output 0", "output 1"]
+    assert queue.run_status(run_id)['complete']
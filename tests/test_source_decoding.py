@@ -0,0 +1,56 @@
+import codecs
+import io
+
+from parsers.source_decoding import DecodeStats, decode_source
+
+
+def test_ascii_fast_path():
+    assert decode_source(b"x = 1\n") == ("x = 1\n", 'ascii', 'ascii')
+
+
+def test_utf8_without_declaration():
+    assert decode_source("name = 'café'\n".encode("utf-8")) == ("name = 'café'\n", 'utf-8', 'utf-8')
+
+
+def test_bom_is_stripped():
+    text, encoding, method = decode_source(codecs.BOM_UTF8 + "name = 'café'\n".encode("utf-8"))
+
+    assert (text, encoding, method) == ("name = 'café'\n", 'utf-8-sig', 'bom')
+
+
+def test_coding_cookie_on_the_first_or_second_line():
+    for source in ("# -*- coding: latin-1 -*-\nname = 'café'\n", "#!/usr/bin/env python\n# coding=latin-1\nname = 'café'\n"):
+        text, encoding, method = decode_source(source.encode("latin-1"))
+
+        assert text == source
+        assert (encoding, method) == ('iso-8859-1', 'declared')
+
+
+def test_wrong_cookie_replaces_bytes_instead_of_guessing():
+    text, encoding, method = decode_source("# coding: utf-8\nname = 'café'\n".encode("latin-1"))
+
+    assert (encoding, method) == ('utf-8', 'replaced')
+    assert "�" in text
+
+
+def test_undeclared_legacy_source_falls_back_to_cp1252():
+    text, encoding, method = decode_source("price = '€5'\n".encode("cp1252"))
+
+    assert (text, encoding, method) == ("price = '€5'\n", 'cp1252', 'fallback')
+
+
+def test_bytes_undefined_in_cp1252_fall_back_to_latin1():
+    text, encoding, method = decode_source(b"name = 'caf\xe9\x81'\n")
+
+    assert (text, encoding, method) == ("name = 'caf\xe9\x81'\n", 'latin-1', 'fallback')
+
+
+def test_decode_stats_reads_streams_and_lists_problems():
+    stats = DecodeStats()
+
+    assert stats.decode('ok.py', io.BytesIO(b"x = 1\n")) == "x = 1\n"
+    assert stats.decode('legacy.py', "s = 'é'\n".encode("cp1252")) == "s = 'é'\n"
+    assert stats.decode('broken.py', object()) is None
+
+    assert stats.summary()['methods'] == {'ascii': 1, 'fallback': 1, 'failed': 1}
+    assert [record['file'] for record in stats.problems()] == ['legacy.py', 'broken.py']
@@ -0,0 +1,68 @@
+from parsers import parallel_parser
+from parsers.parallel_parser import parse_files, recover_source
+from parsers.python_parser import extract_classes, extract_functions, parse_python_code
+
+BROKEN = '''import os
+
+
+def good1(x):
+    return x + 1
+
+
+def legacy():
+    print "python 2"
+
+
+class Report:
+    def render(self):
+        return "ok"
+
+
+def good2():
+    if True:
+        return 2
+'''
+
+
+def test_definitions_outside_the_error_are_recovered():
+    functions = {func['qualname']: func for func in extract_functions(BROKEN)}
+
+    assert set(functions) == {'good1', 'Report.render', 'good2'}
+    assert (functions['good1']['start_line'], functions['good1']['end_line']) == (4, 5)
+    assert (functions['good2']['start_line'], functions['good2']['end_line']) == (17, 19)
+    assert functions['Report.render']['source'].strip().startswith("def render(self):")
+    assert [cls['qualname'] for cls in extract_classes(BROKEN)] == ['Report']
+
+
+def test_skipped_region_is_reported():
+    result = parse_python_code(BROKEN)
+
+    assert [func['name'] for func in result['functions']] == ['good1', 'render', 'good2']
+    assert len(result['syntax_errors']) == 1
+    error = result['syntax_errors'][0]
+    assert error['start_line'] <= 9 <= error['end_line'] < 12
+    assert error['line'] == 9
+
+
+def test_recovery_can_be_turned_off():
+    assert extract_functions(BROKEN, recover=False) == []
+
+
+def test_parse_files_reports_syntax_errors():
+    parsed = parse_files([('broken.py', BROKEN), ('clean.py', "def ok():\n    pass\n")], max_workers=1)
+
+    assert [func['qualname'] for func in parsed['broken.py']['functions']] == ['good1', 'Report.render', 'good2']
+    assert len(parsed['broken.py']['syntax_errors']) == 1
+    assert parsed['clean.py']['syntax_errors'] == []
+    assert len(parsed['broken.py']['metrics']) == len(parsed['broken.py']['functions'])
+
+
+def test_parallel_recovery_matches_serial(monkeypatch):
+    source = BROKEN + "".join(f"\n\ndef extra{i}(value):\n    return value * {i}\n" for i in range(200))
+    serial = recover_source(source, include_classes=True, max_workers=1)
+
+    monkeypatch.setattr(parallel_parser, 'MIN_PARALLEL_RECOVERY_BYTES', 0)
+    parallel = recover_source(source, include_classes=True, max_workers=2)
+
+    assert parallel == serial
+    assert len(serial[0]) == 203
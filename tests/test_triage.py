@@ -0,0 +1,59 @@
+from parsers.python_parser import MODE_PARTITIONED, extract_functions
+from parsers.triage import CRITICAL, ROUTINE, TRIVIAL, triage_function
+
+
+def triage(code, mode=MODE_PARTITIONED):
+    return {func['qualname']: triage_function(func) for func in extract_functions(code, mode=mode)}
+
+
+def test_partitioned_function_keeps_its_own_branches_and_io():
+    code = '''
+class Orders:
+    def sync(self, orders):
+        def payload(order):
+            return {"id": order.id}
+        for order in orders:
+            if order.paid:
+                requests.post(self.url, json=payload(order))
+'''
+    result = triage(code)
+
+    assert result['Orders.sync']['category'] == CRITICAL
+    assert result['Orders.sync']['io_calls'] == ['requests.post']
+    assert result['Orders.sync.payload']['category'] == TRIVIAL
+
+
+def test_nested_io_belongs_to_the_nested_function():
+    code = '''
+def report(rows):
+    def save(path):
+        with open(path, "w") as f:
+            f.write(str(rows))
+    if rows:
+        return len(rows)
+    return 0
+'''
+    result = triage(code)
+
+    assert result['report']['io_calls'] == []
+    assert result['report']['category'] == ROUTINE
+    assert result['report.save']['io_calls'] == ['f.write', 'open']
+
+
+def test_generic_methods_are_io_only_on_io_receivers():
+    code = '''
+def lookup(settings, key):
+    return settings.get(key)
+
+def fetch(url):
+    return requests.get(url)
+
+def drop(self, path):
+    self.session.delete(path)
+    os.remove(path)
+'''
+    result = triage(code)
+
+    assert result['lookup']['category'] == TRIVIAL
+    assert result['fetch']['io_calls'] == ['requests.get']
+    assert result['drop']['io_calls'] == ['os.remove', 'session.delete']